@@ -7,7 +7,7 @@ This is a fork of pydub (https://github.com/jiaaro/pydub) with additional featur
 __version__ = "0.1.0"
 
 # Import original pydub AudioSegment from our forked core
-from pydub_plus.core import AudioSegment, AudioSegmentPlus
+from pydub_plus.core import AudioSegment, AudioSegmentPlus, AudioEncoderSink, EnergyIndex
 
 # Export enhanced modules
 from pydub_plus.gpu import enable_gpu, is_gpu_available
@@ -26,6 +26,8 @@ from pydub_plus.core import (
 __all__ = [
     "AudioSegment",
     "AudioSegmentPlus",
+    "AudioEncoderSink",
+    "EnergyIndex",
     "AudioSegmentAsync",
     "enable_gpu",
     "is_gpu_available",
@@ -18,6 +18,9 @@ if TYPE_CHECKING:
 # Users can use AudioSegment exactly as they would with pydub
 AudioSegment = _AudioSegment
 
+from pydub_plus.core.encoder import AudioEncoderSink
+from pydub_plus.core.energy_index import EnergyIndex
+
 # Re-export other pydub modules
 from pydub_plus.core import (
     effects,
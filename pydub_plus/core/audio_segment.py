@@ -1,12 +1,17 @@
 from __future__ import division
 
 import array
+import math
+import mmap
 import os
 import subprocess
 from tempfile import NamedTemporaryFile
-import wave
 import sys
 import struct
+import threading
+
+import numpy as np
+
 from .logging_utils import log_conversion, log_subprocess_output
 from .utils import mediainfo_json, fsdecode
 import base64
@@ -25,13 +30,51 @@ except:
     izip = zip
 
 from .utils import (
+    _drain_in_thread,
     _fd_or_path_or_tempfile,
+    _feed_in_thread,
     db_to_float,
     ratio_to_db,
     get_encoder_name,
     get_array_type,
     audioop,
 )
+from .encoder import AudioEncoderSink
+from .energy_index import EnergyIndex
+from .resample import DEFAULT_QUALITY, Resampler, check_quality, output_length
+from .pcm_io import (
+    WavStreamInfo,
+    iter_blocks,
+    needs_conversion,
+    pcm_sample_width,
+    read_audio_buffer,
+    read_audio_header,
+    read_into_buffer,
+    read_wav_header,
+    skip,
+    stored_sample_width,
+    to_float,
+    to_pcm,
+    write_wav,
+)
+from .sample_ops import (
+    apply_envelope,
+    deinterleave,
+    fade_envelope,
+    float_to_int,
+    int_to_float,
+    interleave,
+    linear_resample,
+    measure_channels,
+    overlay_into,
+    remix_channels,
+    saturate,
+    samples_of,
+    scale_float,
+    tobytes,
+    unpack24,
+    widen24,
+)
 from .exceptions import (
     TooManyMissingFrames,
     InvalidDuration,
@@ -84,7 +127,33 @@ AUDIO_FILE_EXT_ALIASES = {
     "wave": "wav",
 }
 
+SAMPLE_FORMATS = ("int", "float32")
+
+# set_channels' mixing matrices (see AudioSegment.remix) for conversions
+# other than to or from mono, by (from, to) channel count. 5.1 is in WAV
+# order (FL, FR, FC, LFE, BL, BR): the centre and the surrounds go in at
+# -3 dB, the LFE is left out, and each row is scaled so that full scale
+# input can't clip.
+_SURROUND_GAIN = 1 / math.sqrt(2)
+_SURROUND_NORM = 1 / (1 + 2 * _SURROUND_GAIN)
+CHANNEL_MATRICES = {
+    (6, 2): (
+        (_SURROUND_NORM, 0, _SURROUND_GAIN * _SURROUND_NORM, 0, _SURROUND_GAIN * _SURROUND_NORM, 0),
+        (0, _SURROUND_NORM, _SURROUND_GAIN * _SURROUND_NORM, 0, 0, _SURROUND_GAIN * _SURROUND_NORM),
+    ),
+}
+
+# formats (and file extensions) read in-process, see pcm_io.read_audio_header.
+# Files that turn out not to be plain PCM are still handed to ffmpeg.
+NATIVE_FORMATS = ("wav", "rf64", "bw64", "w64", "aiff", "aif", "aifc")
+
 WavSubChunk = namedtuple('WavSubChunk', ['id', 'position', 'size'])
+
+# AudioSegment.stats. Amplitudes are in sample units (1.0 is full scale for
+# float32 segments), dc_offset is relative to full scale like
+# get_dc_offset, and crest_factor is peak / rms (0.0 for silence).
+ChannelStats = namedtuple('ChannelStats', ['peak', 'rms', 'dc_offset', 'clipped', 'crest_factor'])
+SegmentStats = namedtuple('SegmentStats', ['peak', 'rms', 'clipped', 'crest_factor', 'channels'])
 WavData = namedtuple('WavData', ['audio_format', 'channels', 'sample_rate',
                                  'bits_per_sample', 'raw_data'])
 
@@ -93,7 +162,7 @@ def extract_wav_headers(data):
     # def search_subchunk(data, subchunk_id):
     pos = 12  # The size of the RIFF chunk descriptor
     subchunks = []
-    while pos + 8 <= len(data) and len(subchunks) < 10:
+    while pos + 8 <= len(data):
         subchunk_id = data[pos:pos + 4]
         subchunk_size = struct.unpack_from('<I', data[pos + 4:pos + 8])[0]
         subchunks.append(WavSubChunk(subchunk_id, pos, subchunk_size))
@@ -132,6 +201,198 @@ def read_wav_audio(data, headers=None):
                    data[pos:pos + data_hdr.size])
 
 
+def _readonly_view(data):
+    """
+    Returns a read-only, byte formatted memoryview over data. Slicing the
+    view shares data's buffer instead of copying it.
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    if not view.readonly:
+        view = view.toreadonly()
+    return view
+
+
+def _map_file(f):
+    """
+    Returns a read-only memoryview over a memory map of the whole of f, or
+    None when f isn't a (non-empty) regular file. The map stays open for as
+    long as a view of it is referenced, f itself can be closed.
+    """
+    try:
+        fileno = f.fileno()
+        if os.fstat(fileno).st_size == 0:
+            return None
+        return _readonly_view(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class _AppendBuffer(bytearray):
+    """
+    Over-allocated output buffer for chains of concatenations (a + b + c,
+    sum()). Only the first `used` bytes hold audio and every segment made
+    from it is a read-only view on a prefix of those, so the rest can be
+    filled in place by the next concatenation instead of copying everything
+    again.
+    """
+    def __init__(self, capacity):
+        super(_AppendBuffer, self).__init__(capacity)
+        self.used = 0
+        self.lock = threading.Lock()
+
+
+def _append_buffer_tail(data):
+    """
+    Returns the _AppendBuffer data is the used prefix of, or None
+    """
+    if not isinstance(data, memoryview):
+        return None
+    buf = data.obj
+    if isinstance(buf, _AppendBuffer) and data.nbytes == buf.used:
+        return buf
+    return None
+
+
+def _join_pieces(pieces, size, extend=False):
+    """
+    Writes pieces (size bytes in all) back to back into an _AppendBuffer and
+    returns a read-only view of the result.
+
+    With extend, when pieces[0] is the used prefix of an append buffer with
+    enough spare room, only the other pieces are written, in place. Results
+    of a chain of concatenations get twice the room they need, so that
+    every later link costs amortized O(length of the new piece).
+    """
+    buf = _append_buffer_tail(pieces[0]) if extend else None
+    if buf is not None:
+        with buf.lock:
+            # check again, someone else may have extended it meanwhile
+            if buf.used == len(pieces[0]) and size <= len(buf):
+                view = memoryview(buf)
+                pos = buf.used
+                for piece in pieces[1:]:
+                    view[pos:pos + len(piece)] = piece
+                    pos += len(piece)
+                buf.used = pos
+                return _readonly_view(view)[:pos]
+
+    chained = isinstance(pieces[0], memoryview) and isinstance(pieces[0].obj, _AppendBuffer)
+    buf = _AppendBuffer(2 * size if chained else size)
+    view = memoryview(buf)
+    pos = 0
+    for piece in pieces:
+        view[pos:pos + len(piece)] = piece
+        pos += len(piece)
+    buf.used = pos
+    return _readonly_view(view)[:pos]
+
+
+def _pcm_codec_for(info):
+    """
+    Picks the pcm codec ffmpeg should decode to, from mediainfo_json output,
+    so that the decoded audio keeps the source's bit depth
+    """
+    audio_streams = [x for x in info['streams']
+                     if x['codec_type'] == 'audio']
+    # This is a workaround for some ffprobe versions that always say
+    # that mp3/mp4/aac/webm/ogg files contain fltp samples
+    audio_codec = audio_streams[0].get('codec_name')
+    if (audio_streams[0].get('sample_fmt') == 'fltp' and
+            audio_codec in ['mp3', 'mp4', 'aac', 'webm', 'ogg']):
+        bits_per_sample = 16
+    else:
+        bits_per_sample = audio_streams[0]['bits_per_sample']
+    if bits_per_sample == 8:
+        return 'pcm_u8'
+    return 'pcm_s%dle' % bits_per_sample
+
+
+RawPcmFormat = namedtuple('RawPcmFormat', ['codec', 'format', 'sample_width',
+                                           'frame_rate', 'channels'])
+
+
+def _raw_pcm_format(info):
+    """
+    Returns the RawPcmFormat ffmpeg should decode the probed media to, or
+    None when the probe doesn't say enough about its audio
+    """
+    if not info:
+        return None
+    audio_streams = [x for x in info.get('streams', [])
+                     if x.get('codec_type') == 'audio']
+    if not audio_streams:
+        return None
+
+    try:
+        frame_rate = int(audio_streams[0]['sample_rate'])
+        channels = int(audio_streams[0]['channels'])
+        codec = _pcm_codec_for(info)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if codec == 'pcm_u8':
+        # no need for unsigned samples without a wav container
+        codec = 'pcm_s8'
+    sample_formats = {
+        'pcm_s8': 1,
+        'pcm_s16le': 2,
+        'pcm_s24le': 3,
+        'pcm_s32le': 4,
+    }
+    if codec not in sample_formats or frame_rate <= 0 or channels <= 0:
+        return None
+    return RawPcmFormat(codec, codec[4:], sample_formats[codec], frame_rate, channels)
+
+
+def _probed_duration(info):
+    """
+    Returns the duration of the first audio stream (or the whole media) in
+    seconds, or None if the probe didn't find it
+    """
+    if not info:
+        return None
+    audio_streams = [x for x in info.get('streams', [])
+                     if x.get('codec_type') == 'audio']
+    for source in audio_streams[:1] + [info.get('format', {})]:
+        try:
+            return float(source['duration'])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+# how much audio ffmpeg decodes (and drops) before a seek point, so that
+# codecs whose first frames after a jump depend on earlier ones (mp3's bit
+# reservoir, aac/opus priming) are decoded exactly as without seeking
+SEEK_PREROLL = 1.0
+
+# the frames set_frame_rate resamples at a time, which bounds its float
+# temporaries to a few MB whatever the length of the segment
+RESAMPLE_BLOCK_FRAMES = 1 << 16
+
+
+def _seek_arguments(start_second):
+    """
+    Returns the (input, output) ffmpeg options starting the decode at
+    start_second: a fast seek on the input side to SEEK_PREROLL seconds
+    before it, then an accurate skip of the preroll on the output side. The
+    cost depends on the preroll, not on how far into the file start_second
+    is.
+    """
+    if start_second is None:
+        return [], []
+    preroll = min(float(start_second), SEEK_PREROLL)
+    input_seek = []
+    if start_second - preroll > 0:
+        input_seek = ["-ss", str(start_second - preroll)]
+    output_seek = []
+    if preroll > 0:
+        output_seek = ["-ss", str(preroll)]
+    return input_seek, output_seek
+
+
 def fix_wav_headers(data):
     headers = extract_wav_headers(data)
     if not headers or headers[-1].id != b'data':
@@ -159,9 +420,31 @@ class AudioSegment(object):
         a = AudioSegment.from_mp3(mp3file)
         first_second = a[:1000] # get the first second of an mp3
         slice = a[5000:10000] # get a slice from 5 to 10 seconds of an mp3
+
+    Slices are views: they share the audio data of the segment they were
+    taken from (through a read-only memoryview) instead of copying it.
+
+    24-bit audio is widened to 32-bit samples unless keep_24bit is true
+    (for a segment, from the keep_24bit argument, or for all of them, on
+    the class). Then it stays packed at 3 bytes per sample, and is exported
+    as 24-bit audio.
+
+    sample_format is "int" (integer PCM) or "float32": normalized float
+    samples (1.0 is full scale) that keep their headroom, so a chain of
+    gains, mixes, fades and filters neither rounds nor clips along the way.
+    See set_sample_format. Float audio is converted back to integers of
+    pcm_sample_width bytes once, on export.
+
+    resample_quality is the quality preset set_frame_rate (and so mixing
+    segments of different frame rates) resamples with.
     """
     converter = get_encoder_name()  # either ffmpeg or avconv
 
+    keep_24bit = False
+    sample_format = "int"
+    pcm_sample_width = None
+    resample_quality = DEFAULT_QUALITY
+
     # TODO: remove in 1.0 release
     # maintain backwards compatibility for ffmpeg attr (now called converter)
     @classproperty
@@ -180,6 +463,17 @@ class AudioSegment(object):
         self.sample_width = kwargs.pop("sample_width", None)
         self.frame_rate = kwargs.pop("frame_rate", None)
         self.channels = kwargs.pop("channels", None)
+        keep_24bit = kwargs.pop("keep_24bit", None)
+        if keep_24bit is not None:
+            self.keep_24bit = keep_24bit
+        sample_format = kwargs.pop("sample_format", None)
+        if sample_format is not None:
+            if sample_format not in SAMPLE_FORMATS:
+                raise ValueError("sample_format must be one of {0} (got {1!r})".format(
+                    SAMPLE_FORMATS, sample_format))
+            if sample_format == "float32" and self.sample_width not in (None, 4):
+                raise ValueError("float32 samples are 4 bytes wide")
+            self.sample_format = sample_format
 
         audio_params = (self.sample_width, self.frame_rate, self.channels)
 
@@ -189,6 +483,9 @@ class AudioSegment(object):
             except:
                 data = data.tostring()
 
+        if isinstance(data, memoryview):
+            data = _readonly_view(data)
+
         # prevent partial specification of arguments
         if any(audio_params) and None in audio_params:
             raise MissingAudioParameter("Either all audio parameters or no parameter must be specified")
@@ -210,48 +507,34 @@ class AudioSegment(object):
         else:
             # normal construction
             try:
-                data = data if isinstance(data, (basestring, bytes)) else data.read()
+                data = data if isinstance(data, (basestring, bytes, bytearray, memoryview)) else data.read()
             except(OSError):
-                d = b''
-                reader = data.read(2 ** 31 - 1)
-                while reader:
-                    d += reader
-                    reader = data.read(2 ** 31 - 1)
-                data = d
-
-            wav_data = read_wav_audio(data)
-            if not wav_data:
-                raise CouldntDecodeError("Couldn't read wav audio from data")
-
-            self.channels = wav_data.channels
-            self.sample_width = wav_data.bits_per_sample // 8
-            self.frame_rate = wav_data.sample_rate
+                # some platforms can't read 2 GiB or more at once
+                data = read_into_buffer(data)
+
+            # parse through a view so the audio payload isn't copied out of
+            # the file data (unless its samples need converting)
+            info, samples = read_audio_buffer(_readonly_view(data))
+
+            self.channels = info.channels
+            self.sample_width = pcm_sample_width(info)
+            self.frame_rate = info.sample_rate
+            if self._floating:
+                # straight to float32, float files keep their headroom
+                self.pcm_sample_width = self.sample_width
+                self.sample_width = 4
+                self._data = to_float(samples, info)
+            else:
+                self._data = _readonly_view(to_pcm(samples, info))
             self.frame_width = self.channels * self.sample_width
-            self._data = wav_data.raw_data
-            if self.sample_width == 1:
-                # convert from unsigned integers in wav
-                self._data = audioop.bias(self._data, 1, -128)
 
         # Convert 24-bit audio to 32-bit audio.
         # (stdlib audioop and array modules do not support 24-bit data)
-        if self.sample_width == 3:
-            byte_buffer = BytesIO()
-
-            # Workaround for python 2 vs python 3. _data in 2.x are length-1 strings,
-            # And in 3.x are ints.
-            pack_fmt = 'BBB' if isinstance(self._data[0], int) else 'ccc'
-
+        if self.sample_width == 3 and not self.keep_24bit:
             # This conversion maintains the 24 bit values.  The values are
             # not scaled up to the 32 bit range.  Other conversions could be
             # implemented.
-            i = iter(self._data)
-            padding = {False: b'\x00', True: b'\xFF'}
-            for b0, b1, b2 in izip(i, i, i):
-                byte_buffer.write(padding[b2 > b'\x7f'[0]])
-                old_bytes = struct.pack(pack_fmt, b0, b1, b2)
-                byte_buffer.write(old_bytes)
-
-            self._data = byte_buffer.getvalue()
+            self._data = widen24(self._data)
             self.sample_width = 4
             self.frame_width = self.channels * self.sample_width
 
@@ -260,9 +543,20 @@ class AudioSegment(object):
     @property
     def raw_data(self):
         """
-        public access to the raw audio data as a bytestring
+        public access to the raw audio data as a bytestring (a copy, unless
+        the segment holds bytes; the segment itself keeps its buffer, so
+        views stay zero-copy)
+        """
+        if isinstance(self._data, bytes):
+            return self._data
+        return self._view().tobytes()
+
+    def _view(self):
+        """
+        Returns a read-only memoryview over the audio data. Slicing it does
+        not copy anything.
         """
-        return self._data
+        return _readonly_view(self._data)
 
     def get_array_of_samples(self, array_type_override=None):
         """
@@ -270,12 +564,48 @@ class AudioSegment(object):
         """
         if array_type_override is None:
             array_type_override = self.array_type
-        return array.array(array_type_override, self._data)
+        samples = array.array(array_type_override)
+        if self.sample_width == 3 and not self._floating:
+            samples.frombytes(unpack24(self._data).astype(array_type_override, copy=False).tobytes())
+        else:
+            samples.frombytes(self._data)
+        return samples
 
     @property
     def array_type(self):
+        if self._floating:
+            return 'f'
         return get_array_type(self.sample_width * 8)
 
+    @property
+    def _floating(self):
+        return self.sample_format == "float32"
+
+    def _samples(self, data=None):
+        """
+        Returns a numpy array (read-only, no copy) over the samples of data,
+        or of the whole segment, in its sample format
+        """
+        return samples_of(self._data if data is None else data, self.sample_width, self._floating)
+
+    def _encode(self, samples):
+        """
+        Returns float samples (at this segment's scale) as sample bytes in
+        this segment's format. Integers are rounded to the nearest value and
+        saturated.
+        """
+        if self._floating:
+            return tobytes(samples, 4, floating=True)
+        return tobytes(saturate(np.rint(samples), self.sample_width), self.sample_width)
+
+    def _scale(self, data, factor):
+        """
+        audioop.mul for data in this segment's sample format
+        """
+        if self._floating:
+            return scale_float(data, factor)
+        return audioop.mul(data, self.sample_width, factor)
+
     def __len__(self):
         """
         returns the length of this audio segment in milliseconds
@@ -289,7 +619,18 @@ class AudioSegment(object):
             return False
 
     def __hash__(self):
-        return hash(AudioSegment) ^ hash((self.channels, self.frame_rate, self.sample_width, self._data))
+        data = self._data
+        if not isinstance(data, bytes):
+            # views and buffers can't be hashed, hash the bytes they hold
+            data = self._view().tobytes()
+        return hash(AudioSegment) ^ hash((self.channels, self.frame_rate, self.sample_width, data))
+
+    def __getstate__(self):
+        # memoryviews can't be pickled, store the data itself
+        state = self.__dict__.copy()
+        if isinstance(self._data, memoryview):
+            state['_data'] = self._data.tobytes()
+        return state
 
     def __ne__(self, other):
         return not (self == other)
@@ -317,7 +658,7 @@ class AudioSegment(object):
 
         start = self._parse_position(start) * self.frame_width
         end = self._parse_position(end) * self.frame_width
-        data = self._data[start:end]
+        data = self._view()[start:end]
 
         # ensure the output is as long as the requester is expecting
         expected_length = end - start
@@ -330,7 +671,7 @@ class AudioSegment(object):
                     "missing frames: %s" % missing_frames)
             silence = audioop.mul(data[:self.frame_width],
                                   self.sample_width, 0)
-            data += (silence * missing_frames)
+            data = b''.join((data, silence * missing_frames))
 
         return self._spawn(data)
 
@@ -356,18 +697,21 @@ class AudioSegment(object):
         start_i = bounded(start_sample, 0) * self.frame_width
         end_i = bounded(end_sample, max_val) * self.frame_width
 
-        data = self._data[start_i:end_i]
+        data = self._view()[start_i:end_i]
         return self._spawn(data)
 
     def __add__(self, arg):
         if isinstance(arg, AudioSegment):
-            return self.append(arg, crossfade=0)
+            return self.concatenate([self, arg])
         else:
             return self.apply_gain(arg)
 
     def __radd__(self, rarg):
         """
         Permit use of sum() builtin with an iterable of AudioSegments
+
+        Every addition in the chain writes into the spare room of the same
+        buffer (see concatenate), so sum() runs in linear time.
         """
         if rarg == 0:
             return self
@@ -397,7 +741,7 @@ class AudioSegment(object):
         if isinstance(arg, AudioSegment):
             return self.overlay(arg, position=0, loop=True)
         else:
-            return self._spawn(data=self._data * arg)
+            return self._spawn(data=b''.join([self._data] * arg))
 
     def _spawn(self, data, overrides={}):
         """
@@ -406,10 +750,16 @@ class AudioSegment(object):
         being returned by an operation that would alters the current one,
         since AudioSegment objects are immutable.
         """
-        # accept lists of data chunks
+        # accept lists of data chunks (bytes or memoryviews)
         if isinstance(data, list):
             data = b''.join(data)
 
+        sample_width = overrides.get('sample_width', self.sample_width)
+        if sample_width == 3 and not isinstance(data, (bytes, bytearray, memoryview)) \
+                and not hasattr(data, 'read'):
+            # arrays of (unpacked) 24-bit samples
+            data = tobytes(data, 3)
+
         if isinstance(data, array.array):
             try:
                 data = data.tobytes()
@@ -426,7 +776,10 @@ class AudioSegment(object):
             'sample_width': self.sample_width,
             'frame_rate': self.frame_rate,
             'frame_width': self.frame_width,
-            'channels': self.channels
+            'channels': self.channels,
+            'keep_24bit': self.keep_24bit,
+            'sample_format': self.sample_format,
+            'pcm_sample_width': self.pcm_sample_width,
         }
         metadata.update(overrides)
         return self.__class__(data=data, metadata=metadata)
@@ -435,7 +788,14 @@ class AudioSegment(object):
     def _sync(cls, *segs):
         channels = max(seg.channels for seg in segs)
         frame_rate = max(seg.frame_rate for seg in segs)
+        if any(seg._floating for seg in segs):
+            # mixing with float audio, don't lose its headroom
+            segs = [seg.set_sample_format("float32") for seg in segs]
         sample_width = max(seg.sample_width for seg in segs)
+        if sample_width == 3:
+            # only segments keeping packed 24-bit samples have this width,
+            # the others have to keep them packed too to match
+            segs = [seg._spawn(seg._data, overrides={'keep_24bit': True}) for seg in segs]
 
         return tuple(
             seg.set_channels(channels).set_frame_rate(frame_rate).set_sample_width(sample_width)
@@ -449,6 +809,74 @@ class AudioSegment(object):
             self.frame_count(ms=val)
         return int(val)
 
+    @classmethod
+    def concatenate(cls, segments, crossfade=0):
+        """
+        Joins an iterable of segments end to end, crossfading every junction
+        by crossfade milliseconds (like append).
+
+        Formats are synced once and the output is written into a single
+        buffer, so building a long segment from many pieces takes linear
+        time, unlike a chain of append() calls.
+        """
+        segments = list(segments)
+        if not segments:
+            return cls.empty()
+
+        segs = cls._sync(*segments)
+        first = segs[0]
+        frame_width = first.frame_width
+
+        head = first._view()
+        pieces = [head]
+        size = len(head)
+        for seg in segs[1:]:
+            if not crossfade:
+                pieces.append(seg._view())
+                size += len(pieces[-1])
+                continue
+
+            length = round(1000 * (size // frame_width) / first.frame_rate)
+            if crossfade > length:
+                raise ValueError("Crossfade is longer than the original AudioSegment ({}ms > {}ms)".format(
+                    crossfade, length
+                ))
+            elif crossfade > len(seg):
+                raise ValueError("Crossfade is longer than the appended AudioSegment ({}ms > {}ms)".format(
+                    crossfade, len(seg)
+                ))
+
+            # the same frames append() would take from the audio so far
+            start = first._parse_position(length - crossfade) * frame_width
+            end = first._parse_position(length) * frame_width
+
+            tail = []
+            while pieces and size - len(pieces[-1]) >= start:
+                size -= len(pieces[-1])
+                tail.insert(0, pieces.pop())
+            if size > start:
+                split = len(pieces[-1]) - (size - start)
+                tail.insert(0, pieces[-1][split:])
+                pieces[-1] = pieces[-1][:split]
+                size = start
+
+            tail = b''.join(tail)
+            if tail and end - start > len(tail):
+                tail += b'\0' * (end - start - len(tail))
+            else:
+                tail = tail[:end - start]
+
+            xf = first._spawn(tail).fade(to_gain=-120, start=0, end=float('inf'))
+            xf *= seg[:crossfade].fade(from_gain=-120, start=0, end=float('inf'))
+
+            pieces.append(memoryview(xf._data))
+            pieces.append(seg[crossfade:]._view())
+            size += len(pieces[-2]) + len(pieces[-1])
+
+        if len(pieces) == 1:
+            return first._spawn(pieces[0])
+        return first._spawn(_join_pieces(pieces, size, extend=pieces[0] is head))
+
     @classmethod
     def empty(cls):
         return cls(b'', metadata={
@@ -484,23 +912,14 @@ class AudioSegment(object):
 
         channels = len(segs)
         sample_width = segs[0].sample_width
-        frame_rate = segs[0].frame_rate
-
-        frame_count = max(int(seg.frame_count()) for seg in segs)
-        data = array.array(
-            segs[0].array_type,
-            b'\0' * (frame_count * sample_width * channels)
-        )
 
-        for i, seg in enumerate(segs):
-            data[i::channels] = seg.get_array_of_samples()
+        # one pass over the samples, shorter segments are padded with silence
+        data = interleave([seg._data for seg in segs], sample_width)
 
-        return cls(
-            data,
-            channels=channels,
-            sample_width=sample_width,
-            frame_rate=frame_rate,
-        )
+        return segs[0]._spawn(data, overrides={
+            'channels': channels,
+            'frame_width': channels * sample_width,
+        })
 
     @classmethod
     def from_file_using_temporary_files(cls, file, format=None, codec=None, parameters=None, start_second=None, duration=None, **kwargs):
@@ -642,7 +1061,27 @@ class AudioSegment(object):
 
 
     @classmethod
-    def from_file(cls, file, format=None, codec=None, parameters=None, start_second=None, duration=None, **kwargs):
+    def from_file(cls, file, format=None, codec=None, parameters=None, start_second=None, duration=None,
+                  mmap=False, keep_24bit=None, sample_format="int", **kwargs):
+        """
+        With mmap=True, WAV (including RF64) and raw files are memory-mapped
+        rather than read: the segment's audio is a read-only view of the
+        file's data chunk, so slicing, rms, max and export read straight
+        from the page cache and processes loading the same file share its
+        pages. 8-bit and 24-bit audio is converted, and so copied, as usual.
+        Other formats and inputs that can't be mapped (pipes, in-memory
+        files) are loaded as without mmap.
+
+        keep_24bit (defaults to the class setting) keeps 24-bit audio packed
+        at 3 bytes per sample instead of widening it to 32 bits.
+
+        sample_format="float32" loads the audio as normalized float samples
+        (see set_sample_format). Float WAV, RF64, Wave64 and AIFF-C files
+        loaded whole keep their values as stored, other audio is decoded to
+        integers first.
+        """
+        if keep_24bit is None:
+            keep_24bit = cls.keep_24bit
         orig_file = file
         try:
             filename = fsdecode(file)
@@ -664,18 +1103,45 @@ class AudioSegment(object):
 
             return False
 
-        if is_format("wav"):
+        excerpt = start_second is not None or duration is not None
+        native = any(is_format(f) for f in NATIVE_FORMATS)
+
+        def decode_then_convert():
+            # decoded to integer PCM, then converted
+            if close_file:
+                file.close()
+            return cls.from_file(orig_file, format, codec, parameters, start_second, duration,
+                                 mmap=mmap, keep_24bit=keep_24bit, **kwargs).set_sample_format(sample_format)
+
+        if sample_format != "int" and (excerpt or not native):
+            return decode_then_convert()
+
+        if native:
             try:
-                if start_second is None and duration is None:
-                    return cls._from_safe_wav(file)
-                elif start_second is not None and duration is None:
-                    return cls._from_safe_wav(file)[start_second*1000:]
-                elif start_second is None and duration is not None:
-                    return cls._from_safe_wav(file)[:duration*1000]
-                else:
-                    return cls._from_safe_wav(file)[start_second*1000:(start_second+duration)*1000]
+                if mmap and sample_format == "int":
+                    file.seek(0)
+                    info = read_audio_header(file)
+                    obj = None
+                    if not needs_conversion(info):
+                        obj = cls._map_pcm(file, file.tell(), info.data_size, stored_sample_width(info),
+                                           info.sample_rate, info.channels, start_second, duration,
+                                           keep_24bit=keep_24bit)
+                    if obj is not None:
+                        if close_file:
+                            file.close()
+                        return obj
+                if not excerpt:
+                    return cls._from_safe_wav(file, keep_24bit=keep_24bit, sample_format=sample_format)
+                # only read the frames that are needed
+                file.seek(0)
+                info = read_audio_header(file)
+                return cls._read_pcm_range(file, file.tell(), info.data_size, stored_sample_width(info),
+                                           info.sample_rate, info.channels, start_second, duration,
+                                           info=info, keep_24bit=keep_24bit)
             except:
                 file.seek(0)
+                if sample_format != "int":
+                    return decode_then_convert()
         elif is_format("raw") or is_format("pcm"):
             sample_width = kwargs['sample_width']
             frame_rate = kwargs['frame_rate']
@@ -684,10 +1150,25 @@ class AudioSegment(object):
                 'sample_width': sample_width,
                 'frame_rate': frame_rate,
                 'channels': channels,
-                'frame_width': channels * sample_width
+                'frame_width': channels * sample_width,
+                'keep_24bit': keep_24bit,
             }
-            if start_second is None and duration is None:
+            if mmap:
+                obj = cls._map_pcm(file, file.tell(), None, sample_width, frame_rate, channels,
+                                   start_second, duration, keep_24bit=keep_24bit)
+                if obj is not None:
+                    if close_file:
+                        file.close()
+                    return obj
+            if not excerpt:
                 return cls(data=file.read(), metadata=metadata)
+            try:
+                seekable = file.seekable()
+            except AttributeError:
+                seekable = False
+            if seekable:
+                return cls._read_pcm_range(file, file.tell(), None, sample_width, frame_rate, channels,
+                                           start_second, duration, keep_24bit=keep_24bit)
             elif start_second is not None and duration is None:
                 return cls(data=file.read(), metadata=metadata)[start_second*1000:]
             elif start_second is None and duration is not None:
@@ -708,11 +1189,13 @@ class AudioSegment(object):
             # force audio decoder
             conversion_command += ["-acodec", codec]
 
+        input_seek, output_seek = _seek_arguments(start_second)
+        conversion_command += input_seek
+
         read_ahead_limit = kwargs.get('read_ahead_limit', -1)
         if filename:
             conversion_command += ["-i", filename]
             stdin_parameter = None
-            stdin_data = None
         else:
             if cls.converter == 'ffmpeg':
                 conversion_command += ["-read_ahead_limit", str(read_ahead_limit),
@@ -720,37 +1203,37 @@ class AudioSegment(object):
             else:
                 conversion_command += ["-i", "-"]
             stdin_parameter = subprocess.PIPE
-            stdin_data = file.read()
+            try:
+                stdin_start = file.tell()
+            except (AttributeError, OSError):
+                stdin_start = None
 
         if codec:
             info = None
         else:
             info = mediainfo_json(orig_file, read_ahead_limit=read_ahead_limit)
-        if info:
-            audio_streams = [x for x in info['streams']
-                             if x['codec_type'] == 'audio']
-            # This is a workaround for some ffprobe versions that always say
-            # that mp3/mp4/aac/webm/ogg files contain fltp samples
-            audio_codec = audio_streams[0].get('codec_name')
-            if (audio_streams[0].get('sample_fmt') == 'fltp' and
-                    audio_codec in ['mp3', 'mp4', 'aac', 'webm', 'ogg']):
-                bits_per_sample = 16
-            else:
-                bits_per_sample = audio_streams[0]['bits_per_sample']
-            if bits_per_sample == 8:
-                acodec = 'pcm_u8'
-            else:
-                acodec = 'pcm_s%dle' % bits_per_sample
-
-            conversion_command += ["-acodec", acodec]
-
-        conversion_command += [
-            "-vn",  # Drop any video streams if there are any
-            "-f", "wav"  # output options (filename last)
-        ]
+            if stdin_parameter is not None and stdin_start is not None:
+                # the prober may have read the file object already
+                file.seek(stdin_start)
+
+        # with the format known from the probe, ask for headerless PCM.
+        # Extra parameters could change the format, so they get a wav header
+        raw = _raw_pcm_format(info) if parameters is None else None
+
+        conversion_command += ["-vn"]  # Drop any video streams if there are any
+        if raw:
+            conversion_command += [
+                "-acodec", raw.codec,
+                "-ar", str(raw.frame_rate),
+                "-ac", str(raw.channels),
+                "-f", raw.format,  # output options (filename last)
+            ]
+        else:
+            if info:
+                conversion_command += ["-acodec", _pcm_codec_for(info)]
+            conversion_command += ["-f", "wav"]  # output options (filename last)
 
-        if start_second is not None:
-            conversion_command += ["-ss", str(start_second)]
+        conversion_command += output_seek
 
         if duration is not None:
             conversion_command += ["-t", str(duration)]
@@ -765,22 +1248,75 @@ class AudioSegment(object):
 
         p = subprocess.Popen(conversion_command, stdin=stdin_parameter,
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        p_out, p_err = p.communicate(input=stdin_data)
+        stderr_thread, p_err = _drain_in_thread(p.stderr)
+        feeder = None
+        if stdin_parameter is not None:
+            feeder = _feed_in_thread(p.stdin, file)
 
-        if p.returncode != 0 or len(p_out) == 0:
+        try:
+            wav_info = None
+            if raw:
+                frame_rate, channels, sample_width = raw.frame_rate, raw.channels, raw.sample_width
+            else:
+                try:
+                    wav_info = read_wav_header(p.stdout)
+                except CouldntDecodeError:
+                    pass
+                else:
+                    frame_rate, channels = wav_info.sample_rate, wav_info.channels
+                    sample_width = stored_sample_width(wav_info)
+
+            data = None
+            if raw or wav_info:
+                # size the buffer from the probed duration (plus a second of
+                # slack), so the audio is read in place with no copies
+                seconds = _probed_duration(info)
+                if seconds is not None:
+                    if start_second is not None:
+                        seconds -= start_second
+                    if duration is not None:
+                        seconds = min(seconds, duration)
+                    seconds = max(seconds, 0) + 1
+                elif wav_info and wav_info.data_size:
+                    seconds = wav_info.data_size / float(frame_rate * channels * sample_width)
+                size_hint = int((seconds or 0) * frame_rate) * channels * sample_width
+                data = read_into_buffer(p.stdout, size_hint)
+            p.wait()
+        finally:
+            if p.poll() is None:
+                p.kill()
+            p.stdout.close()
+            p.wait()
+            stderr_thread.join()
+            if feeder is not None:
+                feeder.join()
             if close_file:
                 file.close()
+
+        p_err = b''.join(p_err)
+        log_subprocess_output(p_err)
+        if p.returncode != 0 or data is None:
             raise CouldntDecodeError(
                 "Decoding failed. ffmpeg returned error code: {0}\n\nOutput from ffmpeg/avlib:\n\n{1}".format(
                     p.returncode, p_err.decode(errors='ignore') ))
 
-        p_out = bytearray(p_out)
-        fix_wav_headers(p_out)
-        p_out = bytes(p_out)
-        obj = cls(p_out)
-
-        if close_file:
-            file.close()
+        frame_width = channels * sample_width
+        if wav_info and wav_info.data_size is not None:
+            del data[wav_info.data_size:]
+        del data[len(data) - len(data) % frame_width:]
+        if wav_info:
+            # e.g. unsigned 8-bit samples
+            data = to_pcm(data, wav_info)
+            sample_width = pcm_sample_width(wav_info)
+            frame_width = channels * sample_width
+
+        obj = cls(data=memoryview(data), metadata={
+            'sample_width': sample_width,
+            'frame_rate': frame_rate,
+            'channels': channels,
+            'frame_width': frame_width,
+            'keep_24bit': keep_24bit,
+        })
 
         if start_second is None and duration is None:
             return obj
@@ -791,6 +1327,281 @@ class AudioSegment(object):
         else:
             return obj[0:duration * 1000]
 
+    @classmethod
+    def _read_pcm_range(cls, f, data_start, data_size, sample_width, frame_rate, channels,
+                        start_second=None, duration=None, info=None, keep_24bit=None):
+        """
+        Reads the part of the PCM data starting at data_start in f (data_size
+        bytes long, None for up to the end of f) that start_second and
+        duration select, seeking straight to it. The result is the same as
+        slicing the segment of the whole data.
+
+        sample_width is that of the stored samples, which are converted with
+        to_pcm when info (the stream's WavStreamInfo) is given.
+        """
+        frame_width = sample_width * channels
+        if data_size is None:
+            data_size = f.seek(0, 2) - data_start
+        frame_count = data_size // frame_width
+        length = round(1000 * (frame_count / frame_rate))
+
+        # the bounds __getitem__ would compute on the whole segment
+        start = 0 if start_second is None else start_second * 1000
+        end = length if duration is None else start + duration * 1000
+        start = min(start, length)
+        end = min(end, length)
+        if start < 0:
+            start = length - abs(start)
+        if end < 0:
+            end = length - abs(end)
+        start = int(start * (frame_rate / 1000.0))
+        end = int(end * (frame_rate / 1000.0))
+
+        size = max(0, min(end, frame_count) - start) * frame_width
+        f.seek(data_start + start * frame_width)
+        data = next(iter_blocks(f, size, limit=size), bytearray()) if size else bytearray()
+        if info is not None and needs_conversion(info):
+            data = to_pcm(data, info)
+            sample_width = pcm_sample_width(info)
+            frame_width = sample_width * channels
+
+        missing_frames = end - start - len(data) // frame_width
+        if missing_frames > 0 and data:
+            if missing_frames > frame_rate * 2 / 1000.0:
+                raise TooManyMissingFrames(
+                    "You should never be filling in "
+                    "   more than 2 ms with silence here, "
+                    "missing frames: %s" % missing_frames)
+            data += b'\0' * (missing_frames * frame_width)
+
+        return cls(data=memoryview(data), metadata={
+            'sample_width': sample_width,
+            'frame_rate': frame_rate,
+            'channels': channels,
+            'frame_width': frame_width,
+            'keep_24bit': cls.keep_24bit if keep_24bit is None else keep_24bit,
+        })
+
+    @classmethod
+    def _map_pcm(cls, f, data_start, data_size, sample_width, frame_rate, channels,
+                 start_second=None, duration=None, keep_24bit=None):
+        """
+        Returns a segment over the PCM data starting at data_start in f
+        (data_size bytes long, None for up to the end of f) through a memory
+        map of f, or None if f can't be mapped. start_second and duration
+        select a part of it like they do for _read_pcm_range.
+        """
+        view = _map_file(f)
+        if view is None:
+            return None
+
+        frame_width = sample_width * channels
+        end = len(view) if data_size is None else min(len(view), data_start + data_size)
+        data = view[data_start:end]
+        data = data[:len(data) - len(data) % frame_width]
+        seg = cls(data=data, metadata={
+            'sample_width': sample_width,
+            'frame_rate': frame_rate,
+            'channels': channels,
+            'frame_width': frame_width,
+            'keep_24bit': cls.keep_24bit if keep_24bit is None else keep_24bit,
+        })
+
+        if start_second is None and duration is None:
+            return seg
+        start = 0 if start_second is None else start_second * 1000
+        end = None if duration is None else start + duration * 1000
+        return seg[start:end]
+
+    @classmethod
+    def iter_file(cls, file, block_ms=1000, format=None, codec=None, parameters=None,
+                  start_second=None, duration=None, keep_24bit=None, **kwargs):
+        """
+        Decodes file incrementally, yielding it as consecutive AudioSegments
+        of block_ms milliseconds (the last one may be shorter).
+
+        Only the block being yielded is held in memory, so inputs of any
+        length are processed in bounded memory. wav (and the other
+        NATIVE_FORMATS) and raw files are read directly, everything else
+        is decoded by ffmpeg and read from its stdout as it is produced.
+
+        Takes the same arguments as from_file (raw/pcm input needs
+        sample_width, frame_rate and channels).
+        """
+        orig_file = file
+        try:
+            filename = fsdecode(file)
+        except TypeError:
+            filename = None
+        file, close_file = _fd_or_path_or_tempfile(file, 'rb', tempfile=False)
+
+        if format:
+            format = format.lower()
+            format = AUDIO_FILE_EXT_ALIASES.get(format, format)
+
+        def is_format(f):
+            f = f.lower()
+            if format == f:
+                return True
+
+            if filename:
+                return filename.lower().endswith(".{0}".format(f))
+
+            return False
+
+        try:
+            if any(is_format(f) for f in NATIVE_FORMATS):
+                try:
+                    info = read_audio_header(file)
+                except CouldntDecodeError:
+                    # let ffmpeg have a go at it
+                    file.seek(0)
+                else:
+                    for block in cls._iter_pcm(file, info, block_ms, start_second, duration,
+                                               keep_24bit):
+                        yield block
+                    return
+            elif is_format("raw") or is_format("pcm"):
+                info = WavStreamInfo(1, kwargs['channels'], kwargs['frame_rate'],
+                                     kwargs['sample_width'] * 8, None)
+                for block in cls._iter_pcm(file, info, block_ms, start_second, duration,
+                                           keep_24bit):
+                    yield block
+                return
+
+            conversion_command = [cls.converter,
+                                  '-y',  # always overwrite existing files
+                                  ]
+
+            # If format is not defined
+            # ffmpeg/avconv will detect it automatically
+            if format:
+                conversion_command += ["-f", format]
+
+            if codec:
+                # force audio decoder
+                conversion_command += ["-acodec", codec]
+
+            input_seek, output_seek = _seek_arguments(start_second)
+            conversion_command += input_seek
+
+            read_ahead_limit = kwargs.get('read_ahead_limit', -1)
+            if filename:
+                conversion_command += ["-i", filename]
+                stdin_parameter = subprocess.DEVNULL
+            else:
+                if cls.converter == 'ffmpeg':
+                    conversion_command += ["-read_ahead_limit", str(read_ahead_limit),
+                                           "-i", "cache:pipe:0"]
+                else:
+                    conversion_command += ["-i", "-"]
+                stdin_parameter = subprocess.PIPE
+
+            # probing a file object would mean reading all of it up front
+            info = None
+            if filename and not codec:
+                info = mediainfo_json(orig_file, read_ahead_limit=read_ahead_limit)
+            if info:
+                conversion_command += ["-acodec", _pcm_codec_for(info)]
+
+            conversion_command += [
+                "-vn",  # Drop any video streams if there are any
+                "-f", "wav"  # output options (filename last)
+            ]
+
+            conversion_command += output_seek
+
+            if duration is not None:
+                conversion_command += ["-t", str(duration)]
+
+            conversion_command += ["-"]
+
+            if parameters is not None:
+                # extend arguments with arbitrary set
+                conversion_command.extend(parameters)
+
+            log_conversion(conversion_command)
+
+            p = subprocess.Popen(conversion_command, stdin=stdin_parameter,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stderr_thread, p_err = _drain_in_thread(p.stderr, keep=64)
+            feeder = None
+            if stdin_parameter == subprocess.PIPE:
+                feeder = _feed_in_thread(p.stdin, file)
+
+            try:
+                try:
+                    info = read_wav_header(p.stdout)
+                except CouldntDecodeError:
+                    info = None
+
+                if info is not None:
+                    # -ss and -t were already applied by ffmpeg
+                    for block in cls._iter_pcm(p.stdout, info, block_ms, keep_24bit=keep_24bit):
+                        yield block
+
+                p.wait()
+                stderr_thread.join()
+                if p.returncode != 0 or info is None:
+                    raise CouldntDecodeError(
+                        "Decoding failed. ffmpeg returned error code: {0}\n\nOutput from ffmpeg/avlib:\n\n{1}".format(
+                            p.returncode, b''.join(p_err).decode(errors='ignore')))
+            finally:
+                # stop ffmpeg if the caller stopped iterating early
+                if p.poll() is None:
+                    p.kill()
+                p.stdout.close()
+                p.wait()
+                stderr_thread.join()
+                if feeder is not None:
+                    feeder.join()
+                log_subprocess_output(b''.join(p_err))
+        finally:
+            if close_file:
+                file.close()
+
+    @classmethod
+    def _iter_pcm(cls, f, info, block_ms, start_second=None, duration=None, keep_24bit=None):
+        """
+        Yields the audio read from f, stored as info (a WavStreamInfo)
+        describes, as AudioSegments of block_ms milliseconds. No more than
+        info.data_size bytes are read, start_second and duration select a
+        part of the audio.
+        """
+        sample_width = stored_sample_width(info)
+        frame_rate = info.sample_rate
+        channels = info.channels
+        frame_width = sample_width * channels
+        limit = info.data_size
+        metadata = {
+            'sample_width': pcm_sample_width(info),
+            'frame_rate': frame_rate,
+            'channels': channels,
+            'frame_width': pcm_sample_width(info) * channels,
+            'keep_24bit': cls.keep_24bit if keep_24bit is None else keep_24bit,
+        }
+
+        def frames(seconds):
+            # the same rounding as slicing the whole segment
+            return int((seconds * 1000) * (frame_rate / 1000.0))
+
+        start = frames(start_second) if start_second else 0
+        if start:
+            skipped = skip(f, start * frame_width)
+            if limit is not None:
+                limit = max(0, limit - skipped)
+        if duration is not None:
+            size = (frames((start_second or 0) + duration) - start) * frame_width
+            limit = size if limit is None else min(limit, size)
+
+        block_size = max(1, int(block_ms * frame_rate / 1000.0)) * frame_width
+        for block in iter_blocks(f, block_size, limit):
+            # drop a truncated last frame
+            del block[len(block) - len(block) % frame_width:]
+            if not block:
+                break
+            yield cls(data=memoryview(to_pcm(block, info)), metadata=metadata)
+
     @classmethod
     def from_mp3(cls, file, parameters=None):
         return cls.from_file(file, 'mp3', parameters=parameters)
@@ -804,19 +1615,20 @@ class AudioSegment(object):
         return cls.from_file(file, 'ogg', parameters=parameters)
 
     @classmethod
-    def from_wav(cls, file, parameters=None):
-        return cls.from_file(file, 'wav', parameters=parameters)
+    def from_wav(cls, file, parameters=None, mmap=False):
+        return cls.from_file(file, 'wav', parameters=parameters, mmap=mmap)
 
     @classmethod
     def from_raw(cls, file, **kwargs):
         return cls.from_file(file, 'raw', sample_width=kwargs['sample_width'], frame_rate=kwargs['frame_rate'],
-                             channels=kwargs['channels'])
+                             channels=kwargs['channels'], mmap=kwargs.get('mmap', False),
+                             keep_24bit=kwargs.get('keep_24bit'))
 
     @classmethod
-    def _from_safe_wav(cls, file):
+    def _from_safe_wav(cls, file, keep_24bit=None, sample_format=None):
         file, close_file = _fd_or_path_or_tempfile(file, 'rb', tempfile=False)
         file.seek(0)
-        obj = cls(data=file)
+        obj = cls(data=file, keep_24bit=keep_24bit, sample_format=sample_format)
         if close_file:
             file.close()
         return obj
@@ -856,14 +1668,18 @@ class AudioSegment(object):
         cover (file)
             Set cover for audio file from image file. (png or jpg)
         """
-        id3v2_allowed_versions = ['3', '4']
-
         if format == "raw" and (codec is not None or parameters is not None):
             raise AttributeError(
                     'Can not invoke ffmpeg when export format is "raw"; '
                     'specify an ffmpeg raw format like format="s16le" instead '
                     'or call export(format="raw") with no codec or parameters')
 
+        if self._floating:
+            # back to integer PCM, once, at the end of the chain
+            return self.set_sample_format("int").export(
+                out_f, format=format, codec=codec, bitrate=bitrate, parameters=parameters,
+                tags=tags, id3v2_version=id3v2_version, cover=cover)
+
         out_f, _ = _fd_or_path_or_tempfile(out_f, 'wb+')
         out_f.seek(0)
 
@@ -873,113 +1689,25 @@ class AudioSegment(object):
             return out_f
 
         # wav with no ffmpeg parameters can just be written directly to out_f
-        easy_wav = format == "wav" and codec is None and parameters is None
+        if format == "wav" and codec is None and parameters is None:
+            pcm_for_wav = self._data
+            if self.sample_width == 1:
+                # convert to unsigned integers for wav
+                pcm_for_wav = audioop.bias(self._data, 1, 128)
+
+            # RF64 when the audio doesn't fit in a plain wav file
+            write_wav(out_f, pcm_for_wav, self.channels, self.frame_rate, self.sample_width)
 
-        if easy_wav:
-            data = out_f
-        else:
-            data = NamedTemporaryFile(mode="wb", delete=False)
-
-        pcm_for_wav = self._data
-        if self.sample_width == 1:
-            # convert to unsigned integers for wav
-            pcm_for_wav = audioop.bias(self._data, 1, 128)
-
-        wave_data = wave.open(data, 'wb')
-        wave_data.setnchannels(self.channels)
-        wave_data.setsampwidth(self.sample_width)
-        wave_data.setframerate(self.frame_rate)
-        # For some reason packing the wave header struct with
-        # a float in python 2 doesn't throw an exception
-        wave_data.setnframes(int(self.frame_count()))
-        wave_data.writeframesraw(pcm_for_wav)
-        wave_data.close()
-
-        # for easy wav files, we're done (wav data is written directly to out_f)
-        if easy_wav:
             out_f.seek(0)
             return out_f
 
-        output = NamedTemporaryFile(mode="w+b", delete=False)
-
-        # build converter command to export
-        conversion_command = [
-            self.converter,
-            '-y',  # always overwrite existing files
-            "-f", "wav", "-i", data.name,  # input options (filename last)
-        ]
-
-        if codec is None:
-            codec = self.DEFAULT_CODECS.get(format, None)
-
-        if cover is not None:
-            if cover.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')) and format == "mp3":
-                conversion_command.extend(["-i", cover, "-map", "0", "-map", "1", "-c:v", "mjpeg"])
-            else:
-                raise AttributeError(
-                    "Currently cover images are only supported by MP3 files. The allowed image formats are: .tif, .jpg, .bmp, .jpeg and .png.")
-
-        if codec is not None:
-            # force audio encoder
-            conversion_command.extend(["-acodec", codec])
-
-        if bitrate is not None:
-            conversion_command.extend(["-b:a", bitrate])
-
-        if parameters is not None:
-            # extend arguments with arbitrary set
-            conversion_command.extend(parameters)
-
-        if tags is not None:
-            if not isinstance(tags, dict):
-                raise InvalidTag("Tags must be a dictionary.")
-            else:
-                # Extend converter command with tags
-                # print(tags)
-                for key, value in tags.items():
-                    conversion_command.extend(
-                        ['-metadata', '{0}={1}'.format(key, value)])
-
-                if format == 'mp3':
-                    # set id3v2 tag version
-                    if id3v2_version not in id3v2_allowed_versions:
-                        raise InvalidID3TagVersion(
-                            "id3v2_version not allowed, allowed versions: %s" % id3v2_allowed_versions)
-                    conversion_command.extend([
-                        "-id3v2_version", id3v2_version
-                    ])
-
-        if sys.platform == 'darwin' and codec == 'mp3':
-            conversion_command.extend(["-write_xing", "0"])
-
-        conversion_command.extend([
-            "-f", format, output.name,  # output options (filename last)
-        ])
-
-        log_conversion(conversion_command)
-
-        # read stdin / write stdout
-        with open(os.devnull, 'rb') as devnull:
-            p = subprocess.Popen(conversion_command, stdin=devnull, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        p_out, p_err = p.communicate()
-
-        log_subprocess_output(p_out)
-        log_subprocess_output(p_err)
-
-        try:
-            if p.returncode != 0:
-                raise CouldntEncodeError(
-                    "Encoding failed. ffmpeg/avlib returned error code: {0}\n\nCommand:{1}\n\nOutput from ffmpeg/avlib:\n\n{2}".format(
-                        p.returncode, conversion_command, p_err.decode(errors='ignore') ))
-
-            output.seek(0)
-            out_f.write(output.read())
-
-        finally:
-            data.close()
-            output.close()
-            os.unlink(data.name)
-            os.unlink(output.name)
+        # pipe the raw samples into ffmpeg and the encoded data out of it
+        # (through a temporary file for formats that need a seekable output)
+        with AudioEncoderSink(out_f, format=format, codec=codec, bitrate=bitrate,
+                              parameters=parameters, tags=tags, id3v2_version=id3v2_version,
+                              cover=cover, frame_rate=self.frame_rate, channels=self.channels,
+                              sample_width=self.sample_width) as sink:
+            sink.write(self)
 
         out_f.seek(0)
         return out_f
@@ -987,7 +1715,7 @@ class AudioSegment(object):
     def get_frame(self, index):
         frame_start = index * self.frame_width
         frame_end = frame_start + self.frame_width
-        return self._data[frame_start:frame_end]
+        return bytes(self._view()[frame_start:frame_end])
 
     def frame_count(self, ms=None):
         """
@@ -999,10 +1727,48 @@ class AudioSegment(object):
         else:
             return float(len(self._data) // self.frame_width)
 
+    def set_sample_format(self, sample_format, sample_width=None):
+        """
+        Converts to another sample format ("int" or "float32").
+
+        Integer samples become normalized float32 samples (with 1.0 as full
+        scale), the original sample width is kept as pcm_sample_width. Float
+        samples are scaled back to integers of sample_width bytes (by default
+        pcm_sample_width, or 4), rounding to the nearest integer and clipping.
+        """
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError("sample_format must be one of {0} (got {1!r})".format(
+                SAMPLE_FORMATS, sample_format))
+
+        if sample_format == "float32":
+            if self._floating:
+                return self
+            return self._spawn(int_to_float(self._data, self.sample_width), overrides={
+                'sample_format': sample_format,
+                'sample_width': 4,
+                'frame_width': self.channels * 4,
+                'pcm_sample_width': self.sample_width,
+            })
+
+        if not self._floating:
+            return self if sample_width is None else self.set_sample_width(sample_width)
+
+        sample_width = sample_width or self.pcm_sample_width or 4
+        samples = float_to_int(self._samples(), sample_width)
+        return self._spawn(tobytes(samples, sample_width), overrides={
+            'sample_format': sample_format,
+            'sample_width': sample_width,
+            'frame_width': self.channels * sample_width,
+            'pcm_sample_width': None,
+        })
+
     def set_sample_width(self, sample_width):
         if sample_width == self.sample_width:
             return self
 
+        if self._floating:
+            return self.set_sample_format("int", sample_width)
+
         frame_width = self.channels * sample_width
 
         return self._spawn(
@@ -1010,11 +1776,30 @@ class AudioSegment(object):
             overrides={'sample_width': sample_width, 'frame_width': frame_width}
         )
 
-    def set_frame_rate(self, frame_rate):
+    def set_frame_rate(self, frame_rate, quality=None):
+        """
+        Resamples to frame_rate with the band-limited polyphase resampler of
+        pydub_plus.core.resample. quality is one of its QUALITY_PRESETS
+        ("low", "medium", "high", "very_high"), by default the class's
+        resample_quality, or "linear" for audioop.ratecv's interpolation.
+
+        The polyphase presets cost several times as much CPU as "linear"
+        (about 10x for "high"). Mixing segments of different frame rates
+        goes through here too, so set resample_quality to "linear" where
+        that matters more than the quality.
+        """
         if frame_rate == self.frame_rate:
             return self
 
-        if self._data:
+        quality = quality or self.resample_quality
+        if quality != "linear":
+            check_quality(quality)
+            converted = self._resample(frame_rate, quality)
+        elif self._floating:
+            frames = self._samples().reshape(-1, self.channels)
+            converted = tobytes(linear_resample(frames, self.frame_rate, frame_rate),
+                                4, floating=True)
+        elif self._data:
             converted, _ = audioop.ratecv(self._data, self.sample_width,
                                           self.channels, self.frame_rate,
                                           frame_rate, None)
@@ -1024,81 +1809,197 @@ class AudioSegment(object):
         return self._spawn(data=converted,
                            overrides={'frame_rate': frame_rate})
 
+    def _resample(self, frame_rate, quality):
+        # block by block into the output buffer, so that only one block's
+        # worth of float frames exists at a time
+        frames = self._samples().reshape(-1, self.channels)
+        resampler = Resampler(self.frame_rate, frame_rate, self.channels, quality)
+        converted = bytearray(output_length(len(frames), self.frame_rate, frame_rate) *
+                              self.frame_width)
+        pos = 0
+        for start in range(0, len(frames) + 1, RESAMPLE_BLOCK_FRAMES):
+            block = frames[start:start + RESAMPLE_BLOCK_FRAMES]
+            out = resampler.process(block)
+            if start + RESAMPLE_BLOCK_FRAMES > len(frames):
+                out = np.concatenate((out, resampler.flush()))
+            data = self._encode(out)
+            converted[pos:pos + len(data)] = data
+            pos += len(data)
+        return converted
+
     def set_channels(self, channels):
+        """
+        Mixes down to mono (averaging the channels), duplicates mono to any
+        number of channels, or converts between the layouts in
+        CHANNEL_MATRICES (5.1 to stereo)
+        """
         if channels == self.channels:
             return self
 
-        if channels == 2 and self.channels == 1:
-            fn = audioop.tostereo
-            frame_width = self.frame_width * 2
-            fac = 1
-            converted = fn(self._data, self.sample_width, fac, fac)
-        elif channels == 1 and self.channels == 2:
-            fn = audioop.tomono
-            frame_width = self.frame_width // 2
-            fac = 0.5
-            converted = fn(self._data, self.sample_width, fac, fac)
-        elif channels == 1:
-            channels_data = [seg.get_array_of_samples() for seg in self.split_to_mono()]
-            frame_count = int(self.frame_count())
-            converted = array.array(
-                channels_data[0].typecode,
-                b'\0' * (frame_count * self.sample_width)
-            )
-            for raw_channel_data in channels_data:
-                for i in range(frame_count):
-                    converted[i] += raw_channel_data[i] // self.channels
-            frame_width = self.frame_width // self.channels
+        if channels == 1:
+            matrix = [[1.0 / self.channels] * self.channels]
         elif self.channels == 1:
-            dup_channels = [self for iChannel in range(channels)]
-            return AudioSegment.from_mono_audiosegments(*dup_channels)
+            matrix = [[1]] * channels
+        elif (self.channels, channels) in CHANNEL_MATRICES:
+            matrix = CHANNEL_MATRICES[(self.channels, channels)]
         else:
             raise ValueError(
-                "AudioSegment.set_channels only supports mono-to-multi channel and multi-to-mono channel conversion")
+                "AudioSegment.set_channels only supports mono-to-multi channel, multi-to-mono channel "
+                "and 5.1-to-stereo conversion, use AudioSegment.remix for others")
+
+        return self.remix(matrix)
+
+    def remix(self, matrix):
+        """
+        Mixes the channels through a gain matrix, in a single pass. matrix
+        has one row per output channel, holding the gain (as an amplitude
+        ratio) applied to each input channel: [[0.5, 0.5]] mixes stereo down
+        to mono, [[1], [1]] duplicates mono to stereo and [[1, 0], [0, -1]]
+        inverts the phase of the right channel.
+
+        Samples are rounded and saturated like audioop's (floats are neither).
+        """
+        matrix = [list(row) for row in matrix]
+        if not matrix or any(len(row) != self.channels for row in matrix):
+            raise ValueError(
+                "matrix must have one row per output channel, each with one gain per "
+                "input channel ({0})".format(self.channels))
 
+        converted = remix_channels(self._data, self.sample_width, self.channels, matrix,
+                                   floating=self._floating)
         return self._spawn(data=converted,
                            overrides={
-                               'channels': channels,
-                               'frame_width': frame_width})
+                               'channels': len(matrix),
+                               'frame_width': len(matrix) * self.sample_width})
 
     def split_to_mono(self):
+        """
+        Returns one mono AudioSegment per channel. The channels are copied
+        out of the frames in a single pass, into one buffer the returned
+        segments share.
+        """
         if self.channels == 1:
             return [self]
 
-        samples = self.get_array_of_samples()
+        planar = deinterleave(self._data, self.sample_width, self.channels)
+        return [
+            self._spawn(memoryview(plane), overrides={"channels": 1, "frame_width": self.sample_width})
+            for plane in planar
+        ]
 
-        mono_channels = []
-        for i in range(self.channels):
-            samples_for_current_channel = samples[i::self.channels]
+    def map_channels(self, fn, channels=None):
+        """
+        Applies fn, which takes and returns a mono AudioSegment, to each
+        channel (or only to those whose 0-based index is in channels) and
+        merges the results back into one segment.
+        """
+        mono = self.split_to_mono()
+        if channels is None:
+            channels = range(len(mono))
+        channels = set(channels)
+        return self.from_mono_audiosegments(*[
+            fn(seg) if i in channels else seg for i, seg in enumerate(mono)
+        ])
 
-            try:
-                mono_data = samples_for_current_channel.tobytes()
-            except AttributeError:
-                mono_data = samples_for_current_channel.tostring()
+    def get_channel_arrays(self):
+        """
+        Returns one numpy array per channel, strided (read-only) views of
+        the samples rather than copies. 24-bit samples are unpacked into
+        int32 arrays, float32 segments give float32 arrays.
+        """
+        frames = self._samples().reshape(-1, self.channels)
+        frames.flags.writeable = False
+        return [frames[:, i] for i in range(self.channels)]
+
+    def _measured(self, name, measure):
+        # segments are immutable, so measurements are computed once
+        cache = self.__dict__.setdefault('_measurements', {})
+        if name not in cache:
+            cache[name] = measure()
+        return cache[name]
+
+    def stats(self):
+        """
+        Measures the peak, RMS, DC offset, number of clipped samples (those
+        at the limits of the sample range) and crest factor of every channel
+        in a single pass. Returns a SegmentStats, with the overall values
+        (rms is the rms property) and one ChannelStats per channel.
+
+        The result is cached on the segment. rms, dBFS, max, max_dBFS and
+        get_dc_offset read from it once it's there, so calling stats() first
+        makes asking for several of them a single pass.
+        """
+        return self._measured('stats', self._measure_stats)
+
+    def energy_index(self):
+        """
+        Returns the EnergyIndex of the segment (the sums of its squared
+        samples per millisecond, 10 ms, ...), which the silence functions
+        answer their queries from, whatever the threshold, without reading
+        the samples again. Built on first use and cached on the segment.
+        """
+        return self._measured('energy_index', lambda: EnergyIndex.from_segment(self))
 
-            mono_channels.append(
-                self._spawn(mono_data, overrides={"channels": 1, "frame_width": self.sample_width})
-            )
+    def _measure_stats(self):
+        peaks, sums, squares, clipped, total_squares = measure_channels(
+            self._data, self.sample_width, self.channels, self._floating)
+        frame_count = len(self._data) // self.frame_width
+        full_scale = self.max_possible_amplitude
+        number = float if self._floating else int
 
-        return mono_channels
+        channels = []
+        for i in range(self.channels):
+            rms = math.sqrt(squares[i] / frame_count) if frame_count else 0.0
+            if self._floating:
+                mean = sums[i] / frame_count if frame_count else 0.0
+            else:
+                # rounded down, like audioop.avg
+                mean = math.floor(float(sums[i]) / frame_count) if frame_count else 0
+            channels.append(ChannelStats(
+                peak=number(peaks[i]),
+                rms=rms,
+                dc_offset=float(mean) / full_scale,
+                clipped=int(clipped[i]),
+                crest_factor=float(peaks[i]) / rms if rms else 0.0,
+            ))
+
+        sample_count = frame_count * self.channels
+        rms = math.sqrt(total_squares / sample_count) if sample_count else 0.0
+        peak = max(c.peak for c in channels) if channels else number(0)
+        cache = self.__dict__.setdefault('_measurements', {})
+        cache['rms'] = rms if self._floating else int(rms)
+        cache['max'] = peak
+        return SegmentStats(
+            peak=peak,
+            rms=cache['rms'],
+            clipped=sum(c.clipped for c in channels),
+            crest_factor=peak / rms if rms else 0.0,
+            channels=tuple(channels),
+        )
 
     @property
     def rms(self):
-        return audioop.rms(self._data, self.sample_width)
+        if self._floating:
+            return self._measured('rms', lambda: self.stats().rms)
+        return self._measured('rms', lambda: audioop.rms(self._data, self.sample_width))
 
     @property
     def dBFS(self):
         rms = self.rms
         if not rms:
             return -float("infinity")
-        return ratio_to_db(self.rms / self.max_possible_amplitude)
+        return ratio_to_db(rms / self.max_possible_amplitude)
 
     @property
     def max(self):
-        return audioop.max(self._data, self.sample_width)
+        if self._floating:
+            return self._measured('max', lambda: self.stats().peak)
+        return self._measured('max', lambda: audioop.max(self._data, self.sample_width))
 
     @property
     def max_possible_amplitude(self):
+        if self._floating:
+            return 1.0
         bits = self.sample_width * 8
         max_possible_val = (2 ** bits)
 
@@ -1121,14 +2022,7 @@ class AudioSegment(object):
         if not 1 <= channel <= 2:
             raise ValueError("channel value must be 1 (left) or 2 (right)")
 
-        if self.channels == 1:
-            data = self._data
-        elif channel == 1:
-            data = audioop.tomono(self._data, self.sample_width, 1, 0)
-        else:
-            data = audioop.tomono(self._data, self.sample_width, 0, 1)
-
-        return float(audioop.avg(data, self.sample_width)) / self.max_possible_amplitude
+        return self.stats().channels[min(channel, self.channels) - 1].dc_offset
 
     def remove_dc_offset(self, channel=None, offset=None):
         """
@@ -1142,6 +2036,13 @@ class AudioSegment(object):
         if offset and not -1.0 <= offset <= 1.0:
             raise ValueError("offset value must be in range -1.0 to 1.0")
 
+        if self._floating:
+            frames = np.array(self._samples().reshape(-1, self.channels))
+            for i in range(min(self.channels, 2)):
+                if not channel or channel == i + 1:
+                    frames[:, i] -= offset or (frames[:, i].mean(dtype=np.float64) if len(frames) else 0)
+            return self._spawn(data=tobytes(frames, 4, floating=True))
+
         if offset:
             offset = int(round(offset * self.max_possible_amplitude))
 
@@ -1169,8 +2070,7 @@ class AudioSegment(object):
                                             self.sample_width))
 
     def apply_gain(self, volume_change):
-        return self._spawn(data=audioop.mul(self._data, self.sample_width,
-                                            db_to_float(float(volume_change))))
+        return self._spawn(data=self._scale(self._data, db_to_float(float(volume_change))))
 
     def overlay(self, seg, position=0, loop=False, times=None, gain_during_overlay=None):
         """
@@ -1196,6 +2096,9 @@ class AudioSegment(object):
             Changes this segment's volume by the specified amount during the
             duration of time that seg is overlaid on top of it. When negative,
             this has the effect of 'ducking' the audio under the overlay.
+
+        All the repetitions are mixed in a single vectorized pass, into one
+        preallocated output buffer.
         """
 
         if loop:
@@ -1208,76 +2111,29 @@ class AudioSegment(object):
             # it's a no-op, make a copy since we never mutate
             return self._spawn(self._data)
 
-        output = StringIO()
-
         seg1, seg2 = AudioSegment._sync(self, seg)
-        sample_width = seg1.sample_width
-        spawn = seg1._spawn
 
-        output.write(seg1[:position]._data)
+        # the audio before position is copied as is, the overlay is mixed
+        # into everything after it
+        before = seg1[:position]._data
+        after = seg1[position:]._data
 
-        # drop down to the raw data
-        seg1 = seg1[position:]._data
-        seg2 = seg2._data
-        pos = 0
-        seg1_len = len(seg1)
-        seg2_len = len(seg2)
-        while times:
-            remaining = max(0, seg1_len - pos)
-            if seg2_len >= remaining:
-                seg2 = seg2[:remaining]
-                seg2_len = remaining
-                # we've hit the end, we're done looping (if we were) and this
-                # is our last go-around
-                times = 1
-
-            if gain_during_overlay:
-                seg1_overlaid = seg1[pos:pos + seg2_len]
-                seg1_adjusted_gain = audioop.mul(seg1_overlaid, self.sample_width,
-                                                 db_to_float(float(gain_during_overlay)))
-                output.write(audioop.add(seg1_adjusted_gain, seg2, sample_width))
-            else:
-                output.write(audioop.add(seg1[pos:pos + seg2_len], seg2,
-                                         sample_width))
-            pos += seg2_len
+        gain = None
+        if gain_during_overlay:
+            gain = db_to_float(float(gain_during_overlay))
 
-            # dec times to break our while loop (eventually)
-            times -= 1
+        output = bytearray(len(before) + len(after))
+        output[:len(before)] = before
+        overlay_into(memoryview(output)[len(before):], after, seg2._data,
+                     seg1.sample_width, times=times, gain=gain, floating=seg1._floating)
 
-        output.write(seg1[pos:])
-
-        return spawn(data=output)
+        return seg1._spawn(data=memoryview(output))
 
     def append(self, seg, crossfade=100):
-        seg1, seg2 = AudioSegment._sync(self, seg)
-
-        if not crossfade:
-            return seg1._spawn(seg1._data + seg2._data)
-        elif crossfade > len(self):
-            raise ValueError("Crossfade is longer than the original AudioSegment ({}ms > {}ms)".format(
-                crossfade, len(self)
-            ))
-        elif crossfade > len(seg):
-            raise ValueError("Crossfade is longer than the appended AudioSegment ({}ms > {}ms)".format(
-                crossfade, len(seg)
-            ))
-
-        xf = seg1[-crossfade:].fade(to_gain=-120, start=0, end=float('inf'))
-        xf *= seg2[:crossfade].fade(from_gain=-120, start=0, end=float('inf'))
-
-        output = BytesIO()
-
-        output.write(seg1[:-crossfade]._data)
-        output.write(xf._data)
-        output.write(seg2[crossfade:]._data)
-
-        output.seek(0)
-        obj = seg1._spawn(data=output)
-        output.close()
-        return obj
+        return self.concatenate([self, seg], crossfade=crossfade)
 
     def fade(self, to_gain=0, from_gain=0, start=None, end=None,
-             duration=None):
+             duration=None, curve="linear"):
         """
         Fade the volume of this audio segment.
 
@@ -1295,6 +2151,16 @@ class AudioSegment(object):
         duration (int):
             default = until the end of the audio segment
             the duration of the fade
+
+        curve (string or function):
+            default = "linear"
+            the shape of the fade: "linear" (in amplitude), "exponential"
+            (linear in dB, also available as "db"), "equal_power" or
+            "s_curve". A function mapping the fade position (a numpy array of
+            values in [0, 1)) to the fade progress (0 = from_gain,
+            1 = to_gain) can be passed for custom shapes.
+
+        The gain is computed for every sample of the fade, in one pass.
         """
         if None not in [duration, end, start]:
             raise TypeError('Only two of the three arguments, "start", '
@@ -1330,55 +2196,38 @@ class AudioSegment(object):
         # original data - up until the crossfade portion, as is
         before_fade = self[:start]._data
         if from_gain != 0:
-            before_fade = audioop.mul(before_fade,
-                                      self.sample_width,
-                                      from_power)
+            before_fade = self._scale(before_fade, from_power)
         output.append(before_fade)
 
-        gain_delta = db_to_float(to_gain) - from_power
-
-        # fades longer than 100ms can use coarse fading (one gain step per ms),
-        # shorter fades will have audible clicks so they use precise fading
-        # (one gain step per sample)
-        if duration > 100:
-            scale_step = gain_delta / duration
-
-            for i in range(duration):
-                volume_change = from_power + (scale_step * i)
-                chunk = self[start + i]
-                chunk = audioop.mul(chunk._data,
-                                    self.sample_width,
-                                    volume_change)
-
-                output.append(chunk)
-        else:
-            start_frame = self.frame_count(ms=start)
-            end_frame = self.frame_count(ms=end)
-            fade_frames = end_frame - start_frame
-            scale_step = gain_delta / fade_frames
-
-            for i in range(int(fade_frames)):
-                volume_change = from_power + (scale_step * i)
-                sample = self.get_frame(int(start_frame + i))
-                sample = audioop.mul(sample, self.sample_width, volume_change)
-
-                output.append(sample)
+        # one gain step per sample for the whole fade
+        start_frame = self._parse_position(start)
+        end_frame = self._parse_position(end)
+        fade_frames = end_frame - start_frame
+        if fade_frames > 0:
+            envelope = fade_envelope(fade_frames, from_power,
+                                     db_to_float(to_gain), curve)
+            fade_data = self._view()[start_frame * self.frame_width:
+                                     end_frame * self.frame_width]
+            output.append(apply_envelope(fade_data, self.sample_width,
+                                         self.channels, envelope, self._floating))
+
+            # keep the fade as long as requested, even past the last frame
+            missing_frames = fade_frames - len(fade_data) // self.frame_width
+            output.append(b'\0' * (missing_frames * self.frame_width))
 
         # original data after the crossfade portion, at the new volume
         after_fade = self[end:]._data
         if to_gain != 0:
-            after_fade = audioop.mul(after_fade,
-                                     self.sample_width,
-                                     db_to_float(to_gain))
+            after_fade = self._scale(after_fade, db_to_float(to_gain))
         output.append(after_fade)
 
         return self._spawn(data=output)
 
-    def fade_out(self, duration):
-        return self.fade(to_gain=-120, duration=duration, end=float('inf'))
+    def fade_out(self, duration, curve="linear"):
+        return self.fade(to_gain=-120, duration=duration, end=float('inf'), curve=curve)
 
-    def fade_in(self, duration):
-        return self.fade(from_gain=-120, duration=duration, start=0)
+    def fade_in(self, duration, curve="linear"):
+        return self.fade(from_gain=-120, duration=duration, start=0, curve=curve)
 
     def reverse(self):
         return self._spawn(
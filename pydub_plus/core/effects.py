@@ -1,14 +1,12 @@
 import sys
-import math
-import array
 from .utils import (
     db_to_float,
     ratio_to_db,
     register_pydub_effect,
     make_chunks,
     audioop,
-    get_min_max_value
 )
+from .one_pole import OnePoleFilter
 from .silence import split_on_silence
 from .exceptions import TooManyMissingFrames, InvalidDuration
 
@@ -18,18 +16,7 @@ if sys.version_info >= (3, 0):
 
 @register_pydub_effect
 def apply_mono_filter_to_each_channel(seg, filter_fn):
-    n_channels = seg.channels
-
-    channel_segs = seg.split_to_mono()
-    channel_segs = [filter_fn(channel_seg) for channel_seg in channel_segs]
-
-    out_data = seg.get_array_of_samples()
-    for channel_i, channel_seg in enumerate(channel_segs):
-        for sample_i, sample in enumerate(channel_seg.get_array_of_samples()):
-            index = (sample_i * n_channels) + channel_i
-            out_data[index] = sample
-
-    return seg._spawn(out_data)
+    return seg.map_channels(filter_fn)
 
 
 @register_pydub_effect
@@ -86,12 +73,8 @@ def speedup(seg, playback_speed=1.5, chunk_size=150, crossfade=25):
     last_chunk = chunks[-1]
     chunks = [chunk[:-ms_to_remove_per_chunk] for chunk in chunks[:-1]]
 
-    out = chunks[0]
-    for chunk in chunks[1:]:
-        out = out.append(chunk, crossfade=crossfade)
-
-    out += last_chunk
-    return out
+    out = seg.concatenate(chunks, crossfade=crossfade)
+    return out + last_chunk
     
 
 @register_pydub_effect
@@ -105,11 +88,7 @@ def strip_silence(seg, silence_len=1000, silence_thresh=-16, padding=100):
     if not len(chunks):
         return seg[0:0]
 
-    seg = chunks[0]
-    for chunk in chunks[1:]:
-        seg = seg.append(chunk, crossfade=crossfade)
-
-    return seg
+    return seg.concatenate(chunks, crossfade=crossfade)
 
 
 @register_pydub_effect
@@ -178,9 +157,7 @@ def compress_dynamic_range(seg, threshold=-20.0, ratio=4.0, attack=5.0, release=
         
         frame = seg.get_frame(i)
         if attenuation != 0.0:
-            frame = audioop.mul(frame,
-                                seg.sample_width,
-                                db_to_float(-attenuation))
+            frame = seg._scale(frame, db_to_float(-attenuation))
         
         output.append(frame)
     
@@ -197,22 +174,14 @@ def invert_phase(seg, channels=(1, 1)):
     Note that mono AudioSegments will become stereo.
     """
     if channels == (1, 1):
-        inverted = audioop.mul(seg._data, seg.sample_width, -1.0)  
-        return seg._spawn(data=inverted)
-    
-    else:
-        if seg.channels == 2:
-            left, right = seg.split_to_mono()
-        else:
-            raise Exception("Can't implicitly convert an AudioSegment with " + str(seg.channels) + " channels to stereo.")
-            
-        if channels == (1, 0):    
-            left = left.invert_phase()
-        else:
-            right = right.invert_phase()
-        
-        return seg.from_mono_audiosegments(left, right)
-        
+        n = seg.channels
+        return seg.remix([[-1 if i == j else 0 for j in range(n)] for i in range(n)])
+
+    if seg.channels != 2:
+        raise Exception("Can't implicitly convert an AudioSegment with " + str(seg.channels) + " channels to stereo.")
+
+    left, right = (-1, 1) if channels == (1, 0) else (1, -1)
+    return seg.remix([[left, 0], [0, right]])
 
 
 # High and low pass filters based on implementation found on Stack Overflow:
@@ -224,27 +193,7 @@ def low_pass_filter(seg, cutoff):
         cutoff - Frequency (in Hz) where higher frequency signal will begin to
             be reduced by 6dB per octave (doubling in frequency) above this point
     """
-    RC = 1.0 / (cutoff * 2 * math.pi)
-    dt = 1.0 / seg.frame_rate
-
-    alpha = dt / (RC + dt)
-    
-    original = seg.get_array_of_samples()
-    filteredArray = array.array(seg.array_type, original)
-    
-    frame_count = int(seg.frame_count())
-
-    last_val = [0] * seg.channels
-    for i in range(seg.channels):
-        last_val[i] = filteredArray[i] = original[i]
-
-    for i in range(1, frame_count):
-        for j in range(seg.channels):
-            offset = (i * seg.channels) + j
-            last_val[j] = last_val[j] + (alpha * (original[offset] - last_val[j]))
-            filteredArray[offset] = int(last_val[j])
-
-    return seg._spawn(data=filteredArray)
+    return OnePoleFilter("low", cutoff, seg.frame_rate, seg.channels).filter(seg)
 
 
 @register_pydub_effect
@@ -253,31 +202,7 @@ def high_pass_filter(seg, cutoff):
         cutoff - Frequency (in Hz) where lower frequency signal will begin to
             be reduced by 6dB per octave (doubling in frequency) below this point
     """
-    RC = 1.0 / (cutoff * 2 * math.pi)
-    dt = 1.0 / seg.frame_rate
-
-    alpha = RC / (RC + dt)
-
-    minval, maxval = get_min_max_value(seg.sample_width * 8)
-    
-    original = seg.get_array_of_samples()
-    filteredArray = array.array(seg.array_type, original)
-    
-    frame_count = int(seg.frame_count())
-
-    last_val = [0] * seg.channels
-    for i in range(seg.channels):
-        last_val[i] = filteredArray[i] = original[i]
-
-    for i in range(1, frame_count):
-        for j in range(seg.channels):
-            offset = (i * seg.channels) + j
-            offset_minus_1 = ((i-1) * seg.channels) + j
-
-            last_val[j] = alpha * (last_val[j] + original[offset] - original[offset_minus_1])
-            filteredArray[offset] = int(min(max(last_val[j], minval), maxval))
-
-    return seg._spawn(data=filteredArray)
+    return OnePoleFilter("high", cutoff, seg.frame_rate, seg.channels).filter(seg)
     
     
 @register_pydub_effect
@@ -320,22 +245,14 @@ def apply_gain_stereo(seg, left_gain=0.0, right_gain=0.0):
     
     note: mono audio segments will be converted to stereo
     """
-    if seg.channels == 1:
-        left = right = seg
-    elif seg.channels == 2:
-        left, right = seg.split_to_mono()
-    
     l_mult_factor = db_to_float(left_gain)
     r_mult_factor = db_to_float(right_gain)
-    
-    left_data = audioop.mul(left._data, left.sample_width, l_mult_factor)
-    left_data = audioop.tostereo(left_data, left.sample_width, 1, 0)
-    
-    right_data = audioop.mul(right._data, right.sample_width, r_mult_factor)
-    right_data = audioop.tostereo(right_data, right.sample_width, 0, 1)
-    
-    output = audioop.add(left_data, right_data, seg.sample_width)
-    
-    return seg._spawn(data=output,
-                overrides={'channels': 2,
-                           'frame_width': 2 * seg.sample_width})
+
+    if seg.channels == 1:
+        matrix = [[l_mult_factor], [r_mult_factor]]
+    elif seg.channels == 2:
+        matrix = [[l_mult_factor, 0], [0, r_mult_factor]]
+    else:
+        raise ValueError("apply_gain_stereo needs a mono or stereo AudioSegment")
+
+    return seg.remix(matrix)
@@ -0,0 +1,293 @@
+"""
+Incremental encoding with a single ffmpeg process.
+"""
+import os
+import shutil
+import subprocess
+import sys
+from tempfile import NamedTemporaryFile
+
+from .exceptions import (
+    CouldntEncodeError,
+    InvalidID3TagVersion,
+    InvalidTag,
+)
+from .logging_utils import log_conversion, log_subprocess_output
+from .resample import SegmentResampler
+from .utils import _drain_in_thread, fsdecode
+
+# ffmpeg's name for the raw sample format of each sample width
+RAW_SAMPLE_FORMATS = {
+    1: 's8',
+    2: 's16le',
+    3: 's24le',
+    4: 's32le',
+}
+
+# muxers that seek back to fill in headers (sizes, durations, indexes, the
+# mp3 Xing/LAME frame with the encoder delay) once they are done. These
+# can't produce a proper file on a pipe.
+SEEKABLE_OUTPUT_FORMATS = frozenset([
+    'mp4', 'm4a', 'm4b', 'mov', 'ipod', '3gp', '3g2', 'psp', 'f4v',
+    'wav', 'w64', 'aiff', 'caf', 'flac', 'matroska', 'webm', 'mp3',
+])
+
+
+def needs_seekable_output(format, parameters=None):
+    """
+    Whether ffmpeg has to write format (with these extra parameters) to a
+    seekable file rather than to a pipe
+    """
+    if format in SEEKABLE_OUTPUT_FORMATS:
+        return True
+    # "-movflags +faststart" moves the index to the front after encoding
+    return any('faststart' in str(p) for p in parameters or ())
+
+
+def encoder_arguments(format, codec=None, bitrate=None, parameters=None, tags=None,
+                      id3v2_version='4', cover=None):
+    """
+    Builds the ffmpeg arguments that follow the audio input for an export
+    to format (an optional cover image input and the output options, up to
+    but not including "-f format <output>")
+    """
+    id3v2_allowed_versions = ['3', '4']
+    conversion_command = []
+
+    if cover is not None:
+        if cover.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')) and format == "mp3":
+            conversion_command.extend(["-i", cover, "-map", "0", "-map", "1", "-c:v", "mjpeg"])
+        else:
+            raise AttributeError(
+                "Currently cover images are only supported by MP3 files. The allowed image formats are: .tif, .jpg, .bmp, .jpeg and .png.")
+
+    if codec is not None:
+        # force audio encoder
+        conversion_command.extend(["-acodec", codec])
+
+    if bitrate is not None:
+        conversion_command.extend(["-b:a", bitrate])
+
+    if parameters is not None:
+        # extend arguments with arbitrary set
+        conversion_command.extend(parameters)
+
+    if tags is not None:
+        if not isinstance(tags, dict):
+            raise InvalidTag("Tags must be a dictionary.")
+        else:
+            # Extend converter command with tags
+            for key, value in tags.items():
+                conversion_command.extend(
+                    ['-metadata', '{0}={1}'.format(key, value)])
+
+            if format == 'mp3':
+                # set id3v2 tag version
+                if id3v2_version not in id3v2_allowed_versions:
+                    raise InvalidID3TagVersion(
+                        "id3v2_version not allowed, allowed versions: %s" % id3v2_allowed_versions)
+                conversion_command.extend([
+                    "-id3v2_version", id3v2_version
+                ])
+
+    if sys.platform == 'darwin' and codec == 'mp3':
+        conversion_command.extend(["-write_xing", "0"])
+
+    return conversion_command
+
+
+class AudioEncoderSink(object):
+    """
+    Encodes audio written to it block by block, with one ffmpeg process
+    reading raw PCM from its stdin. Encoded data goes straight to a path,
+    or is copied to a file object as ffmpeg produces it, so decode ->
+    process -> encode pipelines run in constant memory:
+
+        with AudioEncoderSink("out.mp3", format="mp3", bitrate="192k") as sink:
+            for block in AudioSegment.iter_file("in.flac"):
+                sink.write(block.apply_gain(-3))
+
+    The encoding options are those of AudioSegment.export. The PCM format
+    (frame_rate, channels, sample_width) is the first block's unless given,
+    later blocks are converted to it. Blocks are resampled as one stream
+    (see resample.SegmentResampler), so there are no seams between them.
+
+    Formats whose muxer has to seek (see SEEKABLE_OUTPUT_FORMATS: the
+    mp4/mov family, wav, w64, aiff, caf, flac, matroska, webm and mp3)
+    can't be encoded to a pipe. For those, output to a file object goes
+    through a temporary file that is copied to it on close. Output to a
+    path never does.
+    """
+
+    def __init__(self, out_f, format='mp3', codec=None, bitrate=None, parameters=None,
+                 tags=None, id3v2_version='4', cover=None, frame_rate=None, channels=None,
+                 sample_width=None):
+        from .audio_segment import AudioSegment
+
+        if format == "raw":
+            raise AttributeError(
+                'Can not invoke ffmpeg when export format is "raw"; '
+                'specify an ffmpeg raw format like format="s16le" instead')
+
+        if codec is None:
+            codec = AudioSegment.DEFAULT_CODECS.get(format, None)
+
+        self.out_f = out_f
+        self.format = format
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.converter = AudioSegment.converter
+        self.resample_quality = AudioSegment.resample_quality
+        self._output_arguments = encoder_arguments(format, codec, bitrate, parameters, tags,
+                                                   id3v2_version, cover)
+        self._seekable_output = needs_seekable_output(format, parameters)
+        self._output = None
+        self._resampler = None
+        self._process = None
+        self._closed = False
+        self._ended_early = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _start(self):
+        if self.sample_width is None:
+            self.sample_width = 2
+        if self.frame_rate is None:
+            self.frame_rate = 44100
+        if self.channels is None:
+            self.channels = 1
+        self._resampler = SegmentResampler(self.frame_rate, self.resample_quality)
+
+        try:
+            filename = fsdecode(self.out_f)
+        except TypeError:
+            filename = None
+            if self._seekable_output:
+                self._output = NamedTemporaryFile(mode="w+b", delete=False)
+                filename = self._output.name
+
+        conversion_command = [
+            self.converter,
+            '-y',  # always overwrite existing files
+            "-f", RAW_SAMPLE_FORMATS[self.sample_width],
+            "-ar", str(self.frame_rate),
+            "-ac", str(self.channels),
+            "-i", "pipe:0",  # input options (filename last)
+        ]
+        conversion_command.extend(self._output_arguments)
+        conversion_command.extend([
+            "-f", self.format, filename or "pipe:1",  # output options (filename last)
+        ])
+        self._command = conversion_command
+
+        log_conversion(conversion_command)
+
+        self._process = subprocess.Popen(conversion_command, stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        write_output = None if filename else self.out_f.write
+        self._stdout_thread, self._stdout = _drain_in_thread(self._process.stdout, write=write_output)
+        self._stderr_thread, self._stderr = _drain_in_thread(self._process.stderr)
+
+    def write(self, seg):
+        """
+        Encodes an AudioSegment (the next block of audio)
+        """
+        if self._closed:
+            if self._ended_early:
+                # ffmpeg stopped reading on its own (e.g. "-t" in parameters)
+                return
+            raise ValueError("write to a closed AudioEncoderSink")
+
+        # float audio goes back to integer PCM here, once
+        seg = seg.set_sample_format("int")
+
+        if self._process is None:
+            if self.frame_rate is None:
+                self.frame_rate = seg.frame_rate
+            if self.channels is None:
+                self.channels = seg.channels
+            if self.sample_width is None:
+                self.sample_width = seg.sample_width
+            self._start()
+
+        self._write(self._resampler.process(seg))
+
+    def _write(self, seg):
+        seg = seg.set_channels(self.channels).set_sample_width(self.sample_width)
+
+        try:
+            self._process.stdin.write(seg._data)
+        except (BrokenPipeError, OSError):
+            # ffmpeg is gone, close() reports why if it failed
+            self._ended_early = True
+            self.close()
+
+    def _finish(self):
+        self._closed = True
+        p = self._process
+        try:
+            p.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        p.wait()
+        self._stdout_thread.join()
+        self._stderr_thread.join()
+
+        p_err = b''.join(self._stderr)
+        log_subprocess_output(b''.join(self._stdout))
+        log_subprocess_output(p_err)
+
+        if self._output is not None:
+            try:
+                if p.returncode == 0:
+                    self._output.seek(0)
+                    shutil.copyfileobj(self._output, self.out_f)
+            finally:
+                self._output.close()
+                os.unlink(self._output.name)
+        return p.returncode, p_err
+
+    def close(self):
+        """
+        Finishes encoding, waits for ffmpeg to exit and raises
+        CouldntEncodeError if it failed
+        """
+        if self._closed:
+            return
+        if self._process is None:
+            self._start()
+
+        tail = self._resampler.flush()
+        if tail is not None:
+            self._write(tail)
+            if self._closed:
+                # ffmpeg ended early, and close() already ran
+                return
+
+        returncode, p_err = self._finish()
+        if returncode != 0:
+            raise CouldntEncodeError(
+                "Encoding failed. ffmpeg/avlib returned error code: {0}\n\nCommand:{1}\n\nOutput from ffmpeg/avlib:\n\n{2}".format(
+                    returncode, self._command, p_err.decode(errors='ignore')))
+        if self._stdout_thread.error is not None:
+            raise self._stdout_thread.error
+
+    def abort(self):
+        """
+        Stops ffmpeg without waiting for it to finish encoding
+        """
+        if self._closed:
+            return
+        if self._process is None:
+            self._closed = True
+            return
+        self._process.kill()
+        self._finish()
@@ -0,0 +1,339 @@
+"""
+A precomputed energy envelope for repeated loudness and silence queries.
+
+An EnergyIndex holds the sums of the squared samples of every millisecond
+of some audio (the frames AudioSegment slicing gives each millisecond),
+and of every 10, 100 and 1000 ms. The rms of any run of whole milliseconds
+follows from these, exactly as AudioSegment.rms computes it for the slice,
+without reading the audio again. Queries use the coarsest level their
+windows line up with.
+
+An index is built from a segment (AudioSegment.energy_index builds it
+once and caches it on the segment), from a file block by block, or loaded
+from the sidecar file EnergyIndex.for_file keeps next to the audio.
+"""
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from .sample_ops import range_energies, window_sums
+from .utils import db_to_float, ratio_to_db
+
+LEVELS = (1, 10, 100, 1000)
+
+SIDECAR_SUFFIX = ".energy.npz"
+
+
+def ms_to_frames(frame_rate, ms):
+    """
+    The frame each millisecond in ms (an integer or an array) starts at,
+    as AudioSegment slicing finds it
+    """
+    return (np.asarray(ms, dtype=np.int64) * (frame_rate / 1000.0)).astype(np.int64)
+
+
+def complete_ms(frame_rate, frame_count):
+    """
+    The number of milliseconds whose frames are all within frame_count
+    """
+    ms = frame_count * 1000 // frame_rate + 1
+    while ms_to_frames(frame_rate, ms) > frame_count:
+        ms -= 1
+    return int(ms)
+
+
+def energy_rms(sums, first, last, frame_count, channels, floating):
+    """
+    The rms of slices from frame first to last (arrays) that hold sums of
+    squared samples, as AudioSegment.rms computes it. Slices running past
+    frame_count are padded with silent frames, which count towards the mean
+    (empty slices are not padded).
+    """
+    counts = np.where(first < frame_count, last - first, 0) * channels
+    rms = np.sqrt(np.divide(sums, counts, out=np.zeros(len(sums)), where=counts > 0))
+    # audioop.rms rounds down
+    return rms if floating else np.floor(rms)
+
+
+def below_dbfs(rms, threshold, full_scale, floating=False):
+    """
+    Whether the dBFS of each rms value (an array) is below threshold, with
+    dBFS computed as AudioSegment.dBFS does it
+    """
+    if floating:
+        return rms < full_scale * db_to_float(threshold)
+    # integer rms values have a smallest one that isn't below
+    cutoff = int(np.ceil(full_scale * db_to_float(threshold)))
+    while cutoff > 0 and ratio_to_db((cutoff - 1) / full_scale) >= threshold:
+        cutoff -= 1
+    while ratio_to_db(cutoff / full_scale) < threshold:
+        cutoff += 1
+    return rms < cutoff
+
+
+class EnergyIndex(object):
+    """
+    The energy envelope of some audio, see the module docstring. len() is
+    the length of the audio in milliseconds, like len() of a segment.
+    """
+
+    def __init__(self, energies, frame_rate, channels, frame_count, sample_width,
+                 sample_format="int", source=None):
+        """
+        energies - the sums of the squared samples of every millisecond, as
+            sample_ops.range_energies returns them
+        source - identifies the audio the index was built from (for_file
+            uses it to tell whether a sidecar is up to date)
+        """
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.frame_count = frame_count
+        self.sample_width = sample_width
+        self.sample_format = sample_format
+        self.source = source
+
+        energies = np.asarray(energies)
+        if energies.shape[1] != len(self):
+            raise ValueError("expected the energies of {0} ms, got {1}".format(
+                len(self), energies.shape[1]))
+        self.levels = {1: energies}
+        for size, coarser in zip(LEVELS, LEVELS[1:]):
+            finer = self.levels[size]
+            factor = coarser // size
+            padded = np.zeros((len(finer), -(-finer.shape[1] // factor) * factor), dtype=finer.dtype)
+            padded[:, :finer.shape[1]] = finer
+            self.levels[coarser] = padded.reshape(len(finer), -1, factor).sum(axis=2)
+
+    def __len__(self):
+        return round(1000 * (self.frame_count / self.frame_rate))
+
+    def __repr__(self):
+        return "<EnergyIndex of {0} ms, {1} Hz, {2} channels>".format(
+            len(self), self.frame_rate, self.channels)
+
+    @property
+    def _floating(self):
+        return self.sample_format == "float32"
+
+    @property
+    def max_possible_amplitude(self):
+        if self._floating:
+            return 1.0
+        return 2 ** (self.sample_width * 8) / 2
+
+    def matches(self, seg):
+        """
+        Whether the index could describe seg (same length and format)
+        """
+        return (seg.frame_rate, seg.channels, int(seg.frame_count()), seg.sample_width,
+                seg.sample_format) == (self.frame_rate, self.channels, self.frame_count,
+                                       self.sample_width, self.sample_format)
+
+    def attach(self, seg):
+        """
+        Attaches the index to seg (say, one loaded from a sidecar to the
+        segment decoded from the same file), so that seg.energy_index()
+        returns it rather than scanning seg again
+        """
+        if not self.matches(seg):
+            raise ValueError("{0!r} does not match the segment".format(self))
+        seg.__dict__.setdefault('_measurements', {})['energy_index'] = self
+        return seg
+
+    # building
+
+    @classmethod
+    def from_segment(cls, seg):
+        frame_count = int(seg.frame_count())
+        positions = ms_to_frames(seg.frame_rate, np.arange(len(seg) + 1))
+        energies = range_energies(seg._data, seg.sample_width, seg.channels,
+                                  np.minimum(positions, frame_count), seg._floating)
+        return cls(energies, seg.frame_rate, seg.channels, frame_count, seg.sample_width,
+                   seg.sample_format)
+
+    @classmethod
+    def from_blocks(cls, blocks, source=None):
+        """
+        Builds the index of consecutive AudioSegments of the same format
+        (such as those of AudioSegment.iter_file), holding only one block
+        at a time
+        """
+        first = None
+        pending = bytearray()  # the frames of the incomplete milliseconds
+        pending_start = 0
+        frame_count = 0
+        complete = 0
+        parts = []
+
+        for block in blocks:
+            if first is None:
+                first = block
+            elif (block.sample_width, block.frame_rate, block.channels, block.sample_format) != \
+                    (first.sample_width, first.frame_rate, first.channels, first.sample_format):
+                raise ValueError("all blocks must have the format of the first one")
+
+            pending += block._data
+            frame_count += len(block._data) // first.frame_width
+            end = complete_ms(first.frame_rate, frame_count)
+            if end > complete:
+                bounds = ms_to_frames(first.frame_rate, np.arange(complete, end + 1))
+                parts.append(range_energies(pending, first.sample_width, first.channels,
+                                            bounds - pending_start, first._floating))
+                del pending[:(bounds[-1] - pending_start) * first.frame_width]
+                pending_start, complete = int(bounds[-1]), end
+
+        if first is None:
+            raise ValueError("there are no blocks to index")
+
+        # the last milliseconds may be only partly there
+        length = round(1000 * (frame_count / first.frame_rate))
+        bounds = ms_to_frames(first.frame_rate, np.arange(complete, max(complete, length) + 1))
+        parts.append(range_energies(pending, first.sample_width, first.channels,
+                                    np.minimum(bounds, frame_count) - pending_start,
+                                    first._floating))
+        return cls(np.concatenate(parts, axis=1), first.frame_rate, first.channels,
+                   frame_count, first.sample_width, first.sample_format, source)
+
+    @classmethod
+    def from_file(cls, file, block_ms=10000, **kwargs):
+        """
+        Builds the index of a file, decoding it block by block with
+        AudioSegment.iter_file (which takes the keyword arguments)
+        """
+        from .audio_segment import AudioSegment
+        return cls.from_blocks(AudioSegment.iter_file(file, block_ms=block_ms, **kwargs))
+
+    @classmethod
+    def for_file(cls, path, **kwargs):
+        """
+        Returns the index of the file at path, from its sidecar file
+        (path + SIDECAR_SUFFIX) if that is up to date, otherwise built
+        with from_file and saved to the sidecar.
+
+        The sidecar records the size and modification time of the file and
+        the keyword arguments it was decoded with, and is rebuilt when any
+        of them change.
+        """
+        stat = os.stat(path)
+        source = json.dumps([stat.st_size, stat.st_mtime_ns, sorted(kwargs.items())], default=str)
+        sidecar = os.fspath(path) + SIDECAR_SUFFIX
+        try:
+            index = cls.load(sidecar)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            index = None
+        if index is None or index.source != source:
+            index = cls.from_file(path, **kwargs)
+            index.source = source
+            index.save(sidecar)
+        return index
+
+    def save(self, file):
+        """
+        Saves the index (the 1 ms level, the others are rebuilt on load) to
+        file, a path or a binary file object, in NumPy's .npz format
+        """
+        meta = dict(frame_rate=self.frame_rate, channels=self.channels,
+                    frame_count=self.frame_count, sample_width=self.sample_width,
+                    sample_format=self.sample_format, source=self.source)
+        if isinstance(file, (str, bytes, os.PathLike)):
+            # np.savez appends .npz to paths without it
+            with open(file, "wb") as f:
+                np.savez(f, energies=self.levels[1], meta=np.array(json.dumps(meta)))
+        else:
+            np.savez(file, energies=self.levels[1], meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file, allow_pickle=False) as saved:
+            meta = json.loads(str(saved["meta"]))
+            return cls(saved["energies"], **meta)
+
+    # queries
+
+    def _window_sums(self, starts, length):
+        # the coarsest level the windows line up with
+        for size in reversed(LEVELS):
+            if length % size == 0 and not np.any(starts % size):
+                return window_sums(self.levels[size], starts // size, length // size,
+                                   block_size=max(1, (1 << 16) // size))
+
+    def window_rms(self, starts, length):
+        """
+        Returns the rms of the slice [start:start + length] of the audio for
+        every start (in ms, non-decreasing, with start + length <= len), as
+        AudioSegment.rms computes it
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        if not len(starts):
+            return np.zeros(0)
+        return energy_rms(self._window_sums(starts, length),
+                          ms_to_frames(self.frame_rate, starts),
+                          ms_to_frames(self.frame_rate, starts + length),
+                          self.frame_count, self.channels, self._floating)
+
+    def _chunk_rms(self, chunk_size):
+        # the rms of consecutive chunk_size ms chunks (the last one may be
+        # shorter), like make_chunks
+        length = len(self)
+        full = length // chunk_size
+        rms = self.window_rms(np.arange(full) * chunk_size, chunk_size)
+        if length % chunk_size:
+            rms = np.append(rms, self.window_rms([full * chunk_size], length % chunk_size))
+        return rms
+
+    def leading_silence(self, silence_threshold=-50.0, chunk_size=10):
+        """
+        Returns the ms at which the leading silence ends, like
+        silence.detect_leading_silence: the start of the first chunk_size
+        ms chunk that is not quieter than silence_threshold (in dBFS), or
+        the length if there is none
+        """
+        silent = below_dbfs(self._chunk_rms(chunk_size), silence_threshold,
+                            self.max_possible_amplitude, self._floating)
+        loud = np.flatnonzero(~silent)
+        return min(int(loud[0]) * chunk_size, len(self)) if len(loud) else len(self)
+
+    def trailing_silence(self, silence_threshold=-50.0, chunk_size=10):
+        """
+        Returns the ms at which the trailing silence starts: chunk_size ms
+        chunks counted back from the end, the end of the last one that is
+        not quieter than silence_threshold (in dBFS), or 0 if there is none
+        """
+        length = len(self)
+        starts = np.arange(length - chunk_size, -chunk_size, -chunk_size)[::-1]
+        # the chunk at the start may be shorter
+        rms = self.window_rms(starts[starts >= 0], chunk_size)
+        if len(starts) and starts[0] < 0:
+            rms = np.concatenate((self.window_rms([0], starts[0] + chunk_size), rms))
+        silent = below_dbfs(rms, silence_threshold, self.max_possible_amplitude, self._floating)
+        loud = np.flatnonzero(~silent)
+        return length - (len(rms) - 1 - int(loud[-1])) * chunk_size if len(loud) else 0
+
+    def gated_dBFS(self, block_ms=400, overlap=0.75, absolute_thresh=-70.0, relative_thresh=-10.0):
+        """
+        The loudness of the audio in dBFS with the gating of ITU-R BS.1770
+        (without its K-weighting filter): the mean power of the block_ms
+        blocks (overlapping by overlap) that are louder than absolute_thresh
+        dBFS and no more than relative_thresh dB below the mean power of
+        those. -inf if no block passes.
+        """
+        step = int(round(block_ms * (1 - overlap)))
+        if step <= 0:
+            raise ValueError("overlap must be below 1 (got {0})".format(overlap))
+        if len(self) < block_ms:
+            return -float("inf")
+
+        starts = np.arange(0, len(self) - block_ms + 1, step, dtype=np.int64)
+        counts = (ms_to_frames(self.frame_rate, starts + block_ms) -
+                  ms_to_frames(self.frame_rate, starts)) * self.channels
+        power = self._window_sums(starts, block_ms) / counts / self.max_possible_amplitude ** 2
+
+        gated = power[power > db_to_float(absolute_thresh, using_amplitude=False)]
+        if len(gated):
+            relative = gated.mean() * db_to_float(relative_thresh, using_amplitude=False)
+            gated = gated[gated > relative]
+        if not len(gated):
+            return -float("inf")
+        return ratio_to_db(gated.mean(), using_amplitude=False)
@@ -12,6 +12,7 @@ import array
 import itertools
 import random
 from .audio_segment import AudioSegment
+from .sample_ops import tobytes
 from .utils import (
     db_to_float,
     get_frame_width,
@@ -44,11 +45,8 @@ class SignalGenerator(object):
         sample_data = itertools.islice(sample_data, 0, sample_count)
 
         data = array.array(array_type, sample_data)
-        
-        try:
-            data = data.tobytes()
-        except:
-            data = data.tostring()
+        # 24-bit samples are generated as 32-bit integers
+        data = tobytes(data, sample_width)
 
         return AudioSegment(data=data, metadata={
             "channels": 1,
@@ -0,0 +1,547 @@
+"""
+NumPy implementation of the stdlib audioop module.
+
+The stdlib audioop module was removed in python 3.13. This module provides
+the same functions, with the same signatures and (bit-exact) results, as
+vectorized numpy kernels. pydub_plus.core.utils selects it automatically
+when audioop can't be imported.
+
+Samples are little-endian signed integers of 1, 2, 3 or 4 bytes. Results
+that don't fit the sample width saturate the same way audioop does.
+"""
+import math
+
+import numpy as np
+
+from .sample_ops import (
+    frombuffer,
+    floor_saturate,
+    saturate,
+    sequential_sum,
+    tobytes,
+)
+
+
+class error(Exception):
+    pass
+
+
+def _check_size(size):
+    if size not in (1, 2, 3, 4):
+        raise error("Size should be 1, 2, 3 or 4")
+
+
+def _check_params(length, size):
+    _check_size(size)
+    if length % size != 0:
+        raise error("not a whole number of frames")
+
+
+def _samples(cp, size):
+    cp = memoryview(cp).cast("B")
+    _check_params(len(cp), size)
+    return frombuffer(cp, size)
+
+
+def _wide(cp, size):
+    return _samples(cp, size).astype(np.int64)
+
+
+def _shift32(size):
+    return 32 - 8 * size
+
+
+def getsample(cp, size, i):
+    samples = _samples(cp, size)
+    if not 0 <= i < len(samples):
+        raise error("Index out of range")
+    return int(samples[i])
+
+
+def max(cp, size):
+    samples = _samples(cp, size)
+    if not len(samples):
+        return 0
+    return int(np.abs(samples.astype(np.int64)).max())
+
+
+def minmax(cp, size):
+    samples = _samples(cp, size)
+    if not len(samples):
+        return 0x7fffffff, -0x80000000
+    return int(samples.min()), int(samples.max())
+
+
+def avg(cp, size):
+    samples = _samples(cp, size)
+    if not len(samples):
+        return 0
+    return int(math.floor(float(samples.astype(np.int64).sum()) / len(samples)))
+
+
+def rms(cp, size):
+    samples = _samples(cp, size)
+    if not len(samples):
+        return 0
+
+    # audioop accumulates the squares in a double, one sample at a time
+    sum_squares = 0.0
+    chunk_size = 1 << 20
+    for i in range(0, len(samples), chunk_size):
+        squares = samples[i:i + chunk_size].astype(np.float64)
+        squares *= squares
+        sum_squares = sequential_sum(squares, start=sum_squares)
+    return int(math.sqrt(sum_squares / len(samples)))
+
+
+def _sum2(a, b):
+    return float(np.dot(a, b))
+
+
+def findfit(cp1, cp2):
+    cp1 = memoryview(cp1).cast("B")
+    cp2 = memoryview(cp2).cast("B")
+    if len(cp1) % 2 or len(cp2) % 2:
+        raise error("Strings should be even-sized")
+
+    fragment = frombuffer(cp1, 2).astype(np.int64)
+    reference = frombuffer(cp2, 2).astype(np.int64)
+    len1, len2 = len(fragment), len(reference)
+    if len1 < len2:
+        raise error("First sample should be longer")
+
+    sum_ri_2 = _sum2(reference, reference)
+
+    energy = np.concatenate(([0], np.cumsum(fragment * fragment)))
+    sum_aij_2 = (energy[len2:] - energy[:len1 - len2 + 1]).astype(np.float64)
+    sum_aij_ri = np.correlate(fragment, reference, mode="valid").astype(np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = (sum_ri_2 * sum_aij_2 - sum_aij_ri * sum_aij_ri) / sum_aij_2
+
+    if np.isnan(result[0]):
+        best_i = 0
+    else:
+        best_i = int(np.argmin(np.where(np.isnan(result), np.inf, result)))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.float64(sum_aij_ri[best_i]) / np.float64(sum_ri_2)
+    return best_i, float(factor)
+
+
+def findfactor(cp1, cp2):
+    cp1 = memoryview(cp1).cast("B")
+    cp2 = memoryview(cp2).cast("B")
+    if len(cp1) % 2 or len(cp2) % 2:
+        raise error("Strings should be even-sized")
+    if len(cp1) != len(cp2):
+        raise error("Samples should be same size")
+
+    fragment = frombuffer(cp1, 2).astype(np.int64)
+    reference = frombuffer(cp2, 2).astype(np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.float64(_sum2(fragment, reference)) / np.float64(_sum2(reference, reference)))
+
+
+def findmax(cp, len2):
+    cp = memoryview(cp).cast("B")
+    if len(cp) % 2:
+        raise error("Strings should be even-sized")
+
+    samples = frombuffer(cp, 2).astype(np.int64)
+    if len2 < 0 or len(samples) < len2:
+        raise error("Input sample should be longer")
+
+    energy = np.concatenate(([0], np.cumsum(samples * samples)))
+    windows = energy[len2:] - energy[:len(samples) - len2 + 1]
+    return int(np.argmax(windows))
+
+
+def _extremes(cp, size):
+    """
+    Returns the local extremes of the signal, as found by audioop's
+    avgpp/maxpp (plateaus count as a single value)
+    """
+    samples = _wide(cp, size)
+    if len(samples) <= 1:
+        return samples[:0]
+
+    changed = np.concatenate(([True], samples[1:] != samples[:-1]))
+    values = samples[changed]
+    falling = values[1:] < values[:-1]
+    turns = np.flatnonzero(falling[1:] != falling[:-1]) + 1
+    return values[turns]
+
+
+def avgpp(cp, size):
+    extremes = _extremes(cp, size)
+    if len(extremes) < 2:
+        return 0
+    total = float(np.abs(np.diff(extremes)).sum())
+    return int(total / (len(extremes) - 1))
+
+
+def maxpp(cp, size):
+    extremes = _extremes(cp, size)
+    if len(extremes) < 2:
+        return 0
+    return int(np.abs(np.diff(extremes)).max())
+
+
+def cross(cp, size):
+    samples = _samples(cp, size)
+    if not len(samples):
+        return -1
+    negative = samples < 0
+    return int(np.count_nonzero(negative[1:] != negative[:-1]))
+
+
+def mul(cp, size, factor):
+    samples = _samples(cp, size)
+    return tobytes(floor_saturate(samples * float(factor), size), size)
+
+
+def tomono(cp, size, fac1, fac2):
+    samples = _samples(cp, size)
+    if len(samples) % 2:
+        raise error("not a whole number of frames")
+
+    frames = samples.reshape(-1, 2).astype(np.float64)
+    mixed = frames[:, 0] * float(fac1) + frames[:, 1] * float(fac2)
+    return tobytes(floor_saturate(mixed, size), size)
+
+
+def tostereo(cp, size, fac1, fac2):
+    samples = _samples(cp, size).astype(np.float64)
+
+    out = np.empty((len(samples), 2), dtype=np.float64)
+    out[:, 0] = samples * float(fac1)
+    out[:, 1] = samples * float(fac2)
+    return tobytes(floor_saturate(out.reshape(-1), size), size)
+
+
+def add(cp1, cp2, size):
+    samples1 = _samples(cp1, size)
+    samples2 = _samples(cp2, size)
+    if len(samples1) != len(samples2):
+        raise error("Lengths should be the same")
+
+    total = samples1.astype(np.int64) + samples2
+    return tobytes(saturate(total, size), size)
+
+
+def bias(cp, size, bias):
+    samples = _wide(cp, size)
+    bits = 8 * size
+    if not -0x80000000 <= bias <= 0x7fffffff:
+        raise OverflowError("Python int too large to convert to C int")
+
+    wrapped = (samples + bias) & ((1 << bits) - 1)
+    wrapped -= (wrapped >> (bits - 1)) << bits
+    return tobytes(wrapped, size)
+
+
+def reverse(cp, size):
+    return tobytes(_samples(cp, size)[::-1], size)
+
+
+def byteswap(cp, size):
+    raw = memoryview(cp).cast("B")
+    _check_params(len(raw), size)
+    raw = np.frombuffer(raw, dtype=np.uint8).reshape(-1, size)
+    return raw[:, ::-1].tobytes()
+
+
+def lin2lin(cp, size, size2):
+    _check_size(size2)
+    samples = _wide(cp, size)
+    if size == size2:
+        return tobytes(samples, size)
+
+    samples = (samples << _shift32(size)) >> _shift32(size2)
+    return tobytes(samples, size2)
+
+
+def _parse_ratecv_state(state, nchannels):
+    if not isinstance(state, tuple):
+        raise TypeError("state must be a tuple or None")
+    try:
+        d, samps = state
+        d = int(d)
+    except (TypeError, ValueError):
+        raise TypeError("ratecv(): illegal state argument")
+    if not isinstance(samps, tuple):
+        raise TypeError("ratecv(): illegal state argument")
+    if len(samps) != nchannels:
+        raise error("illegal state argument")
+
+    prev_i, cur_i = [], []
+    for channel in samps:
+        if not isinstance(channel, tuple) or len(channel) != 2:
+            raise TypeError("ratecv(): illegal state argument")
+        prev_i.append(int(channel[0]))
+        cur_i.append(int(channel[1]))
+    return d, prev_i, cur_i
+
+
+def _weighted_frames(frames, prev_i, cur_i, weightA, weightB):
+    """
+    Applies ratecv's one-pole pre-filter. Every input frame depends on the
+    previous filtered frame, so this can't be vectorized along time.
+    """
+    out = np.empty(frames.shape, dtype=np.int64)
+    cur = list(cur_i)
+    total = float(weightA + weightB)
+    for i, frame in enumerate(frames.tolist()):
+        cur = [int((weightA * float(sample) + weightB * float(prev)) / total)
+               for sample, prev in zip(frame, cur)]
+        out[i] = cur
+    return out
+
+
+def ratecv(cp, size, nchannels, inrate, outrate, state, weightA=1, weightB=0):
+    _check_size(size)
+    if nchannels < 1:
+        raise error("# of channels should be >= 1")
+    if size > 0x7fffffff // nchannels:
+        raise OverflowError("width * nchannels too big for a C int")
+    if weightA < 1 or weightB < 0:
+        raise error("weightA should be >= 1, weightB should be >= 0")
+
+    raw = memoryview(cp).cast("B")
+    if len(raw) % (size * nchannels) != 0:
+        raise error("not a whole number of frames")
+    if inrate <= 0 or outrate <= 0:
+        raise error("sampling rate not > 0")
+
+    d = math.gcd(inrate, outrate)
+    inrate //= d
+    outrate //= d
+
+    d = math.gcd(weightA, weightB)
+    weightA //= d
+    weightB //= d
+
+    if state is None:
+        d = -outrate
+        prev_i = [0] * nchannels
+        cur_i = [0] * nchannels
+    else:
+        d, prev_i, cur_i = _parse_ratecv_state(state, nchannels)
+
+    frames = (frombuffer(raw, size).astype(np.int64) << _shift32(size)).reshape(-1, nchannels)
+    if weightB:
+        frames = _weighted_frames(frames, prev_i, cur_i, weightA, weightB)
+
+    # history[k + 1] is the current input frame once k frames have been read,
+    # history[k] the previous one
+    history = np.concatenate((
+        np.array([prev_i, cur_i], dtype=np.int64),
+        frames,
+    ))
+    frame_count = len(frames)
+
+    # output frame m is produced once k(m) input frames have been consumed,
+    # k(m) being the smallest k >= 0 for which d + k * outrate - m * inrate >= 0
+    available = frame_count * outrate + d
+    out_count = available // inrate + 1 if available >= 0 else 0
+    m = np.arange(out_count, dtype=np.int64)
+    k = np.maximum(0, -((d - m * inrate) // outrate))
+    d_m = (d + k * outrate - m * inrate).astype(np.float64)[:, None]
+
+    prev = history[k].astype(np.float64)
+    cur = history[k + 1].astype(np.float64)
+    converted = np.trunc((prev * d_m + cur * (outrate - d_m)) / outrate).astype(np.int64)
+    converted >>= _shift32(size)
+
+    d = d + frame_count * outrate - out_count * inrate
+    samps = tuple(
+        (int(p), int(c))
+        for p, c in zip(history[frame_count].tolist(), history[frame_count + 1].tolist())
+    )
+    return tobytes(converted.reshape(-1), size), (int(d), samps)
+
+
+# G.711 segment ends of the (14-bit) u-law and (13-bit) a-law magnitudes
+_SEG_UEND = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+_SEG_AEND = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+
+def _ulaw_encode_table():
+    # code of every 14-bit value, from -8192 up
+    pcm = np.arange(-8192, 8192, dtype=np.int64)
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm), 8159) + 33
+    seg = np.searchsorted(_SEG_UEND, magnitude)
+    code = np.where(seg >= 8, 0x7F, (seg << 4) | ((magnitude >> (seg + 1)) & 0xF))
+    return (code ^ mask).astype(np.uint8)
+
+
+def _alaw_encode_table():
+    # code of every 13-bit value, from -4096 up
+    pcm = np.arange(-4096, 4096, dtype=np.int64)
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    magnitude = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted(_SEG_AEND, magnitude)
+    quantized = np.where(seg < 2, magnitude >> 1, magnitude >> np.maximum(seg, 1)) & 0xF
+    code = np.where(seg >= 8, 0x7F, (seg << 4) | quantized)
+    return (code ^ mask).astype(np.uint8)
+
+
+def _ulaw_decode_table():
+    # 16-bit value of every code
+    u = ~np.arange(256, dtype=np.int64) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, 0x84 - t, t - 0x84)
+
+
+def _alaw_decode_table():
+    a = np.arange(256, dtype=np.int64) ^ 0x55
+    seg = (a & 0x70) >> 4
+    t = (a & 0x0F) << 4
+    t = np.where(seg == 0, t + 8, (t + 0x108) << np.maximum(seg - 1, 0))
+    return np.where(a & 0x80, t, -t)
+
+
+_ULAW_ENCODE = _ulaw_encode_table()
+_ALAW_ENCODE = _alaw_encode_table()
+_ULAW_DECODE = _ulaw_decode_table()
+_ALAW_DECODE = _alaw_decode_table()
+
+
+def _from_16_bit(samples, size):
+    return tobytes((samples << 16) >> _shift32(size), size)
+
+
+def lin2ulaw(cp, size):
+    samples = _wide(cp, size) << _shift32(size)
+    return _ULAW_ENCODE[(samples >> 18) + 8192].tobytes()
+
+
+def ulaw2lin(cp, size):
+    _check_size(size)
+    codes = np.frombuffer(memoryview(cp).cast("B"), dtype=np.uint8)
+    return _from_16_bit(_ULAW_DECODE[codes], size)
+
+
+def lin2alaw(cp, size):
+    samples = _wide(cp, size) << _shift32(size)
+    return _ALAW_ENCODE[(samples >> 19) + 4096].tobytes()
+
+
+def alaw2lin(cp, size):
+    _check_size(size)
+    codes = np.frombuffer(memoryview(cp).cast("B"), dtype=np.uint8)
+    return _from_16_bit(_ALAW_DECODE[codes], size)
+
+
+# Intel/DVI ADPCM
+_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8] * 2
+
+_STEPSIZE_TABLE = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 50, 55, 60,
+    66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307, 337, 371,
+    408, 449, 494, 544, 598, 658, 724, 796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707,
+    1878, 2066, 2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132,
+    7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623,
+    27086, 29794, 32767,
+]
+
+
+def _parse_adpcm_state(state, name):
+    if state is None:
+        return 0, 0
+    if not isinstance(state, tuple):
+        raise TypeError("state must be a tuple or None")
+    try:
+        valpred, index = state
+        valpred, index = int(valpred), int(index)
+    except (TypeError, ValueError):
+        raise TypeError("{0}(): illegal state argument".format(name))
+    if not -0x8000 <= valpred < 0x8000 or not 0 <= index < len(_STEPSIZE_TABLE):
+        raise ValueError("bad state")
+    return valpred, index
+
+
+def lin2adpcm(cp, size, state):
+    # every code depends on the prediction the one before left, so ADPCM
+    # runs sample by sample
+    samples = (_wide(cp, size) << _shift32(size)) >> 16
+    valpred, index = _parse_adpcm_state(state, "lin2adpcm")
+    step = _STEPSIZE_TABLE[index]
+    deltas = []
+    for val in samples.tolist():
+        if val < valpred:
+            diff = valpred - val
+            sign = 8
+        else:
+            diff = val - valpred
+            sign = 0
+
+        delta = 0
+        vpdiff = step >> 3
+        if diff >= step:
+            delta = 4
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            delta |= 2
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            delta |= 1
+            vpdiff += step
+
+        valpred = valpred - vpdiff if sign else valpred + vpdiff
+        if valpred > 32767:
+            valpred = 32767
+        elif valpred < -32768:
+            valpred = -32768
+
+        delta |= sign
+        index += _INDEX_TABLE[delta]
+        if index < 0:
+            index = 0
+        elif index > 88:
+            index = 88
+        step = _STEPSIZE_TABLE[index]
+        deltas.append(delta)
+
+    # two codes to a byte, high nibble first (an odd last one is dropped)
+    codes = np.array(deltas[:len(deltas) // 2 * 2], dtype=np.uint8).reshape(-1, 2)
+    return ((codes[:, 0] << 4) | codes[:, 1]).tobytes(), (valpred, index)
+
+
+def adpcm2lin(cp, size, state):
+    _check_size(size)
+    codes = np.frombuffer(memoryview(cp).cast("B"), dtype=np.uint8)
+    deltas = np.stack((codes >> 4, codes & 0xF), axis=1).reshape(-1)
+    valpred, index = _parse_adpcm_state(state, "adpcm2lin")
+    step = _STEPSIZE_TABLE[index]
+    out = []
+    for delta in deltas.tolist():
+        index += _INDEX_TABLE[delta]
+        if index < 0:
+            index = 0
+        elif index > 88:
+            index = 88
+
+        vpdiff = step >> 3
+        if delta & 4:
+            vpdiff += step
+        if delta & 2:
+            vpdiff += step >> 1
+        if delta & 1:
+            vpdiff += step >> 2
+
+        valpred = valpred - vpdiff if delta & 8 else valpred + vpdiff
+        if valpred > 32767:
+            valpred = 32767
+        elif valpred < -32768:
+            valpred = -32768
+        step = _STEPSIZE_TABLE[index]
+        out.append(valpred)
+
+    return _from_16_bit(np.array(out, dtype=np.int64), size), (valpred, index)
@@ -0,0 +1,204 @@
+"""
+The one-pole low and high pass filters of effects.low_pass_filter and
+effects.high_pass_filter, for whole segments or streams of blocks.
+
+The filters are recursive: every output depends on the one before, so the
+obvious loop runs one frame at a time. Here each channel is cut into
+blocks that all run at once, one NumPy operation per step over every
+block. A block starts from a state estimated by running the filter over
+the end of the block before it, and since the filter forgets its past
+geometrically, from a few dozen frames in its values are the same doubles
+the sequential loop computes. The frames before that are then recomputed
+one by one from the true state until they agree, so the result is always
+exactly that of the sequential loop, with the same rounding at every step.
+"""
+import math
+
+import numpy as np
+
+from .sample_ops import sample_range, tobytes
+
+FILTER_KINDS = ("low", "high")
+
+
+def _same(a, b):
+    # bit for bit (0.0 and -0.0 differ when written out as float32)
+    return a == b and (a != 0 or math.copysign(1, a) == math.copysign(1, b))
+
+
+class OnePoleFilter(object):
+    """
+    A one-pole low ("low") or high ("high") pass filter with its -3 dB
+    point at cutoff Hz, run over a stream of frames:
+
+        lpf = OnePoleFilter("low", 3000, 44100, channels=2)
+        for block in AudioSegment.iter_file("in.flac"):
+            sink.write(lpf.filter(block))
+
+    The first frame of the stream passes through unchanged and starts the
+    filter off, as in effects.low_pass_filter. The state carries over
+    from block to block, so a stream filtered in pieces is sample for
+    sample the same as filtered whole.
+    """
+
+    def __init__(self, kind, cutoff, frame_rate, channels=1, block_size=1 << 12):
+        if kind not in FILTER_KINDS:
+            raise ValueError("kind must be one of {0} (got {1!r})".format(FILTER_KINDS, kind))
+        self.kind = kind
+        self.cutoff = cutoff
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.block_size = block_size
+
+        RC = 1.0 / (cutoff * 2 * math.pi)
+        dt = 1.0 / frame_rate
+        if kind == "low":
+            self.alpha = dt / (RC + dt)
+            # how much of a difference in the state survives a step
+            decay = 1 - self.alpha
+        else:
+            self.alpha = RC / (RC + dt)
+            decay = self.alpha
+        # the steps after which a difference of the whole sample range has
+        # shrunk to well below a unit in the last place
+        self.settle = max(1, int(math.ceil(-96 / math.log2(decay)))) if 0 < decay < 1 else 1
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the stream so far
+        """
+        self._state = None
+        self._previous = None
+
+    def _step(self, state, frame, previous, out):
+        # one step of the recursion, with the operations (and so the
+        # rounding) of the sequential loop
+        if self.kind == "low":
+            # state + alpha * (frame - state)
+            np.subtract(frame, state, out=out)
+            out *= self.alpha
+            out += state
+        else:
+            # alpha * (state + frame - previous)
+            np.add(state, frame, out=out)
+            out -= previous
+            out *= self.alpha
+        return out
+
+    def _step_scalar(self, state, frame, previous):
+        if self.kind == "low":
+            return state + self.alpha * (frame - state)
+        return self.alpha * (state + frame - previous)
+
+    def _run_sequential(self, x, previous, state):
+        # the plain loop, for series too short to be worth splitting
+        out = np.empty(x.shape)
+        alpha = self.alpha
+        for r in range(len(x)):
+            value = float(state[r])
+            values = []
+            if self.kind == "low":
+                for frame in x[r].tolist():
+                    value = value + alpha * (frame - value)
+                    values.append(value)
+            else:
+                for frame, before in zip(x[r].tolist(), previous[r].tolist()):
+                    value = alpha * (value + frame - before)
+                    values.append(value)
+            out[r] = values
+        return out
+
+    def _run(self, x, previous, state):
+        # the filter's values for the series in the rows of x (previous
+        # holds the input before each frame, state the values before the
+        # first ones), block by block
+        rows, count = x.shape
+        # blocks at least twice as long as the filter takes to settle
+        size = max(self.block_size, 2 * self.settle)
+        if count < 4 * size:
+            return self._run_sequential(x, previous, state)
+        blocks = -(-count // size)
+        padded = blocks * size
+
+        def planes(a):
+            # (step, row * block) layout: every step is one contiguous row
+            full = np.zeros((rows, padded))
+            full[:, :count] = a
+            return np.ascontiguousarray(full.reshape(rows * blocks, size).T)
+
+        frames, before = planes(x), planes(previous)
+
+        # estimated states entering each block, from running the filter
+        # over the end of the block before (the first block's is known)
+        values = np.empty(rows * blocks)
+        values[:] = frames[0] if self.kind == "low" else 0.0
+        scratch = np.empty(rows * blocks)
+        for j in range(size - self.settle, size):
+            # the frames of the previous block are the next ones along
+            self._step(values, np.roll(frames[j], 1), np.roll(before[j], 1), scratch)
+            values, scratch = scratch, values
+        values.reshape(rows, blocks)[:, 0] = state
+        estimates = values.copy()
+
+        out = np.empty((size, rows * blocks))
+        for j in range(size):
+            values = self._step(values, frames[j], before[j], out[j])
+
+        out = out.T.reshape(rows, padded)
+        estimates = estimates.reshape(rows, blocks)
+        for r in range(rows):
+            series = out[r]
+            for b in range(1, blocks):
+                value = float(series[b * size - 1])
+                if _same(value, float(estimates[r, b])):
+                    continue
+                # recompute from the true state until the values agree
+                for i in range(b * size, min(count, (b + 1) * size)):
+                    value = self._step_scalar(value, float(x[r, i]), float(previous[r, i]))
+                    if _same(value, float(series[i])):
+                        break
+                    series[i] = value
+        return out[:, :count]
+
+    def process(self, frames):
+        """
+        Feeds frames (an array of shape (frames, channels), or of samples
+        for a single channel) in, returns the filter's values for them as
+        a float64 array of the same shape (before any rounding)
+        """
+        frames = np.asarray(frames, dtype=np.float64).reshape(-1, self.channels)
+        out = np.empty_like(frames)
+        if not len(frames):
+            return out
+
+        start = 0
+        if self._state is None:
+            # the first frame passes through
+            out[0] = frames[0]
+            self._state = frames[0].copy()
+            self._previous = frames[0].copy()
+            start = 1
+        rest = frames[start:]
+        if len(rest):
+            previous = np.concatenate((self._previous[None, :], rest[:-1]))
+            out[start:] = self._run(rest.T, previous.T, self._state).T
+            self._state = out[-1].copy()
+            self._previous = rest[-1].copy()
+        return out
+
+    def filter(self, seg):
+        """
+        Filters the next block of the stream, an AudioSegment, returning
+        the filtered block. Integer samples are truncated towards zero
+        (and for the high pass filter clipped), float32 samples are not.
+        """
+        if (seg.frame_rate, seg.channels) != (self.frame_rate, self.channels):
+            raise ValueError("the segment must have a frame rate of {0} and {1} channels".format(
+                self.frame_rate, self.channels))
+        values = self.process(seg._samples().reshape(-1, seg.channels)).reshape(-1)
+        if not seg._floating:
+            if self.kind == "high":
+                values = np.clip(values, *sample_range(seg.sample_width))
+            values = np.trunc(values).astype(np.int64)
+        return seg._spawn(tobytes(values, seg.sample_width, seg._floating))
@@ -0,0 +1,517 @@
+"""
+Incremental reading of PCM audio from files and pipes, and writing of wav
+files.
+
+These helpers never need the whole input in memory and never seek, so they
+work the same on regular files and on a subprocess' stdout.
+
+Besides wav (and its RF64/BW64 variants), the headers of Sony Wave64 and
+AIFF/AIFF-C files are understood, and to_pcm converts their samples (float,
+big-endian or unsigned) to the signed little-endian integers AudioSegment
+works with.
+"""
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from .exceptions import CouldntDecodeError
+from .sample_ops import FLOAT_DTYPE, float_to_int, int_to_float
+
+# sample_format is 'int', 'uint' (8-bit wav) or 'float'. audio_format is the
+# wav format tag (1 for integer PCM and 3 for floats in other containers).
+WavStreamInfo = namedtuple('WavStreamInfo', ['audio_format', 'channels', 'sample_rate',
+                                             'bits_per_sample', 'data_size', 'sample_format',
+                                             'big_endian'],
+                           defaults=('int', False))
+
+# wav writers that can't seek back (ffmpeg writing to a pipe) leave one of
+# these in the size fields
+_UNKNOWN_SIZES = (0, 0xFFFFFFFF)
+
+# RF64 and BW64 files keep 32-bit sizes at 0xFFFFFFFF and the real, 64-bit,
+# sizes in a ds64 chunk right after the header
+_RIFF_IDS = (b'RIFF', b'RF64', b'BW64')
+
+# largest single read, some platforms fail reads of 2 GiB or more
+_MAX_READ = 2 ** 31 - 1
+
+# how many buffers to hand to a single os.writev (POSIX guarantees 16)
+_IOV_MAX = 16
+
+# Wave64 ids are GUIDs, those of the standard chunks start with the riff id
+_W64_GUID_TAIL = b'\xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a'
+_W64_RIFF = b'riff\x2e\x91\xcf\x11\xa5\xd6\x28\xdb\x04\xc1\x00\x00'
+_W64_WAVE = b'wave' + _W64_GUID_TAIL
+_W64_FMT = b'fmt ' + _W64_GUID_TAIL
+_W64_DATA = b'data' + _W64_GUID_TAIL
+
+# AIFF-C compression types that are plain samples:
+# (sample_format, big_endian, bits_per_sample or None to keep the COMM one)
+_AIFC_COMPRESSIONS = {
+    b'NONE': ('int', True, None),
+    b'twos': ('int', True, None),
+    b'sowt': ('int', False, None),
+    b'raw ': ('uint', False, 8),
+    b'fl32': ('float', True, 32),
+    b'FL32': ('float', True, 32),
+    b'fl64': ('float', True, 64),
+    b'FL64': ('float', True, 64),
+}
+
+
+def read_exactly(f, size):
+    """
+    Reads size bytes from f, less only if f ends first
+    """
+    chunks = []
+    while size > 0:
+        chunk = f.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def skip(f, size):
+    """
+    Moves size bytes forward in f, by seeking when possible and by reading
+    otherwise. Returns the number of bytes skipped.
+    """
+    try:
+        if f.seekable():
+            start = f.tell()
+            end = f.seek(0, 2)
+            return f.seek(min(start + size, end)) - start
+    except (AttributeError, OSError):
+        pass
+
+    skipped = 0
+    while skipped < size:
+        chunk = f.read(min(size - skipped, 1 << 20))
+        if not chunk:
+            break
+        skipped += len(chunk)
+    return skipped
+
+
+def _parse_wav_fmt(body):
+    """
+    Returns (audio_format, channels, sample_rate, bits_per_sample,
+    sample_format) from the body of a wav fmt chunk
+    """
+    if len(body) < 16:
+        raise CouldntDecodeError("Couldn't find fmt header in wav data")
+    audio_format, channels, sample_rate, _, _, bits_per_sample = struct.unpack_from('<HHIIHH', body)
+
+    # WAVE_FORMAT_EXTENSIBLE, the actual format is the start of the
+    # SubFormat GUID
+    tag = audio_format
+    if audio_format == 0xFFFE and len(body) >= 26:
+        tag = struct.unpack_from('<H', body, 24)[0]
+
+    if tag == 1:
+        sample_format = 'uint' if bits_per_sample == 8 else 'int'
+    elif tag == 3 and bits_per_sample in (32, 64):
+        sample_format = 'float'
+    else:
+        raise CouldntDecodeError("Unknown audio format 0x%X in wav data" % tag)
+    return audio_format, channels, sample_rate, bits_per_sample, sample_format
+
+
+def read_wav_header(f):
+    """
+    Reads the chunks of a wav (or RF64/BW64) stream up to the start of its
+    audio data and returns a WavStreamInfo. f is left positioned on the
+    first audio byte.
+
+    data_size is None when the header doesn't say how long the audio is, in
+    which case the audio runs to the end of the stream.
+    """
+    riff = read_exactly(f, 12)
+    if len(riff) < 12 or riff[:4] not in _RIFF_IDS or riff[8:12] != b'WAVE':
+        raise CouldntDecodeError("Couldn't find RIFF/WAVE header in wav data")
+    return _read_riff_chunks(f)
+
+
+def _read_riff_chunks(f):
+    fmt = None
+    ds64_data_size = None
+    while True:
+        header = read_exactly(f, 8)
+        if len(header) < 8:
+            raise CouldntDecodeError("Couldn't find data header in wav data")
+        chunk_id = header[:4]
+        chunk_size = struct.unpack('<I', header[4:])[0]
+
+        if chunk_id == b'data':
+            break
+
+        # chunks are padded to an even size
+        body = read_exactly(f, chunk_size + (chunk_size & 1))
+        if chunk_id == b'fmt ':
+            fmt = _parse_wav_fmt(body[:chunk_size])
+        elif chunk_id == b'ds64' and len(body) >= 16:
+            ds64_data_size = struct.unpack_from('<Q', body, 8)[0]
+
+    if fmt is None:
+        raise CouldntDecodeError("Couldn't find fmt header in wav data")
+
+    if chunk_size == 0xFFFFFFFF and ds64_data_size:
+        chunk_size = ds64_data_size
+    data_size = None if chunk_size in _UNKNOWN_SIZES else chunk_size
+    audio_format, channels, sample_rate, bits_per_sample, sample_format = fmt
+    return WavStreamInfo(audio_format, channels, sample_rate, bits_per_sample, data_size,
+                         sample_format)
+
+
+def _read_w64_chunks(f):
+    fmt = None
+    while True:
+        header = read_exactly(f, 24)
+        if len(header) < 24:
+            raise CouldntDecodeError("Couldn't find data header in w64 data")
+        chunk_id = header[:16]
+        # sizes include the chunk header
+        chunk_size = struct.unpack('<Q', header[16:])[0]
+
+        if chunk_id == _W64_DATA:
+            break
+
+        # chunks are padded to a multiple of 8 bytes
+        body = read_exactly(f, ((chunk_size + 7) & ~7) - 24)
+        if chunk_id == _W64_FMT:
+            fmt = _parse_wav_fmt(body[:chunk_size - 24])
+
+    if fmt is None:
+        raise CouldntDecodeError("Couldn't find fmt header in w64 data")
+
+    data_size = chunk_size - 24 if chunk_size > 24 else None
+    audio_format, channels, sample_rate, bits_per_sample, sample_format = fmt
+    return WavStreamInfo(audio_format, channels, sample_rate, bits_per_sample, data_size,
+                         sample_format)
+
+
+def _extended_to_float(data):
+    """
+    Decodes the 80-bit IEEE 754 extended precision number AIFF stores sample
+    rates as
+    """
+    exponent, mantissa = struct.unpack('>HQ', data[:10])
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if not exponent and not mantissa:
+        return 0.0
+    return sign * mantissa * 2.0 ** (exponent - 16383 - 63)
+
+
+def _read_aiff_chunks(f, aifc):
+    comm = None
+    while True:
+        header = read_exactly(f, 8)
+        if len(header) < 8:
+            raise CouldntDecodeError("Couldn't find SSND chunk in aiff data")
+        chunk_id = header[:4]
+        chunk_size = struct.unpack('>I', header[4:])[0]
+
+        if chunk_id == b'SSND':
+            break
+
+        # chunks are padded to an even size
+        body = read_exactly(f, chunk_size + (chunk_size & 1))
+        if chunk_id == b'COMM':
+            if chunk_size < 18 or len(body) < 18:
+                raise CouldntDecodeError("Couldn't find COMM chunk in aiff data")
+            comm = body
+
+    if comm is None:
+        # only seen before the audio, streams can't go back for it
+        raise CouldntDecodeError("Couldn't find COMM chunk before the audio in aiff data")
+
+    channels, frame_count, bits_per_sample = struct.unpack_from('>hIh', comm)
+    sample_rate = int(round(_extended_to_float(comm[8:18])))
+
+    compression = comm[18:22] if aifc else b'NONE'
+    try:
+        sample_format, big_endian, bits = _AIFC_COMPRESSIONS[compression]
+    except KeyError:
+        raise CouldntDecodeError("Unsupported aiff compression %r" % compression)
+    bits_per_sample = bits or bits_per_sample
+    if sample_format == 'uint' and bits_per_sample != 8:
+        raise CouldntDecodeError("Unsupported aiff sample size %d" % bits_per_sample)
+
+    offset = struct.unpack('>II', read_exactly(f, 8))[0]
+    skip(f, offset)
+
+    data_size = frame_count * channels * ((bits_per_sample + 7) // 8)
+    if chunk_size not in _UNKNOWN_SIZES:
+        data_size = min(data_size, chunk_size - 8 - offset)
+    audio_format = 3 if sample_format == 'float' else 1
+    return WavStreamInfo(audio_format, channels, sample_rate, bits_per_sample, data_size,
+                         sample_format, big_endian)
+
+
+def read_audio_header(f):
+    """
+    Like read_wav_header, but for any of the uncompressed formats this
+    module understands: wav, RF64/BW64, Sony Wave64 and AIFF/AIFF-C. Raises
+    CouldntDecodeError for anything else.
+    """
+    head = read_exactly(f, 12)
+    if len(head) == 12:
+        if head[:4] in _RIFF_IDS and head[8:12] == b'WAVE':
+            return _read_riff_chunks(f)
+        if head[:4] == b'FORM' and head[8:12] in (b'AIFF', b'AIFC'):
+            return _read_aiff_chunks(f, head[8:12] == b'AIFC')
+        if head[:4] == _W64_RIFF[:4]:
+            head += read_exactly(f, 28)
+            if head[:16] == _W64_RIFF and head[24:40] == _W64_WAVE:
+                return _read_w64_chunks(f)
+    raise CouldntDecodeError("Couldn't find a wav, w64 or aiff header in the data")
+
+
+class BufferReader(object):
+    """
+    A minimal read-only file over a buffer, that doesn't copy it (unlike
+    io.BytesIO) so headers can be parsed in place
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast('B')
+        self._pos = 0
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos += len(chunk)
+        return chunk
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        base = (0, self._pos, len(self._view))[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+
+def read_audio_buffer(data):
+    """
+    Parses audio file data that is entirely in memory, returns its
+    WavStreamInfo and a memoryview over its samples (nothing is copied)
+    """
+    reader = BufferReader(data)
+    info = read_audio_header(reader)
+    start = reader.tell()
+    end = None if info.data_size is None else start + info.data_size
+    return info, reader._view[start:end]
+
+
+def stored_sample_width(info):
+    """
+    The number of bytes a sample takes in the file
+    """
+    return (info.bits_per_sample + 7) // 8
+
+
+def pcm_sample_width(info):
+    """
+    The sample width of the audio once converted by to_pcm (floats become
+    32-bit integers)
+    """
+    return 4 if info.sample_format == 'float' else stored_sample_width(info)
+
+
+def needs_conversion(info):
+    """
+    Whether the stored samples differ from signed little-endian integers
+    """
+    return (info.sample_format != 'int' or
+            (info.big_endian and stored_sample_width(info) > 1))
+
+
+def _convert_samples(data, info, width):
+    if info.sample_format == 'float':
+        samples = np.frombuffer(data, dtype='%sf%d' % ('>' if info.big_endian else '<', width))
+        return float_to_int(samples, 4)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if info.sample_format == 'uint':
+        return raw ^ 0x80
+    # big-endian, reverse the bytes of each sample
+    return np.ascontiguousarray(raw.reshape(-1, width)[:, ::-1])
+
+
+def to_pcm(data, info, block_size=1 << 20):
+    """
+    Converts samples stored as info describes to signed little-endian
+    integers of pcm_sample_width(info) bytes. Floats are scaled to the full
+    32-bit range. Returns data itself when there is nothing to convert and a
+    new bytearray otherwise. Works block_size samples at a time to bound the
+    temporary memory.
+    """
+    if not needs_conversion(info):
+        return data
+
+    width = stored_sample_width(info)
+    out_width = pcm_sample_width(info)
+    view = memoryview(data).cast('B')
+    count = len(view) // width
+    out = bytearray(count * out_width)
+    target = np.frombuffer(out, dtype=np.uint8)
+    for start in range(0, count, block_size):
+        end = min(start + block_size, count)
+        converted = _convert_samples(view[start * width:end * width], info, width)
+        target[start * out_width:end * out_width] = converted.reshape(-1).view(np.uint8)
+    return out
+
+
+def to_float(data, info):
+    """
+    Converts samples stored as info describes to normalized float32 samples
+    (the "float32" sample format of AudioSegment). Float samples keep their
+    values, including those past full scale. Returns the new sample bytes.
+    """
+    width = stored_sample_width(info)
+    if info.sample_format == 'float':
+        samples = np.frombuffer(data, dtype='%sf%d' % ('>' if info.big_endian else '<', width))
+        return samples.astype(FLOAT_DTYPE).tobytes()
+    return int_to_float(to_pcm(data, info), width)
+
+
+def iter_blocks(f, block_size, limit=None):
+    """
+    Reads f in blocks of block_size bytes until it ends, or until limit bytes
+    have been read. Yields a new bytearray per block, the last one may be
+    shorter than block_size.
+    """
+    readinto = getattr(f, 'readinto', None)
+    while limit is None or limit > 0:
+        size = block_size if limit is None else min(block_size, limit)
+        block = bytearray(size)
+        filled = 0
+        with memoryview(block) as view:
+            while filled < size:
+                if readinto is not None:
+                    n = readinto(view[filled:])
+                else:
+                    chunk = f.read(size - filled)
+                    n = len(chunk)
+                    view[filled:filled + n] = chunk
+                if not n:
+                    break
+                filled += n
+
+        if filled < size:
+            del block[filled:]
+        if block:
+            yield block
+        if limit is not None:
+            limit -= filled
+        if filled < size:
+            break
+
+
+def read_into_buffer(f, size_hint=0, min_growth=1 << 20):
+    """
+    Reads f to the end into a single bytearray, with readinto. The buffer is
+    preallocated to size_hint bytes (a good guess avoids any reallocation)
+    and grown by half its size whenever it turns out to be too small.
+    """
+    buf = bytearray(max(int(size_hint), 0))
+    filled = 0
+    readinto = getattr(f, 'readinto', None)
+    while True:
+        if filled == len(buf):
+            # full, make sure there's more to come before growing it
+            chunk = f.read(min_growth)
+            if not chunk:
+                break
+            buf[filled:] = chunk
+            filled += len(chunk)
+            buf.extend(bytes(max(len(buf) // 2, min_growth)))
+
+        with memoryview(buf) as view:
+            if readinto is not None:
+                n = readinto(view[filled:filled + _MAX_READ])
+            else:
+                chunk = f.read(min(len(buf) - filled, _MAX_READ))
+                n = len(chunk)
+                view[filled:filled + n] = chunk
+        if not n:
+            break
+        filled += n
+
+    del buf[filled:]
+    return buf
+
+
+def wav_header(data_size, channels, sample_rate, sample_width, rf64=None):
+    """
+    Returns the header of a PCM wav file holding data_size bytes of audio,
+    the same one the wave module writes. When the sizes don't fit its 32-bit
+    fields (or rf64 is true) it's an RF64 header, with the sizes in a ds64
+    chunk.
+    """
+    fmt = struct.pack('<4sIHHIIHH', b'fmt ', 16, 1, channels, sample_rate,
+                      channels * sample_rate * sample_width, channels * sample_width,
+                      sample_width * 8)
+    if rf64 is None:
+        rf64 = 36 + data_size > 0xFFFFFFFF
+    if not rf64:
+        return (struct.pack('<4sI4s', b'RIFF', 36 + data_size, b'WAVE') + fmt +
+                struct.pack('<4sI', b'data', data_size))
+
+    frame_count = data_size // (channels * sample_width)
+    ds64 = struct.pack('<4sIQQQI', b'ds64', 28, 72 + data_size, data_size, frame_count, 0)
+    return (struct.pack('<4sI4s', b'RF64', 0xFFFFFFFF, b'WAVE') + ds64 + fmt +
+            struct.pack('<4sI', b'data', 0xFFFFFFFF))
+
+
+def write_buffers(f, buffers):
+    """
+    Writes buffers to f one after the other. Files with a descriptor get
+    them in os.writev calls, straight from the buffers, other file objects
+    (e.g. BytesIO) get one write per buffer.
+    """
+    views = [memoryview(b).cast('B') for b in buffers]
+    views = [v for v in views if len(v)]
+    try:
+        fileno = f.fileno()
+    except (AttributeError, OSError, ValueError):
+        fileno = None
+    if fileno is None or not hasattr(os, 'writev'):
+        for view in views:
+            f.write(view)
+        return
+
+    f.flush()
+    start = f.tell()
+    total = 0
+    while views:
+        written = os.writev(fileno, views[:_IOV_MAX])
+        total += written
+        # drop what was written, a write may stop part way through a buffer
+        while written:
+            if written >= len(views[0]):
+                written -= len(views.pop(0))
+            else:
+                views[0] = views[0][written:]
+                written = 0
+    # move f's own position past what was written behind its back
+    f.seek(start + total)
+
+
+def write_wav(f, data, channels, sample_rate, sample_width, rf64=None):
+    """
+    Writes data (PCM samples as stored in wav files: unsigned when 8-bit,
+    signed little-endian otherwise) to f as a wav file, switching to RF64
+    when it's too big for plain wav. Nothing is copied.
+    """
+    data = memoryview(data).cast('B')
+    header = wav_header(len(data), channels, sample_rate, sample_width, rf64)
+    write_buffers(f, [header, data])
@@ -0,0 +1,240 @@
+"""
+Band-limited sample rate conversion with a NumPy polyphase filter bank.
+
+The rates are reduced to an up/down ratio, and every output frame is the
+dot product of a few input frames with one phase of a Kaiser windowed sinc
+low-pass filter. Output frames up frames apart use the same phase and
+input windows down frames apart, so each phase is one matrix product over
+a strided view of the input. Filter designs are cached per (up, down,
+quality).
+
+Resampler carries its input history from block to block, so a long stream
+resampled in pieces is sample for sample the same as resampled whole.
+"""
+import functools
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# quality: (zero crossings of the sinc on each side, Kaiser window beta,
+# cutoff as a fraction of the lower Nyquist frequency)
+QUALITY_PRESETS = {
+    "low": (8, 6.0, 0.85),
+    "medium": (16, 8.0, 0.9),
+    "high": (32, 9.0, 0.945),
+    "very_high": (64, 12.0, 0.97),
+}
+
+DEFAULT_QUALITY = "high"
+
+
+def check_quality(quality):
+    if quality not in QUALITY_PRESETS:
+        raise ValueError("Unknown resampling quality {0!r}, expected one of {1}".format(
+            quality, sorted(QUALITY_PRESETS)))
+
+
+def rate_ratio(in_rate, out_rate):
+    """
+    Returns (up, down), out_rate / in_rate as a reduced fraction
+    """
+    if in_rate <= 0 or out_rate <= 0:
+        raise ValueError("sample rates must be positive (got {0} and {1})".format(in_rate, out_rate))
+    d = math.gcd(int(in_rate), int(out_rate))
+    return int(out_rate) // d, int(in_rate) // d
+
+
+@functools.lru_cache(maxsize=32)
+def design_filter(up, down, quality=DEFAULT_QUALITY):
+    """
+    Designs the polyphase filter bank for resampling by up/down. Returns
+    (filters, delay): a read-only (up, taps) array, where row p holds the
+    taps applied to the input frames n - taps + 1, ..., n - 1, n for
+    outputs of phase p, and the filter's delay in upsampled frames.
+    """
+    check_quality(quality)
+    zero_crossings, beta, rolloff = QUALITY_PRESETS[quality]
+
+    # the cutoff is below the lower of the two Nyquist frequencies, so the
+    # sinc crosses zero every spacing frames at the upsampled rate
+    spacing = max(up, down) / rolloff
+    delay = int(math.ceil(zero_crossings * spacing))
+    length = 2 * delay + 1
+    prototype = np.sinc(np.arange(-delay, delay + 1) / spacing) * np.kaiser(length, beta)
+
+    taps = -(-length // up)
+    padded = np.zeros(taps * up)
+    padded[:length] = prototype
+    filters = np.ascontiguousarray(padded.reshape(taps, up).T[:, ::-1])
+    # every phase passes DC at unity gain
+    filters /= filters.sum(axis=1, keepdims=True)
+    filters.flags.writeable = False
+    return filters, delay
+
+
+def output_length(frame_count, in_rate, out_rate):
+    """
+    The number of frames frame_count input frames resample to
+    """
+    up, down = rate_ratio(in_rate, out_rate)
+    return -(-frame_count * up // down)
+
+
+class Resampler(object):
+    """
+    Converts a stream of frames (float arrays of shape (frames, channels))
+    from in_rate to out_rate:
+
+        resampler = Resampler(44100, 48000, channels=2)
+        for block in blocks:
+            out.append(resampler.process(block))
+        out.append(resampler.flush())
+
+    process returns the output frames that the input so far determines,
+    flush the rest (the stream is padded with silence). Together they hold
+    output_length(input frames) frames, aligned with the input: the
+    filter's delay is compensated for. The resampler then starts over.
+    """
+
+    def __init__(self, in_rate, out_rate, channels=1, quality=DEFAULT_QUALITY,
+                 block_size=1 << 12):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        self.quality = quality
+        self.block_size = block_size
+        self.up, self.down = rate_ratio(in_rate, out_rate)
+        self.filters, self.delay = design_filter(self.up, self.down, quality)
+        self.taps = self.filters.shape[1]
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the stream so far
+        """
+        # input history, starting with silence before the first frame.
+        # _start is the index (in the stream) of its first frame
+        self._history = np.zeros((self.taps, self.channels))
+        self._start = -self.taps
+        self._consumed = 0
+        self._produced = 0
+
+    def _input_index(self, output_index):
+        # the last input frame that output frame output_index depends on
+        return (output_index * self.down + self.delay) // self.up
+
+    def _run(self, end):
+        count = max(0, end - self._produced)
+        out = np.empty((count, self.channels))
+        if not count:
+            # the history may be shorter than the filter (an empty stream)
+            return out
+        windows = sliding_window_view(self._history, self.taps, axis=0)
+
+        for i in range(min(self.up, count)):
+            t = (self._produced + i) * self.down + self.delay
+            n = t // self.up
+            weights = self.filters[t - n * self.up]
+            first = n - self.taps + 1 - self._start
+            rows = len(range(i, count, self.up))
+            # block_size rows at a time, to bound the temporary copies
+            for j in range(0, rows, self.block_size):
+                k = min(rows, j + self.block_size)
+                selected = windows[first + j * self.down:first + (k - 1) * self.down + 1:self.down]
+                out[i + j * self.up:i + k * self.up:self.up] = selected @ weights
+
+        self._produced = max(self._produced, end)
+        return out
+
+    def process(self, frames):
+        """
+        Feeds frames (an array of shape (frames, channels), or of samples
+        for a single channel) in, returns the output frames that are ready
+        """
+        frames = np.asarray(frames, dtype=np.float64).reshape(-1, self.channels)
+        self._history = np.concatenate((self._history, frames))
+        self._consumed += len(frames)
+
+        ready = -(-(self._consumed * self.up - self.delay) // self.down)
+        out = self._run(ready)
+
+        # keep only the history the next output frames need
+        drop = self._input_index(self._produced) - self.taps + 1 - self._start
+        if drop > 0:
+            self._history = self._history[drop:]
+            self._start += drop
+        return out
+
+    def flush(self):
+        """
+        Returns the remaining output frames and resets the resampler
+        """
+        total = -(-self._consumed * self.up // self.down)
+        if total > self._produced:
+            missing = self._input_index(total - 1) + 1 - (self._start + len(self._history))
+            if missing > 0:
+                self._history = np.concatenate((self._history, np.zeros((missing, self.channels))))
+        out = self._run(total)
+        self.reset()
+        return out
+
+
+def resample(frames, in_rate, out_rate, quality=DEFAULT_QUALITY):
+    """
+    Resamples frames (an array of shape (frames, channels)) as a whole,
+    returns a float64 array of output_length(len(frames)) frames
+    """
+    frames = np.asarray(frames)
+    resampler = Resampler(in_rate, out_rate, frames.shape[1], quality)
+    return np.concatenate((resampler.process(frames), resampler.flush()))
+
+
+class SegmentResampler(object):
+    """
+    Resamples a stream of AudioSegments, blocks of the same audio (such as
+    those of AudioSegment.iter_file), to frame_rate without seams between
+    the blocks:
+
+        resampler = SegmentResampler(48000)
+        for block in AudioSegment.iter_file("in.flac"):
+            sink.write(resampler.process(block))
+        sink.write(resampler.flush())
+
+    Blocks already at frame_rate are passed through. With quality "linear"
+    every block goes through AudioSegment.set_frame_rate on its own, with
+    audioop.ratecv's interpolation.
+    """
+
+    def __init__(self, frame_rate, quality=DEFAULT_QUALITY):
+        if quality != "linear":
+            check_quality(quality)
+        self.frame_rate = frame_rate
+        self.quality = quality
+        self._resampler = None
+        self._last = None
+
+    def process(self, seg):
+        """
+        Returns the resampled audio that is ready, as an AudioSegment (which
+        may be empty)
+        """
+        if self._resampler is None:
+            if seg.frame_rate == self.frame_rate or self.quality == "linear":
+                return seg.set_frame_rate(self.frame_rate, self.quality)
+            self._resampler = Resampler(seg.frame_rate, self.frame_rate, seg.channels, self.quality)
+        elif (seg.frame_rate, seg.channels) != (self._resampler.in_rate, self._resampler.channels):
+            raise ValueError("all blocks must have the frame rate and channels of the first one")
+
+        self._last = seg
+        frames = self._resampler.process(seg._samples().reshape(-1, seg.channels))
+        return seg._spawn(seg._encode(frames), overrides={'frame_rate': self.frame_rate})
+
+    def flush(self):
+        """
+        Returns the end of the resampled audio, or None if there is none
+        """
+        if self._resampler is None:
+            return None
+        frames = self._resampler.flush()
+        return self._last._spawn(self._last._encode(frames), overrides={'frame_rate': self.frame_rate})
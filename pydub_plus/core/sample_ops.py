@@ -0,0 +1,554 @@
+"""
+NumPy helpers for working with interleaved PCM sample buffers.
+
+All functions accept any object supporting the buffer protocol (bytes,
+bytearray, memoryview, mmap, array.array) and interpret it as little-endian
+signed integer samples of the given sample width. Those taking a floating
+argument read float32 samples instead when it is true (the "float32" sample
+format of AudioSegment: normalized, with 1.0 as full scale), which are
+neither rounded nor clipped.
+"""
+import math
+
+import numpy as np
+
+DTYPES = {
+    1: np.dtype("i1"),
+    2: np.dtype("<i2"),
+    4: np.dtype("<i4"),
+}
+
+FLOAT_DTYPE = np.dtype("<f4")
+
+
+def check_sample_width(sample_width):
+    if sample_width not in (1, 2, 3, 4):
+        raise ValueError("sample_width must be 1, 2, 3 or 4 (got {0})".format(sample_width))
+
+
+def sample_range(sample_width):
+    """
+    Returns the (min, max) values representable with the given sample width
+    """
+    bits = sample_width * 8
+    return -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+
+
+def frombuffer(data, sample_width):
+    """
+    Returns the samples in data as a 1-d numpy array.
+
+    For 1, 2 and 4 byte samples the array is a (read-only when data is
+    immutable) view of data, no copy is made. 24-bit samples are unpacked
+    into a new int32 array.
+    """
+    if sample_width == 3:
+        return unpack24(data)
+    return np.frombuffer(data, dtype=DTYPES[sample_width])
+
+
+def samples_of(data, sample_width, floating=False):
+    """
+    frombuffer for either sample format
+    """
+    if floating:
+        return np.frombuffer(data, dtype=FLOAT_DTYPE)
+    return frombuffer(data, sample_width)
+
+
+def int_to_float(data, sample_width):
+    """
+    Converts integer samples to normalized float32 samples, returns the new
+    sample bytes
+    """
+    minval, _ = sample_range(sample_width)
+    samples = frombuffer(data, sample_width).astype(np.float64) / -minval
+    return samples.astype(FLOAT_DTYPE).tobytes()
+
+
+def float_to_int(samples, sample_width):
+    """
+    Scales normalized float samples to integers of sample_width bytes,
+    rounding to the nearest integer and clipping (like ffmpeg does). Returns
+    an array of the matching integer dtype (int32 for 24-bit samples).
+    """
+    minval, _ = sample_range(sample_width)
+    scaled = np.rint(np.asarray(samples, dtype=np.float64) * -minval)
+    return saturate(scaled, sample_width)
+
+
+def scale_float(data, factor):
+    """
+    audioop.mul for float32 samples
+    """
+    samples = np.frombuffer(data, dtype=FLOAT_DTYPE) * np.float32(factor)
+    return samples.astype(FLOAT_DTYPE, copy=False).tobytes()
+
+
+def linear_resample(frames, inrate, outrate):
+    """
+    Resamples float frames (an array of shape (frames, channels)) from
+    inrate to outrate with the linear interpolation audioop.ratecv does,
+    starting from silence
+    """
+    d = math.gcd(inrate, outrate)
+    inrate //= d
+    outrate //= d
+
+    history = np.concatenate((np.zeros((2, frames.shape[1])), frames))
+    available = (len(frames) - 1) * outrate
+    out_count = available // inrate + 1 if available >= 0 else 0
+    m = np.arange(out_count, dtype=np.int64)
+    k = np.maximum(0, -((-outrate - m * inrate) // outrate))
+    d_m = ((k - 1) * outrate - m * inrate).astype(np.float64)[:, None]
+    return (history[k] * d_m + history[k + 1] * (outrate - d_m)) / outrate
+
+
+def unpack24(data):
+    """
+    Sign-extends packed little-endian 24-bit samples into an int32 array
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    out = np.empty(len(raw) // 3, dtype="<i4")
+    wide = out.view(np.uint8).reshape(-1, 4)
+    packed = raw.reshape(-1, 3)
+    wide[:, :3] = packed
+    wide[:, 3] = np.where(packed[:, 2] & 0x80, 0xFF, 0)
+    return out
+
+
+def widen24(data):
+    """
+    Widens packed little-endian 24-bit samples to 32 bits the way
+    AudioSegment always has: the 24 bits become the top three bytes and the
+    low byte is 0xFF for negative samples (0 otherwise). Returns a bytearray,
+    a trailing partial sample is dropped.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    packed = raw[:len(raw) - len(raw) % 3].reshape(-1, 3)
+    out = bytearray(len(packed) * 4)
+    wide = np.frombuffer(out, dtype=np.uint8).reshape(-1, 4)
+    wide[:, 1:] = packed
+    wide[:, 0] = (packed[:, 2] >> 7) * 0xFF
+    return out
+
+
+def pack24(samples):
+    """
+    Packs an array of integers in the 24-bit range into little-endian
+    3-byte samples
+    """
+    wide = np.ascontiguousarray(samples, dtype="<i4").view(np.uint8).reshape(-1, 4)
+    return np.ascontiguousarray(wide[:, :3]).reshape(-1)
+
+
+def _raw_samples(data, sample_width):
+    # samples as opaque units to copy around: unsigned integers of the same
+    # width where there is one (much faster to move than single bytes)
+    if sample_width in (1, 2, 4, 8):
+        return np.frombuffer(data, dtype="u%d" % sample_width)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, sample_width)
+
+
+def deinterleave(data, sample_width, channels):
+    """
+    Copies interleaved frames into planar form, in a single pass. Returns an
+    array with one row per channel, each holding the raw samples of that
+    channel. Samples are copied as they are, so any sample width or format
+    works.
+    """
+    raw = _raw_samples(data, sample_width)
+    frames = raw.reshape((-1, channels) + raw.shape[1:])
+    return np.ascontiguousarray(frames.swapaxes(0, 1))
+
+
+def interleave(buffers, sample_width, frame_count=None):
+    """
+    Interleaves one buffer of samples per channel into frames, in a single
+    pass. Buffers shorter than frame_count (by default the longest one) are
+    padded with zero samples. Returns a new bytearray.
+    """
+    planes = [_raw_samples(buf, sample_width) for buf in buffers]
+    if frame_count is None:
+        frame_count = max(len(plane) for plane in planes)
+
+    out = bytearray(frame_count * len(planes) * sample_width)
+    frames = _raw_samples(out, sample_width)
+    frames = frames.reshape((frame_count, len(planes)) + frames.shape[1:])
+    for i, plane in enumerate(planes):
+        plane = plane[:frame_count]
+        frames[:len(plane), i] = plane
+    return out
+
+
+def tobytes(samples, sample_width, floating=False):
+    """
+    Encodes an integer array (whose values already fit sample_width) as raw
+    little-endian PCM bytes, or a float array as float32 samples
+    """
+    if floating:
+        return np.asarray(samples).astype(FLOAT_DTYPE, copy=False).tobytes()
+    if sample_width == 3:
+        return pack24(samples).tobytes()
+    return np.asarray(samples).astype(DTYPES[sample_width], copy=False).tobytes()
+
+
+def saturate(samples, sample_width):
+    """
+    Clips samples to the range of sample_width and casts them to the
+    matching integer dtype (int32 for 24-bit samples)
+    """
+    minval, maxval = sample_range(sample_width)
+    samples = np.clip(samples, minval, maxval)
+    return samples.astype(DTYPES.get(sample_width, np.dtype("<i4")))
+
+
+def floor_saturate(samples, sample_width):
+    """
+    Rounds float samples towards -inf and clips them to sample_width, which
+    is how audioop converts scaled samples back to integers
+    """
+    minval, maxval = sample_range(sample_width)
+    samples = np.floor(np.clip(samples, minval, maxval))
+    return samples.astype(DTYPES.get(sample_width, np.dtype("<i4")))
+
+
+def sequential_sum(values, start=0.0, chunk_size=1 << 20):
+    """
+    Sums float64 values strictly left to right, matching the rounding of a
+    plain C accumulation loop (numpy's sum uses pairwise summation)
+    """
+    total = float(start)
+    for i in range(0, len(values), chunk_size):
+        chunk = np.asarray(values[i:i + chunk_size], dtype=np.float64)
+        chunk = np.concatenate(([total], chunk))
+        total = float(np.cumsum(chunk)[-1])
+    return total
+
+
+def measure_channels(data, sample_width, channels, floating=False, chunk_size=1 << 20):
+    """
+    Measures every channel of data in a single pass, chunk_size samples at
+    a time. Returns (peaks, sums, squares, clipped, total_squares): arrays
+    with, per channel, the largest absolute sample, the sum of the samples,
+    the sum of their squares and the number of samples at the limits of the
+    sample range (for floats: at or past full scale), and the sum of all
+    the squares added up one sample at a time in order, as audioop.rms does.
+    """
+    samples = samples_of(data, sample_width, floating)
+    minval, maxval = (-1.0, 1.0) if floating else sample_range(sample_width)
+    wide_dtype = np.float64 if floating else np.int64
+
+    peaks = np.zeros(channels, dtype=wide_dtype)
+    sums = np.zeros(channels, dtype=wide_dtype)
+    squares = np.zeros(channels, dtype=np.float64)
+    clipped = np.zeros(channels, dtype=np.int64)
+    total_squares = 0.0
+    # when every partial sum of the squares is an integer that a double
+    # holds exactly, the order of the additions doesn't matter
+    exact = not floating and len(samples) * minval * minval < 2 ** 53
+
+    rows = max(1, chunk_size // channels) * channels
+    for start in range(0, len(samples), rows):
+        chunk = samples[start:start + rows]
+        # planar, so that every reduction runs over contiguous memory
+        planar = np.ascontiguousarray(chunk.reshape(-1, channels).T)
+        np.maximum(peaks, planar.max(axis=1), out=peaks)
+        np.maximum(peaks, -planar.min(axis=1).astype(wide_dtype), out=peaks)
+        sums += planar.sum(axis=1, dtype=wide_dtype)
+        clipped += np.count_nonzero(planar <= minval, axis=1)
+        clipped += np.count_nonzero(planar >= maxval, axis=1)
+
+        wide = planar.astype(np.float64)
+        squares += np.einsum('ij,ij->i', wide, wide)
+        if not floating and not exact:
+            interleaved = chunk.astype(np.float64)
+            interleaved *= interleaved
+            total_squares = sequential_sum(interleaved, start=total_squares)
+
+    if floating or exact:
+        total_squares = float(squares.sum())
+    return peaks, sums, squares, clipped, total_squares
+
+
+def range_energies(data, sample_width, channels, bounds, floating=False, chunk_size=1 << 20):
+    """
+    Sums the squares of the samples (of every channel) in each range of
+    frames bounds[k]:bounds[k + 1], in one pass over data. bounds must be
+    non-decreasing and within the frame count.
+
+    Integer squares are summed exactly, split into their high and low 32
+    bits: returns an int64 array of shape (2, len(bounds) - 1) where the sum
+    of range k is out[0, k] * 2**32 + out[1, k]. Float samples give a
+    float64 array of shape (1, len(bounds) - 1).
+    """
+    samples = samples_of(data, sample_width, floating)
+    bounds = np.asarray(bounds, dtype=np.int64)
+    count = max(0, len(bounds) - 1)
+    out = np.zeros((1 if floating else 2, count), dtype=np.float64 if floating else np.int64)
+
+    per_chunk = max(1, chunk_size // channels)
+    k = 0
+    while k < count:
+        # as many whole ranges as fit in a chunk, but at least one
+        stop = int(np.searchsorted(bounds, bounds[k] + per_chunk, side="right")) - 1
+        stop = min(count, max(k + 1, stop))
+        block = samples[bounds[k] * channels:bounds[stop] * channels]
+
+        if floating:
+            wide = block.astype(np.float64)
+            wide *= wide
+            parts = [wide]
+        else:
+            wide = block.astype(np.int64)
+            wide *= wide
+            if sample_width <= 2:
+                parts = [None, wide]
+            else:
+                parts = [wide >> 32, wide & 0xFFFFFFFF]
+
+        # the ranges' sums are differences of the running sum of the squares
+        local = (bounds[k:stop + 1] - bounds[k]) * channels
+        for row, part in zip(out, parts):
+            if part is None:
+                continue
+            cumulative = np.zeros(len(part) + 1, dtype=part.dtype)
+            np.cumsum(part, out=cumulative[1:])
+            row[k:stop] = cumulative[local[1:]] - cumulative[local[:-1]]
+        k = stop
+    return out
+
+
+def window_sums(energies, starts, length, block_size=1 << 16):
+    """
+    Adds up energies (as returned by range_energies) over the windows of
+    ranges starts[i]:starts[i] + length, for non-decreasing starts, with
+    prefix sums: O(ranges) however long the windows are. Returns a float64
+    array, each integer sum rounded once.
+
+    The prefix sums start over every block_size ranges, which keeps the
+    integer ones from overflowing and the float ones precise.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    out = np.empty(len(starts), dtype=np.float64)
+
+    i = 0
+    while i < len(starts):
+        j = int(np.searchsorted(starts, starts[i] + block_size, side="right"))
+        first = starts[i]
+        span = energies[:, first:starts[j - 1] + length]
+        cumulative = np.zeros((len(span), span.shape[1] + 1), dtype=span.dtype)
+        np.cumsum(span, axis=1, out=cumulative[:, 1:])
+
+        local = starts[i:j] - first
+        sums = (cumulative[:, local + length] - cumulative[:, local]).astype(np.float64)
+        if len(sums) == 2:
+            # both parts are exact as doubles, so only the addition rounds
+            out[i:j] = sums[0] * float(1 << 32) + sums[1]
+        else:
+            out[i:j] = sums[0]
+        i = j
+    return out
+
+
+def _linear_fade(t, from_power, to_power):
+    return from_power + (to_power - from_power) * t
+
+
+# the gain (-120 dB, the floor fade_in and fade_out start from) silent ends
+# of an exponential fade are taken as, since there is no ratio to silence
+EXPONENTIAL_FADE_FLOOR = 10 ** (-120 / 20.0)
+
+
+def _exponential_fade(t, from_power, to_power):
+    # linear in dB
+    from_power = np.maximum(from_power, EXPONENTIAL_FADE_FLOOR)
+    to_power = np.maximum(to_power, EXPONENTIAL_FADE_FLOOR)
+    return from_power * (to_power / from_power) ** t
+
+
+def _equal_power_fade(t, from_power, to_power):
+    # sine law when fading in, cosine law when fading out, so a fade in and
+    # a fade out of the same length sum to constant power
+    if to_power >= from_power:
+        shape = np.sin(t * (np.pi / 2))
+    else:
+        shape = 1 - np.cos(t * (np.pi / 2))
+    return from_power + (to_power - from_power) * shape
+
+
+def _s_curve_fade(t, from_power, to_power):
+    shape = 0.5 - 0.5 * np.cos(t * np.pi)
+    return from_power + (to_power - from_power) * shape
+
+
+FADE_CURVES = {
+    "linear": _linear_fade,
+    "exponential": _exponential_fade,
+    "db": _exponential_fade,
+    "equal_power": _equal_power_fade,
+    "s_curve": _s_curve_fade,
+}
+
+
+def fade_envelope(frame_count, from_power, to_power, curve="linear"):
+    """
+    Returns one gain (amplitude ratio) per frame for a fade from from_power
+    to to_power over frame_count frames.
+
+    curve is either the name of one of FADE_CURVES or a function mapping the
+    fade position (a float array in [0, 1)) to the fade progress (0 is
+    from_power, 1 is to_power).
+    """
+    frames = np.arange(frame_count, dtype=np.float64)
+    if curve == "linear":
+        # same stepping as the original per-frame fade loop
+        return from_power + ((to_power - from_power) / frame_count) * frames
+
+    t = frames / frame_count
+    if callable(curve):
+        return _linear_fade(np.asarray(curve(t), dtype=np.float64), from_power, to_power)
+
+    try:
+        fade_fn = FADE_CURVES[curve]
+    except KeyError:
+        raise ValueError("Unknown fade curve {0!r}, expected one of {1}".format(
+            curve, sorted(FADE_CURVES)))
+    return fade_fn(t, from_power, to_power)
+
+
+def apply_envelope(data, sample_width, channels, envelope, floating=False):
+    """
+    Multiplies every frame in data by the matching gain in envelope (audioop
+    mul rounding and saturation), returns the new sample bytes
+    """
+    frames = samples_of(data, sample_width, floating).reshape(-1, channels)
+    scaled = frames * np.asarray(envelope, dtype=np.float64)[:len(frames), None]
+    if floating:
+        return scaled.astype(FLOAT_DTYPE).tobytes()
+    return tobytes(floor_saturate(scaled, sample_width), sample_width)
+
+
+def remix_channels(data, sample_width, channels, matrix, floating=False, block_size=1 << 20):
+    """
+    Mixes the channels of data through matrix, which has one row per output
+    channel holding one gain per input channel. Each output sample is the
+    sum of the input samples times their gains, rounded and saturated the
+    way audioop.tomono, tostereo and mul do. Returns the new sample bytes.
+    """
+    frames = samples_of(data, sample_width, floating).reshape(-1, channels)
+    matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, channels)
+
+    out = []
+    rows = max(1, block_size // channels)
+    for start in range(0, len(frames), rows):
+        block = frames[start:start + rows]
+        mixed = np.zeros((len(block), len(matrix)), dtype=np.float64)
+        for out_channel, gains in enumerate(matrix):
+            for in_channel, gain in enumerate(gains):
+                # summed in input channel order, like audioop's C loops
+                if gain == 1:
+                    mixed[:, out_channel] += block[:, in_channel]
+                elif gain:
+                    mixed[:, out_channel] += block[:, in_channel] * gain
+        if floating:
+            out.append(mixed.astype(FLOAT_DTYPE).tobytes())
+        else:
+            out.append(tobytes(floor_saturate(mixed, sample_width), sample_width))
+    return b''.join(out)
+
+
+def _writable_samples(buf, sample_width, floating=False):
+    """
+    Returns a numpy array writing through to buf, or None for 24-bit samples
+    (which have no matching dtype)
+    """
+    if floating:
+        return np.frombuffer(buf, dtype=FLOAT_DTYPE)
+    if sample_width == 3:
+        return None
+    return np.frombuffer(buf, dtype=DTYPES[sample_width])
+
+
+def overlay_into(out, base, overlay, sample_width, times=1, gain=None,
+                 block_size=1 << 20, floating=False):
+    """
+    Mixes overlay into base and writes the result to out, a writable buffer
+    of the same size as base.
+
+    overlay is repeated back to back from the start of base, times times (or
+    until base ends when times is negative). Where overlay is mixed in, base
+    is first scaled by gain (if given). Scaling and mixing saturate the same
+    way audioop.mul and audioop.add do.
+
+    The repetitions are processed as rows of a 2-d view of base, so looping
+    a short overlay over a long base is a few broadcast operations rather
+    than one loop iteration per repetition.
+    """
+    out = memoryview(out).cast('B')
+    minval, maxval = sample_range(sample_width)
+    base_samples = samples_of(base, sample_width, floating)
+    total = len(base_samples)
+
+    # wide enough to hold the sum of two samples without overflowing
+    if floating:
+        work_dtype = np.float32
+    elif gain is not None:
+        work_dtype = np.float64
+    else:
+        work_dtype = np.int64 if sample_width == 4 else np.int32
+    overlay_samples = samples_of(overlay, sample_width, floating).astype(work_dtype)
+    length = len(overlay_samples)
+
+    repeats = 0
+    if length:
+        repeats = -(-total // length)
+        if times >= 0:
+            repeats = min(repeats, times)
+    covered = min(repeats * length, total)
+
+    # audio after the last repetition is copied as is
+    out[covered * sample_width:] = memoryview(base).cast('B')[covered * sample_width:]
+    if not covered:
+        return out
+
+    target = _writable_samples(out, sample_width, floating)
+
+    def mix(start, samples, overlay_part):
+        if floating:
+            # no rounding and no clipping, floats have headroom
+            mixed = samples * np.float32(1 if gain is None else gain)
+            mixed += overlay_part
+        elif gain is not None:
+            mixed = samples * gain
+            np.floor(mixed, out=mixed)
+            np.clip(mixed, minval, maxval, out=mixed)
+            mixed += overlay_part
+            np.clip(mixed, minval, maxval, out=mixed)
+        else:
+            mixed = samples.astype(work_dtype)
+            mixed += overlay_part
+            np.clip(mixed, minval, maxval, out=mixed)
+
+        mixed = mixed.reshape(-1)
+        if target is None:
+            offset = start * sample_width
+            out[offset:offset + len(mixed) * sample_width] = pack24(mixed.astype(np.int32))
+        else:
+            target[start:start + len(mixed)] = mixed
+
+    # whole repetitions, a block of rows at a time
+    full = covered // length
+    rows_per_block = max(1, block_size // length)
+    for row in range(0, full, rows_per_block):
+        rows = min(rows_per_block, full - row)
+        start = row * length
+        block = base_samples[start:start + rows * length].reshape(rows, length)
+        mix(start, block, overlay_samples)
+
+    # the last, partial, repetition
+    start = full * length
+    if start < covered:
+        mix(start, base_samples[start:covered], overlay_samples[:covered - start])
+
+    return out
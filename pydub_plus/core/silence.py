@@ -2,16 +2,28 @@
 Various functions for finding/manipulating silence in AudioSegments
 """
 import itertools
+import os
 
+import numpy as np
+
+from .energy_index import EnergyIndex, below_dbfs, complete_ms, energy_rms, ms_to_frames
+from .sample_ops import range_energies, window_sums
 from .utils import db_to_float
 
 
+def _energy_index(audio):
+    # the EnergyIndex to answer queries about audio (a segment or an index) from
+    if isinstance(audio, EnergyIndex):
+        return audio
+    return audio.energy_index()
+
+
 def detect_silence(audio_segment, min_silence_len=1000, silence_thresh=-16, seek_step=1):
     """
     Returns a list of all silent sections [start, end] in milliseconds of audio_segment.
     Inverse of detect_nonsilent()
 
-    audio_segment - the segment to find silence in
+    audio_segment - the segment to find silence in (or its EnergyIndex)
     min_silence_len - the minimum length for any silent section
     silence_thresh - the upper bound for how quiet is silent in dFBS
     seek_step - step size for interating over the segment in ms
@@ -25,9 +37,6 @@ def detect_silence(audio_segment, min_silence_len=1000, silence_thresh=-16, seek
     # convert silence threshold to a float value (so we can compare it to rms)
     silence_thresh = db_to_float(silence_thresh) * audio_segment.max_possible_amplitude
 
-    # find silence and add start and end indicies to the to_cut list
-    silence_starts = []
-
     # check successive (1 sec by default) chunk of sound for silence
     # try a chunk at every "seek step" (or every chunk for a seek step == 1)
     last_slice_start = seg_len - min_silence_len
@@ -38,10 +47,10 @@ def detect_silence(audio_segment, min_silence_len=1000, silence_thresh=-16, seek
     if last_slice_start % seek_step:
         slice_starts = itertools.chain(slice_starts, [last_slice_start])
 
-    for i in slice_starts:
-        audio_slice = audio_segment[i:i + min_silence_len]
-        if audio_slice.rms <= silence_thresh:
-            silence_starts.append(i)
+    # the rms of every slice at once, from the segment's energy index
+    slice_starts = np.fromiter(slice_starts, dtype=np.int64)
+    slice_rms = _energy_index(audio_segment).window_rms(slice_starts, min_silence_len)
+    silence_starts = slice_starts[slice_rms <= silence_thresh].tolist()
 
     # short circuit when there is no silence
     if not silence_starts:
@@ -78,7 +87,7 @@ def detect_nonsilent(audio_segment, min_silence_len=1000, silence_thresh=-16, se
     Returns a list of all nonsilent sections [start, end] in milliseconds of audio_segment.
     Inverse of detect_silent()
 
-    audio_segment - the segment to find silence in
+    audio_segment - the segment to find silence in (or its EnergyIndex)
     min_silence_len - the minimum length for any silent section
     silence_thresh - the upper bound for how quiet is silent in dFBS
     seek_step - step size for interating over the segment in ms
@@ -163,20 +172,304 @@ def split_on_silence(audio_segment, min_silence_len=1000, silence_thresh=-16, ke
     ]
 
 
+class _SilenceSplitter(object):
+    """
+    The state iter_split_on_silence carries from block to block.
+    Milliseconds and frames are counted from the start of the stream.
+    """
+
+    def __init__(self, first, min_silence_len, silence_thresh, keep_silence, seek_step):
+        self.template = first
+        self.min_silence_len = min_silence_len
+        self.silence_thresh = db_to_float(silence_thresh) * first.max_possible_amplitude
+        self.keep_silence = keep_silence
+        self.seek_step = seek_step
+        # the length of the stream in ms, once it has ended
+        self.length = float("inf")
+
+        # the audio from frame audio_start on, and the sums of the squared
+        # samples of the milliseconds from energy_start to complete (the
+        # milliseconds whose frames are all in)
+        self.frames = 0
+        self.audio = bytearray()
+        self.audio_start = 0
+        self.energies = range_energies(b"", first.sample_width, first.channels, [0],
+                                       first._floating)
+        self.energy_start = 0
+        self.complete = 0
+
+        # the next slice to check, the last silent one, and the chunk whose
+        # end isn't known yet: [its start, the end of its nonsilent part]
+        self.next_start = 0
+        self.prev_i = None
+        self.pending = None
+
+    def _position(self, ms):
+        return int(ms * (self.template.frame_rate / 1000.0))
+
+    def _add_energies(self, end):
+        if end <= self.complete:
+            return
+        positions = ms_to_frames(self.template.frame_rate, np.arange(self.complete, end + 1))
+        bounds = np.minimum(positions, self.frames) - self.audio_start
+        energies = range_energies(self.audio, self.template.sample_width, self.template.channels,
+                                  bounds, self.template._floating)
+        self.energies = np.concatenate((self.energies, energies), axis=1)
+        self.complete = end
+
+    def _check(self, starts):
+        if not len(starts):
+            return
+        sums = window_sums(self.energies, starts - self.energy_start, self.min_silence_len)
+        positions = ms_to_frames(self.template.frame_rate, starts)
+        ends = ms_to_frames(self.template.frame_rate, starts + self.min_silence_len)
+        slice_rms = energy_rms(sums, positions, ends, self.frames, self.template.channels,
+                                self.template._floating)
+        self.next_start = max(self.next_start, int(starts[-1]) + self.seek_step)
+
+        # the same merging of silent slices as detect_silence, producing
+        # the nonsilent ranges of detect_nonsilent one by one
+        for i in starts[slice_rms <= self.silence_thresh].tolist():
+            if self.prev_i is None:
+                if i > 0:
+                    for chunk in self._nonsilent(0, i):
+                        yield chunk
+            elif i != self.prev_i + self.seek_step and i > self.prev_i + self.min_silence_len:
+                for chunk in self._nonsilent(self.prev_i + self.min_silence_len, i):
+                    yield chunk
+            self.prev_i = i
+
+        # once the silence so far is long enough that the next chunk can't
+        # overlap the pending one, the pending one ends keep_silence after
+        # its nonsilent part
+        if self.pending is not None:
+            start, end = self.pending
+            next_start = self.prev_i + self.min_silence_len - self.keep_silence
+            if next_start >= end + self.keep_silence:
+                self.pending = None
+                yield self._chunk(start, end + self.keep_silence)
+
+    def _nonsilent(self, start, end):
+        # as split_on_silence pads and splits the ranges
+        chunk_start = start - self.keep_silence
+        if self.pending is not None:
+            last_start, last_end = self.pending
+            if chunk_start < last_end + self.keep_silence:
+                chunk_start = (last_end + start) // 2
+                yield self._chunk(last_start, chunk_start)
+            else:
+                yield self._chunk(last_start, last_end + self.keep_silence)
+        self.pending = (chunk_start, end)
+
+    def _chunk(self, start, end):
+        first = self._position(max(start, 0))
+        last = self._position(min(end, self.length))
+        frame_width = self.template.frame_width
+        data = self.audio[(first - self.audio_start) * frame_width:
+                          (min(last, self.frames) - self.audio_start) * frame_width]
+        # slices running past the end are padded with silence
+        if data and last > self.frames:
+            data += bytes((last - self.frames) * frame_width)
+        return self.template._spawn(bytes(data))
+
+    def _trim(self):
+        # keep the audio of the pending chunk, or from where the next one
+        # can start, and of the incomplete milliseconds
+        if self.pending is not None:
+            needed = self.pending[0]
+        elif self.prev_i is not None:
+            needed = self.prev_i + self.min_silence_len - self.keep_silence
+        else:
+            needed = 0
+        drop = self._position(max(0, min(needed, self.complete))) - self.audio_start
+        if drop > 0:
+            del self.audio[:drop * self.template.frame_width]
+            self.audio_start += drop
+
+        # the last slice, checked at the end, can start up to a seek_step
+        # before the next one
+        drop = self.next_start - self.seek_step + 1 - self.energy_start
+        if drop > 0:
+            self.energies = self.energies[:, drop:]
+            self.energy_start += drop
+
+    def feed(self, block):
+        template = self.template
+        if (block.sample_width, block.frame_rate, block.channels, block.sample_format) != \
+                (template.sample_width, template.frame_rate, template.channels, template.sample_format):
+            raise ValueError("all blocks must have the format of the first one")
+
+        self.audio += block._data
+        self.frames += len(block._data) // template.frame_width
+        self._add_energies(complete_ms(template.frame_rate, self.frames))
+
+        last_start = self.complete - self.min_silence_len
+        starts = np.arange(self.next_start, last_start + 1, self.seek_step, dtype=np.int64)
+        for chunk in self._check(starts):
+            yield chunk
+        self._trim()
+
+    def close(self):
+        self.length = round(1000 * (self.frames / self.template.frame_rate))
+        # the milliseconds at the end that are only partly in
+        self._add_energies(self.length)
+
+        last_start = self.length - self.min_silence_len
+        if last_start >= 0:
+            starts = list(range(self.next_start, last_start + 1, self.seek_step))
+            if last_start % self.seek_step:
+                starts.append(last_start)
+            for chunk in self._check(np.array(starts, dtype=np.int64)):
+                yield chunk
+
+        if self.prev_i is None:
+            nonsilent = [0, self.length]
+        else:
+            nonsilent = [self.prev_i + self.min_silence_len, self.length]
+        if nonsilent[0] != nonsilent[1] or self.prev_i is None:
+            for chunk in self._nonsilent(*nonsilent):
+                yield chunk
+        if self.pending is not None:
+            start, end = self.pending
+            yield self._chunk(start, end + self.keep_silence)
+
+
+def iter_split_on_silence(source, min_silence_len=1000, silence_thresh=-16, keep_silence=100,
+                          seek_step=1, **kwargs):
+    """
+    Generator version of split_on_silence for inputs too long to hold in
+    memory: yields the same chunks, each as soon as its end is known.
+
+    source - a file (path or file object, decoded block by block with
+        AudioSegment.iter_file, which takes any other keyword arguments),
+        or an iterable of consecutive AudioSegments of the same format
+
+    Only the audio of the chunk in progress (and the silence that may still
+    become part of it) is held in memory, however long the input is.
+    """
+    from .audio_segment import AudioSegment
+
+    if isinstance(source, AudioSegment):
+        blocks = [source]
+    elif isinstance(source, (str, bytes, os.PathLike)) or hasattr(source, "read"):
+        blocks = AudioSegment.iter_file(source, **kwargs)
+    else:
+        blocks = source
+
+    if isinstance(keep_silence, bool):
+        keep_silence = float("inf") if keep_silence else 0
+
+    splitter = None
+    for block in blocks:
+        if splitter is None:
+            splitter = _SilenceSplitter(block, min_silence_len, silence_thresh, keep_silence,
+                                        seek_step)
+        for chunk in splitter.feed(block):
+            yield chunk
+    if splitter is not None:
+        for chunk in splitter.close():
+            yield chunk
+
+
+def _silent_chunks(seg, starts, ends, silence_threshold):
+    # whether each of the consecutive chunks [starts[i]:ends[i]] (in ms,
+    # ends[i] == starts[i + 1]) of seg is quieter than silence_threshold,
+    # reading only their samples
+    frame_count = int(seg.frame_count())
+    first = ms_to_frames(seg.frame_rate, starts)
+    last = ms_to_frames(seg.frame_rate, ends)
+    bounds = np.minimum(np.append(first, last[-1]), frame_count)
+    data = seg._view()[bounds[0] * seg.frame_width:bounds[-1] * seg.frame_width]
+    energies = range_energies(data, seg.sample_width, seg.channels, bounds - bounds[0],
+                              seg._floating)
+    sums = window_sums(energies, np.arange(len(starts)), 1)
+    rms = energy_rms(sums, first, last, frame_count, seg.channels, seg._floating)
+    return below_dbfs(rms, silence_threshold, seg.max_possible_amplitude, seg._floating)
+
+
+def _silence_bounds(seg, silence_threshold, chunk_size, side, batch=64):
+    # (where the leading silence ends, where the trailing silence starts),
+    # scanning chunks in from each end in growing batches, so that only a
+    # little more than the silence is read
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive (got {0})".format(chunk_size))
+    if side not in ("both", "leading", "trailing"):
+        raise ValueError("side must be 'both', 'leading' or 'trailing' (got {0!r})".format(side))
+    length = len(seg)
+
+    start = 0
+    if side != "trailing":
+        size = batch
+        while start < length:
+            starts = np.arange(start, min(length, start + size * chunk_size), chunk_size)
+            ends = np.minimum(starts + chunk_size, length)
+            silent = _silent_chunks(seg, starts, ends, silence_threshold)
+            if not silent.all():
+                start = int(starts[np.argmin(silent)])
+                break
+            start, size = int(ends[-1]), size * 2
+        start = min(start, length)
+
+    end = length
+    if side != "leading":
+        # chunks counted back from the end; none of them needs checking
+        # below where the leading silence ends
+        size = batch
+        while end > start:
+            ends = np.arange(end, max(start, end - size * chunk_size), -chunk_size)[::-1]
+            starts = np.maximum(ends - chunk_size, 0)
+            silent = _silent_chunks(seg, starts, ends, silence_threshold)
+            if not silent.all():
+                end = int(ends[len(silent) - 1 - np.argmin(silent[::-1])])
+                break
+            end, size = int(starts[0]), size * 2
+        end = max(end, start)
+
+    return start, end
+
+
+def trim_silence(seg, silence_threshold=-50.0, chunk_size=10, side="both"):
+    """
+    Returns seg without its leading and/or trailing silence.
+
+    seg - the segment to trim
+    silence_threshold - the upper bound for how quiet is silent in dFBS
+    chunk_size - chunk size for finding the silence in ms: the leading
+        silence is the chunks from the start, and the trailing silence the
+        chunks back from the end, that are quieter than silence_threshold
+    side - "both", "leading" or "trailing"
+
+    Only about the silent chunks are read, whatever the length of seg.
+    """
+    start, end = _silence_bounds(seg, silence_threshold, chunk_size, side)
+    return seg[start:end]
+
+
 def detect_leading_silence(sound, silence_threshold=-50.0, chunk_size=10):
     """
     Returns the millisecond/index that the leading silence ends.
 
-    audio_segment - the segment to find silence in
+    audio_segment - the segment to find silence in (or its EnergyIndex)
     silence_threshold - the upper bound for how quiet is silent in dFBS
     chunk_size - chunk size for interating over the segment in ms
     """
-    trim_ms = 0 # ms
     assert chunk_size > 0 # to avoid infinite loop
-    while sound[trim_ms:trim_ms+chunk_size].dBFS < silence_threshold and trim_ms < len(sound):
-        trim_ms += chunk_size
+    if isinstance(sound, EnergyIndex):
+        return sound.leading_silence(silence_threshold, chunk_size)
+    return _silence_bounds(sound, silence_threshold, chunk_size, "leading")[0]
 
-    # if there is no end it should return the length of the segment
-    return min(trim_ms, len(sound))
+
+def detect_trailing_silence(sound, silence_threshold=-50.0, chunk_size=10):
+    """
+    Returns the millisecond/index that the trailing silence starts.
+
+    audio_segment - the segment to find silence in (or its EnergyIndex)
+    silence_threshold - the upper bound for how quiet is silent in dFBS
+    chunk_size - chunk size for interating back from the end in ms
+    """
+    assert chunk_size > 0 # to avoid infinite loop
+    if isinstance(sound, EnergyIndex):
+        return sound.trailing_silence(silence_threshold, chunk_size)
+    return _silence_bounds(sound, silence_threshold, chunk_size, "trailing")[1]
 
 
@@ -1,10 +1,13 @@
 from __future__ import division
 from io import BufferedReader
 
+import hashlib
 import json
 import os
 import re
 import sys
+import threading
+from collections import OrderedDict, deque
 from subprocess import Popen, PIPE
 from math import log, ceil
 from tempfile import TemporaryFile
@@ -14,7 +17,8 @@ from functools import wraps
 try:
     import audioop
 except ImportError:
-    import pyaudioop as audioop
+    # python 3.13+ no longer ships audioop, use the numpy implementation
+    from . import npaudioop as audioop
 
 if sys.version_info >= (3, 0):
     basestring = str
@@ -22,16 +26,19 @@ if sys.version_info >= (3, 0):
 FRAME_WIDTHS = {
     8: 1,
     16: 2,
+    24: 3,
     32: 4,
 }
 ARRAY_TYPES = {
     8: "b",
     16: "h",
+    24: "i",  # 24-bit samples are unpacked into 32-bit integers
     32: "i",
 }
 ARRAY_RANGES = {
     8: (-0x80, 0x7f),
     16: (-0x8000, 0x7fff),
+    24: (-0x800000, 0x7fffff),
     32: (-0x80000000, 0x7fffffff),
 }
 
@@ -139,6 +146,8 @@ def make_chunks(audio_segment, chunk_length):
     long.
     if chunk_length is 50 then you'll get a list of 50 millisecond long audio
     segments back (except the last one, which can be shorter)
+
+    The chunks are views sharing audio_segment's data, so no audio is copied.
     """
     number_of_chunks = ceil(len(audio_segment) / float(chunk_length))
     return [audio_segment[i * chunk_length:(i + 1) * chunk_length]
@@ -248,19 +257,219 @@ def get_extra_info(stderr):
     return extra_info
 
 
+class ProbeCache(object):
+    """
+    Cache for prober (ffprobe/avprobe) results, shared by mediainfo,
+    mediainfo_json and AudioSegment.from_file.
+
+    Files are keyed by (real path, size, mtime), so an entry goes stale as
+    soon as the file changes. File objects are keyed by a hash of their
+    content (only when they are seekable, since it has to be read first).
+
+    Results are kept in an in-process LRU of maxsize entries and, when path
+    is given, in an SQLite database there, which survives restarts and can
+    be shared between processes:
+
+        utils.probe_cache = utils.ProbeCache(path="probe-cache.sqlite")
+
+    hits and misses count the lookups.
+    """
+
+    def __init__(self, maxsize=1024, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def key(self, kind, source):
+        """
+        Returns the cache key of source (a path or file object) for results
+        of the given kind, or None if source can't be cached
+        """
+        try:
+            path = os.path.realpath(fsdecode(source))
+        except TypeError:
+            path = None
+
+        if path is not None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            identity = [path, st.st_size, st.st_mtime_ns]
+        else:
+            try:
+                if not source.seekable():
+                    return None
+                start = source.tell()
+                source.seek(0)
+                digest = hashlib.sha1()
+                for chunk in iter(lambda: source.read(1 << 20), b''):
+                    digest.update(chunk)
+                source.seek(start)
+            except (AttributeError, OSError, ValueError):
+                return None
+            identity = ['sha1', digest.hexdigest()]
+
+        return json.dumps([kind, get_prober_name()] + identity)
+
+    def _connect(self):
+        if self._db is None:
+            import sqlite3
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS probe (key TEXT PRIMARY KEY, value TEXT)")
+            self._db.commit()
+        return self._db
+
+    def get(self, key):
+        """
+        Returns the result cached for key, or None
+        """
+        if key is None:
+            return None
+
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            elif self.path is not None:
+                row = self._connect().execute(
+                    "SELECT value FROM probe WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = row[0]
+                    self._remember(key, value)
+
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # every caller gets its own copy to modify
+        return json.loads(value)
+
+    def set(self, key, result):
+        """
+        Caches result (anything json can encode) under key
+        """
+        if key is None or result is None:
+            return
+
+        value = json.dumps(result)
+        with self._lock:
+            self._remember(key, value)
+            if self.path is not None:
+                db = self._connect()
+                db.execute("INSERT OR REPLACE INTO probe (key, value) VALUES (?, ?)", (key, value))
+                db.commit()
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Forgets all cached results (including the ones on disk) and resets
+        the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+            if self.path is not None:
+                db = self._connect()
+                db.execute("DELETE FROM probe")
+                db.commit()
+
+
+# the cache used by mediainfo and mediainfo_json, None disables caching
+probe_cache = ProbeCache()
+
+
+def _drain_in_thread(stream, keep=None, write=None):
+    """
+    Reads stream until EOF in a daemon thread, so that a subprocess never
+    stalls on a full pipe. Returns (thread, chunks), chunks being a deque
+    holding the last keep chunks read (all of them when keep is None).
+
+    When write is given every chunk is passed to it instead of being kept.
+    If write fails the rest of the stream is discarded and the exception is
+    stored on thread.error.
+    """
+    chunks = deque(maxlen=keep)
+    read = getattr(stream, 'read1', stream.read)
+
+    def drain():
+        for chunk in iter(lambda: read(1 << 16), b''):
+            if write is None:
+                chunks.append(chunk)
+            elif thread.error is None:
+                try:
+                    write(chunk)
+                except Exception as e:
+                    thread.error = e
+
+    thread = threading.Thread(target=drain)
+    thread.daemon = True
+    thread.error = None
+    thread.start()
+    return thread, chunks
+
+
+def _feed_in_thread(stream, source, block_size=1 << 20):
+    """
+    Copies the file-like source into stream in a daemon thread and closes
+    stream when done (or when the reading end goes away).
+    """
+    def feed():
+        try:
+            for chunk in iter(lambda: source.read(block_size), b''):
+                stream.write(chunk)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            try:
+                stream.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    thread = threading.Thread(target=feed)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
 def mediainfo_json(filepath, read_ahead_limit=-1):
     """Return json dictionary with media info(codec, duration, size, bitrate...) from filepath
+
+    Results are cached in probe_cache.
     """
+    cache = probe_cache
+    cache_key = cache.key('mediainfo_json', filepath) if cache is not None else None
+    info = cache.get(cache_key) if cache is not None else None
+    if info is not None:
+        return info
+
+    info = _probe_json(filepath, read_ahead_limit)
+    if cache is not None and info:
+        cache.set(cache_key, info)
+    return info
+
+
+def _probe_json(filepath, read_ahead_limit=-1):
     prober = get_prober_name()
     command_args = [
         "-v", "info",
         "-show_format",
         "-show_streams",
     ]
+    file = None
     try:
         command_args += [fsdecode(filepath)]
         stdin_parameter = None
-        stdin_data = None
     except TypeError:
         if prober == 'ffprobe':
             command_args += ["-read_ahead_limit", str(read_ahead_limit),
@@ -270,15 +479,21 @@ def mediainfo_json(filepath, read_ahead_limit=-1):
         stdin_parameter = PIPE
         file, close_file = _fd_or_path_or_tempfile(filepath, 'rb', tempfile=False)
         file.seek(0)
-        stdin_data = file.read()
-        if close_file:
-            file.close()
 
     command = [prober, '-of', 'json'] + command_args
     res = Popen(command, stdin=stdin_parameter, stdout=PIPE, stderr=PIPE)
-    output, stderr = res.communicate(input=stdin_data)
-    output = output.decode("utf-8", 'ignore')
-    stderr = stderr.decode("utf-8", 'ignore')
+    stdout_thread, output = _drain_in_thread(res.stdout)
+    stderr_thread, stderr = _drain_in_thread(res.stderr)
+    if file is not None:
+        # stream the file to the prober rather than reading it into memory
+        _feed_in_thread(res.stdin, file).join()
+        if close_file:
+            file.close()
+    res.wait()
+    stdout_thread.join()
+    stderr_thread.join()
+    output = b''.join(output).decode("utf-8", 'ignore')
+    stderr = b''.join(stderr).decode("utf-8", 'ignore')
 
     try:
         info = json.loads(output)
@@ -326,8 +541,22 @@ def mediainfo_json(filepath, read_ahead_limit=-1):
 
 def mediainfo(filepath):
     """Return dictionary with media info(codec, duration, size, bitrate...) from filepath
+
+    Results are cached in probe_cache.
     """
+    cache = probe_cache
+    cache_key = cache.key('mediainfo', filepath) if cache is not None else None
+    info = cache.get(cache_key) if cache is not None else None
+    if info is not None:
+        return info
 
+    info = _probe(filepath)
+    if cache is not None and info:
+        cache.set(cache_key, info)
+    return info
+
+
+def _probe(filepath):
     prober = get_prober_name()
     command_args = [
         "-v", "quiet",
@@ -426,15 +655,11 @@ def stereo_to_ms(audio_segment):
 	'''
 	Left-Right -> Mid-Side
 	'''
-	channel = audio_segment.split_to_mono()
-	channel = [channel[0].overlay(channel[1]), channel[0].overlay(channel[1].invert_phase())]
-	return AudioSegment.from_mono_audiosegments(channel[0], channel[1])
+	return audio_segment.remix([[1, 1], [1, -1]])
 
 def ms_to_stereo(audio_segment):
 	'''
 	Mid-Side -> Left-Right
 	'''
-	channel = audio_segment.split_to_mono()
-	channel = [channel[0].overlay(channel[1]) - 3, channel[0].overlay(channel[1].invert_phase()) - 3]
-	return AudioSegment.from_mono_audiosegments(channel[0], channel[1])
-
+	gain = db_to_float(-3)
+	return audio_segment.remix([[gain, gain], [gain, -gain]])
@@ -0,0 +1,781 @@
+"""Tests for AudioSegment core behaviors"""
+
+import io
+import mmap
+import pickle
+import struct
+import wave
+
+import numpy as np
+import pytest
+
+from pydub_plus.core import AudioEncoderSink, AudioSegment, audio_segment, encoder
+from pydub_plus.core.exceptions import CouldntEncodeError, InvalidID3TagVersion, InvalidTag
+from pydub_plus.core.pcm_io import iter_blocks, read_into_buffer, read_wav_header, write_buffers, write_wav
+from pydub_plus.core.sample_ops import overlay_into
+from pydub_plus.core.utils import audioop, db_to_float, make_chunks, ms_to_stereo, stereo_to_ms, which
+
+
+def make_segment(duration_ms=1000, frame_rate=8000, channels=2, sample_width=2, seed=0):
+    """Random (noise) audio with the given parameters"""
+    rng = np.random.default_rng(seed)
+    frames = int(frame_rate * duration_ms / 1000)
+    bits = 8 * sample_width
+    samples = rng.integers(-(1 << (bits - 1)), 1 << (bits - 1), size=frames * channels)
+    dtype = {1: "i1", 2: "<i2", 4: "<i4"}[sample_width]
+    return AudioSegment(
+        samples.astype(dtype).tobytes(),
+        sample_width=sample_width,
+        frame_rate=frame_rate,
+        channels=channels,
+    )
+
+
+def test_slices_share_the_parent_buffer():
+    seg = make_segment()
+    part = seg[100:200]
+
+    assert isinstance(part._data, memoryview)
+    assert part._data.obj is seg._data
+    assert part[10:20]._data.obj is seg._data
+    assert seg.get_sample_slice(5, 10)._data.obj is seg._data
+    assert all(chunk._data.obj is seg._data for chunk in make_chunks(seg, 10))
+
+
+def test_slices_match_copied_data():
+    seg = make_segment()
+    raw = seg.raw_data
+    part = seg[100:200]
+
+    assert part.raw_data == raw[100 * 8 * 4:200 * 8 * 4]
+    assert isinstance(part.raw_data, bytes)
+    # reading raw_data doesn't detach the view
+    assert part._data.obj is seg._data
+    assert seg.get_frame(3) == raw[12:16]
+    assert type(seg.get_frame(0)) is bytes
+    assert type(part.get_frame(0)) is bytes
+    assert sum(make_chunks(seg, 10)) == seg
+
+
+def test_views_can_be_pickled():
+    seg = make_segment()[250:500]
+    restored = pickle.loads(pickle.dumps(seg))
+
+    assert restored == seg
+    assert restored.frame_rate == seg.frame_rate
+    assert hash(restored) == hash(seg)
+
+
+def test_segment_from_memoryview():
+    seg = make_segment()
+    view = memoryview(bytearray(seg.raw_data))
+    copy = AudioSegment(view, sample_width=2, frame_rate=8000, channels=2)
+
+    assert copy._data.readonly
+    assert copy == seg
+
+
+def test_fade_is_sample_accurate():
+    seg = AudioSegment(b"\xff\x3f" * 8000, sample_width=2, frame_rate=8000, channels=1)
+    faded = np.frombuffer(seg.fade_out(500).raw_data, dtype="<i2")
+
+    assert len(faded) == 8000
+    assert (faded[:4000] == 0x3fff).all()
+    # one gain step per sample, not per millisecond
+    assert (np.diff(faded[4000:]) < 0).all()
+
+
+@pytest.mark.parametrize("curve", ["linear", "exponential", "db", "equal_power", "s_curve",
+                                   lambda t: t ** 3])
+def test_fade_curves(curve):
+    seg = AudioSegment(b"\xff\x3f" * 8000, sample_width=2, frame_rate=8000, channels=1)
+    faded = np.frombuffer(seg.fade_in(1000, curve=curve).raw_data, dtype="<i2")
+
+    assert len(faded) == 8000
+    assert faded[0] == 0
+    assert (np.diff(faded.astype(int)) >= 0).all()
+    assert faded[-1] > 0x3f00
+
+
+@pytest.mark.parametrize("curve", ["linear", "exponential", "db", "equal_power", "s_curve"])
+def test_fade_from_and_to_silence(curve):
+    seg = AudioSegment(b"\xff\x3f" * 8000, sample_width=2, frame_rate=8000, channels=1)
+    faded_in = np.frombuffer(seg.fade(from_gain=-float("inf"), start=0, end=500, curve=curve).raw_data,
+                             dtype="<i2")
+    faded_out = np.frombuffer(seg.fade(to_gain=-float("inf"), start=500, end=1000, curve=curve).raw_data,
+                              dtype="<i2")
+
+    assert faded_in[0] == 0 and faded_out[-1] < 0x3fff // 100
+    assert (np.diff(faded_in[:4000].astype(int)) >= 0).all()
+    assert (np.diff(faded_out[4000:].astype(int)) <= 0).all()
+    assert (faded_in[4000:] == 0x3fff).all() and (faded_out[:4000] == 0x3fff).all()
+
+
+def test_fade_rejects_unknown_curve():
+    seg = make_segment()
+    with pytest.raises(ValueError):
+        seg.fade_in(100, curve="wobble")
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+def test_overlay_loop_matches_sample_sums(sample_width):
+    base = make_segment(1000, channels=1, sample_width=sample_width, seed=1) - 12
+    jingle = make_segment(33, channels=1, sample_width=sample_width, seed=2) - 12
+    mixed = base.overlay(jingle, loop=True)
+
+    dtype = {1: "i1", 2: "<i2", 4: "<i4"}[sample_width]
+    base_samples = np.frombuffer(base.raw_data, dtype=dtype).astype(np.int64)
+    tiled = np.resize(np.frombuffer(jingle.raw_data, dtype=dtype), len(base_samples))
+    info = np.iinfo(dtype)
+    expected = np.clip(base_samples + tiled, info.min, info.max)
+
+    assert len(mixed.raw_data) == len(base.raw_data)
+    assert (np.frombuffer(mixed.raw_data, dtype=dtype) == expected).all()
+
+
+def test_overlay_times_and_gain():
+    base = AudioSegment(b"\x00\x10" * 1000, sample_width=2, frame_rate=1000, channels=1)
+    blip = AudioSegment(b"\x01\x00" * 100, sample_width=2, frame_rate=1000, channels=1)
+    mixed = np.frombuffer(base.overlay(blip, position=50, times=3,
+                                       gain_during_overlay=-6).raw_data, dtype="<i2")
+    ducked = int(0x1000 * db_to_float(-6))
+
+    assert len(mixed) == 1000
+    assert (mixed[:50] == 0x1000).all()
+    assert (mixed[50:350] == ducked + 1).all()
+    assert (mixed[350:] == 0x1000).all()
+
+
+def test_overlay_into_24_bit():
+    base = b"".join(v.to_bytes(3, "little", signed=True) for v in [-5, 7, 0x7fffff, -0x800000] * 5)
+    other = b"".join(v.to_bytes(3, "little", signed=True) for v in [1, -1, 1, -1])
+    out = bytearray(len(base))
+    overlay_into(out, base, other, 3, times=2)
+
+    expected = [-4, 6, 0x7fffff, -0x800000] * 2
+    assert bytes(out[:24]) == b"".join(v.to_bytes(3, "little", signed=True) for v in expected)
+    assert bytes(out[24:]) == base[24:]
+
+
+def test_concatenate_matches_append():
+    pieces = [make_segment(ms, seed=i) for i, ms in enumerate([300, 60, 1000, 77, 120])]
+
+    for crossfade in [0, 30, 12.5]:
+        expected = pieces[0]
+        for piece in pieces[1:]:
+            expected = expected.append(piece, crossfade=crossfade)
+        assert AudioSegment.concatenate(pieces, crossfade=crossfade) == expected
+
+
+def test_concatenate_syncs_formats():
+    stereo = make_segment(100)
+    mono = make_segment(100, frame_rate=16000, channels=1, sample_width=1)
+    joined = AudioSegment.concatenate([stereo, mono])
+
+    assert (joined.channels, joined.frame_rate, joined.sample_width) == (2, 16000, 2)
+    assert len(joined) == 200
+
+
+def test_concatenate_rejects_long_crossfade():
+    with pytest.raises(ValueError):
+        AudioSegment.concatenate([make_segment(100), make_segment(20)], crossfade=50)
+    assert len(AudioSegment.concatenate([])) == 0
+
+
+def test_addition_chains_share_a_buffer():
+    pieces = [make_segment(10, seed=i) for i in range(50)]
+    raw = [piece.raw_data for piece in pieces]
+
+    a = pieces[0] + pieces[1] + pieces[2]
+    b = a + pieces[3]
+    assert b._data.obj is a._data.obj
+
+    # adding to the middle of a chain must not clobber the later links
+    c = a + pieces[4]
+    assert c._data.obj is not a._data.obj
+    assert b.raw_data == b"".join(raw[:4])
+    assert c.raw_data == b"".join(raw[:3] + raw[4:5])
+
+    assert sum(pieces).raw_data == b"".join(raw)
+
+
+def assert_hashes_like_bytes(seg):
+    """seg hashes (and finds itself in sets) like a bytes-backed copy"""
+    copy = AudioSegment(seg.raw_data, sample_width=seg.sample_width,
+                        frame_rate=seg.frame_rate, channels=seg.channels)
+    assert hash(seg) == hash(copy)
+    assert seg in {copy}
+    assert {seg: 1}[copy] == 1
+
+
+def test_segments_are_hashable(tmp_path):
+    pieces = [make_segment(10, seed=i) for i in range(5)]
+    a = pieces[0]
+
+    assert_hashes_like_bytes(a)
+    assert_hashes_like_bytes(a[2:7])
+    assert_hashes_like_bytes(a + a)
+    assert_hashes_like_bytes(a + a + a)
+    assert_hashes_like_bytes(sum(pieces))
+    assert_hashes_like_bytes(AudioSegment.concatenate(pieces, crossfade=2))
+    assert_hashes_like_bytes(a.overlay(pieces[1], position=3))
+    assert_hashes_like_bytes(a.overlay(pieces[1][:2], loop=True))
+
+    # every kind of buffer a segment can be decoded, mapped or split into
+    path = tmp_path / "noise.raw"
+    path.write_bytes(a.raw_data)
+    with open(str(path), "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buffers = [
+        bytearray(a.raw_data),
+        memoryview(bytearray(a.raw_data)),
+        memoryview(mapped),
+        memoryview(np.frombuffer(a.raw_data, "<i2").copy()),
+    ]
+    for data in buffers:
+        assert_hashes_like_bytes(AudioSegment(data, sample_width=2, frame_rate=8000, channels=2))
+
+
+def test_iter_file_wav_blocks(tmp_path):
+    seg = make_segment(2000, frame_rate=8000)
+    path = str(tmp_path / "noise.wav")
+    seg.export(path, format="wav")
+
+    blocks = list(AudioSegment.iter_file(path, block_ms=300))
+    assert [len(block) for block in blocks] == [300] * 6 + [200]
+    assert sum(blocks) == seg
+
+    part = sum(AudioSegment.iter_file(path, block_ms=300, start_second=0.25, duration=1.1))
+    assert part == AudioSegment.from_file(path, start_second=0.25, duration=1.1)
+
+
+def test_iter_file_raw_and_8_bit(tmp_path):
+    seg = make_segment(1000, sample_width=1)
+    raw_path = str(tmp_path / "noise.raw")
+    with open(raw_path, "wb") as f:
+        f.write(seg.raw_data)
+    wav_path = str(tmp_path / "noise.wav")
+    seg.export(wav_path, format="wav")
+
+    assert sum(AudioSegment.iter_file(raw_path, block_ms=70, sample_width=1,
+                                      frame_rate=8000, channels=2)) == seg
+    assert sum(AudioSegment.iter_file(wav_path, block_ms=70)) == seg
+
+
+def test_read_wav_header_from_pipe():
+    seg = make_segment(100)
+    wav = io.BytesIO()
+    seg.export(wav, format="wav")
+    data = bytearray(wav.getvalue())
+    # what ffmpeg writes when it can't seek back to fill in the sizes
+    data[4:8] = data[40:44] = b"\xff\xff\xff\xff"
+
+    stream = io.BufferedReader(io.BytesIO(bytes(data)))
+    info = read_wav_header(stream)
+    assert (info.channels, info.sample_rate, info.bits_per_sample) == (2, 8000, 16)
+    assert info.data_size is None
+    assert b"".join(iter_blocks(stream, 1000)) == seg.raw_data
+
+
+needs_ffmpeg = pytest.mark.skipif(which("ffmpeg") is None, reason="ffmpeg is not installed")
+
+
+@needs_ffmpeg
+def test_encoder_sink_streams_blocks(tmp_path):
+    seg = make_segment(2000)
+    out = io.BytesIO()
+    with AudioEncoderSink(out, format="wav") as sink:
+        for block in make_chunks(seg, 300):
+            sink.write(block)
+
+    assert AudioSegment(out.getvalue()) == seg
+
+    path = str(tmp_path / "noise.flac")
+    with AudioEncoderSink(path, format="flac") as sink:
+        sink.write(seg)
+    assert AudioSegment.from_file(path, codec="flac") == seg
+
+
+@needs_ffmpeg
+def test_encoder_sink_reports_errors():
+    with pytest.raises(CouldntEncodeError):
+        with AudioEncoderSink(io.BytesIO(), format="no-such-format") as sink:
+            sink.write(make_segment(100))
+
+
+@needs_ffmpeg
+def test_export_pipes_without_temporary_files(monkeypatch):
+    def no_temporary_files(*args, **kwargs):
+        raise AssertionError("export should not need a temporary file")
+
+    monkeypatch.setattr(encoder, "NamedTemporaryFile", no_temporary_files)
+    seg = make_segment(1000)
+    out = seg.export(format="s16le")
+    assert out.read() == seg.raw_data
+    assert len(seg.export(format="ogg").read())
+
+
+@needs_ffmpeg
+def test_export_seekable_formats(tmp_path):
+    seg = make_segment(1000)
+    path = str(tmp_path / "noise.wav")
+    seg.export(path, format="wav", codec="pcm_s32le")
+
+    # the header was filled in after encoding
+    with open(path, "rb") as f:
+        assert read_wav_header(f).data_size == 8000 * 2 * 4
+
+    # headers written on a seek back are the same for file objects
+    for format in ["mp3", "flac"]:
+        path = str(tmp_path / ("noise." + format))
+        seg.export(path, format=format)
+        with open(path, "rb") as f:
+            assert seg.export(format=format).read() == f.read(), format
+
+
+def test_needs_seekable_output():
+    for format in ["ogg", "opus", "adts", "s16le"]:
+        assert not encoder.needs_seekable_output(format), format
+    for format in ["mp4", "m4a", "mov", "ipod", "caf", "wav", "w64", "aiff", "flac", "matroska",
+                   "webm", "mp3"]:
+        assert encoder.needs_seekable_output(format), format
+    assert encoder.needs_seekable_output("ogg", ["-movflags", "+faststart"])
+
+    # only file objects go through a temporary file, and only for those formats
+    assert AudioEncoderSink(io.BytesIO())._seekable_output
+    assert not AudioEncoderSink(io.BytesIO(), format="ogg")._seekable_output
+
+
+def test_encoder_arguments():
+    assert encoder.encoder_arguments("mp3", "libmp3lame", "192k", ["-q:a", "2"]) == \
+        ["-acodec", "libmp3lame", "-b:a", "192k", "-q:a", "2"]
+    assert encoder.encoder_arguments("mp3", tags={"title": "x"}, id3v2_version="3") == \
+        ["-metadata", "title=x", "-id3v2_version", "3"]
+    assert encoder.encoder_arguments("ogg", tags={"title": "x"}) == ["-metadata", "title=x"]
+    with pytest.raises(InvalidTag):
+        encoder.encoder_arguments("mp3", tags=["title"])
+    with pytest.raises(InvalidID3TagVersion):
+        encoder.encoder_arguments("mp3", tags={"title": "x"}, id3v2_version="1")
+
+
+def test_read_into_buffer():
+    data = bytes(range(256)) * 1000
+    for size_hint in [0, 100, len(data), 10 * len(data)]:
+        stream = io.BufferedReader(io.BytesIO(data))
+        assert read_into_buffer(stream, size_hint, min_growth=1000) == data
+
+
+@needs_ffmpeg
+def test_from_file_decodes_raw_pcm(tmp_path, monkeypatch):
+    seg = make_segment(2000)
+    path = str(tmp_path / "noise.flac")
+    seg.export(path, format="flac")
+
+    probe = {
+        "streams": [{"index": 0, "codec_type": "audio", "codec_name": "flac", "sample_fmt": "s16",
+                     "bits_per_sample": 16, "sample_rate": "8000", "channels": 2, "duration": "2.0"}],
+        "format": {"duration": "2.0"},
+    }
+    monkeypatch.setattr(audio_segment, "mediainfo_json", lambda *args, **kwargs: probe)
+    commands = []
+    monkeypatch.setattr(audio_segment, "log_conversion", commands.append)
+
+    assert AudioSegment.from_file(path) == seg
+    assert "s16le" in commands[-1]
+    assert AudioSegment.from_file(path, start_second=0.5, duration=1) == seg[500:1500]
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+def test_from_file_excerpts_read_only_the_range(tmp_path, sample_width):
+    seg = make_segment(3001, sample_width=sample_width)
+    wav_path = str(tmp_path / "noise.wav")
+    seg.export(wav_path, format="wav")
+    raw_path = str(tmp_path / "noise.raw")
+    with open(raw_path, "wb") as f:
+        f.write(seg.raw_data)
+
+    for start_second, duration in [(1.2345, None), (None, 0.7777), (2.5, 1), (3.5, 1), (0.0001, 0.0017)]:
+        end = None if duration is None else ((start_second or 0) + duration) * 1000
+        expected = seg[(start_second or 0) * 1000:end]
+
+        assert AudioSegment.from_file(wav_path, start_second=start_second, duration=duration) == expected
+        assert AudioSegment.from_file(raw_path, format="raw", sample_width=sample_width, frame_rate=8000,
+                                      channels=2, start_second=start_second, duration=duration) == expected
+
+
+def test_seek_arguments():
+    assert audio_segment._seek_arguments(None) == ([], [])
+    assert audio_segment._seek_arguments(0.5) == ([], ["-ss", "0.5"])
+    assert audio_segment._seek_arguments(90) == (["-ss", "89.0"], ["-ss", "1.0"])
+
+
+def to_rf64(wav_bytes):
+    """Rewrites a plain wav file as RF64, sizes in a ds64 chunk"""
+    info = read_wav_header(io.BytesIO(wav_bytes))
+    data = wav_bytes[-info.data_size:]
+    fmt = wav_bytes[12:len(wav_bytes) - info.data_size - 8]
+    ds64 = b"ds64" + struct.pack("<IQQQI", 28, 0, info.data_size, 0, 0)
+    return b"RF64\xff\xff\xff\xffWAVE" + ds64 + fmt + b"data\xff\xff\xff\xff" + data
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+def test_from_file_mmap(tmp_path, sample_width):
+    seg = make_segment(3001, sample_width=sample_width)
+    wav_path = str(tmp_path / "noise.wav")
+    seg.export(wav_path, format="wav")
+    raw_path = str(tmp_path / "noise.raw")
+    with open(raw_path, "wb") as f:
+        f.write(seg.raw_data)
+
+    wav = AudioSegment.from_file(wav_path, mmap=True)
+    raw = AudioSegment.from_raw(raw_path, sample_width=sample_width, frame_rate=8000, channels=2, mmap=True)
+    assert wav == raw == seg
+    assert (wav.rms, wav.max) == (seg.rms, seg.max)
+    if sample_width != 1:
+        # 8-bit wav is unsigned, so it's converted rather than mapped
+        assert isinstance(wav._data.obj, mmap.mmap)
+        assert wav[100:200]._data.obj is wav._data.obj
+    assert isinstance(raw._data.obj, mmap.mmap)
+
+    for start_second, duration in [(1.2345, None), (None, 0.7777), (2.5, 1), (3.5, 1)]:
+        end = None if duration is None else ((start_second or 0) + duration) * 1000
+        expected = seg[(start_second or 0) * 1000:end]
+
+        assert AudioSegment.from_file(wav_path, start_second=start_second, duration=duration,
+                                      mmap=True) == expected
+        assert AudioSegment.from_file(raw_path, format="raw", sample_width=sample_width, frame_rate=8000,
+                                      channels=2, start_second=start_second, duration=duration,
+                                      mmap=True) == expected
+
+    out = io.BytesIO()
+    wav[1000:2000].export(out, format="wav")
+    assert AudioSegment.from_wav(io.BytesIO(out.getvalue())) == seg[1000:2000]
+
+
+def test_from_file_mmap_rf64(tmp_path):
+    seg = make_segment(1000)
+    out = io.BytesIO()
+    seg.export(out, format="wav")
+    rf64 = to_rf64(out.getvalue())
+
+    info = read_wav_header(io.BytesIO(rf64))
+    assert info.data_size == len(seg.raw_data)
+
+    path = str(tmp_path / "noise.rf64")
+    with open(path, "wb") as f:
+        f.write(rf64)
+    assert AudioSegment.from_file(path, format="wav", mmap=True) == seg
+    assert AudioSegment.from_file(path, format="wav", start_second=0.5) == seg[500:]
+
+
+def wav_file(fmt_tag, bits, channels, rate, data, extra_chunks=b""):
+    fmt = struct.pack("<HHIIHH", fmt_tag, channels, rate, rate * channels * bits // 8,
+                      channels * bits // 8, bits)
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + extra_chunks
+    body += b"data" + struct.pack("<I", len(data)) + data
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def aiff_file(compression, bits, channels, rate, data):
+    # 80-bit extended sample rate
+    exponent = rate.bit_length() - 1
+    rate_bytes = struct.pack(">HQ", 16383 + exponent, rate << (63 - exponent))
+    comm = struct.pack(">hIh", channels, len(data) // (channels * bits // 8), bits) + rate_bytes
+    if compression is not None:
+        comm += compression + b"\x00\x00"
+    ssnd = struct.pack(">II", 0, 0) + data
+    body = (b"AIFC" if compression else b"AIFF") + b"COMM" + struct.pack(">I", len(comm)) + comm
+    body += b"SSND" + struct.pack(">I", len(ssnd)) + ssnd
+    return b"FORM" + struct.pack(">I", len(body)) + body
+
+
+def w64_file(wav_bytes):
+    tail = b"\xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a"
+    info = read_wav_header(io.BytesIO(wav_bytes))
+    data = wav_bytes[-info.data_size:]
+    fmt = wav_bytes[20:36]
+    chunks = b"fmt " + tail + struct.pack("<Q", 24 + len(fmt)) + fmt
+    chunks += b"data" + tail + struct.pack("<Q", 24 + len(data)) + data
+    return (b"riff\x2e\x91\xcf\x11\xa5\xd6\x28\xdb\x04\xc1\x00\x00" + struct.pack("<Q", 40 + len(chunks))
+            + b"wave" + tail + chunks)
+
+
+def test_native_readers(tmp_path, monkeypatch):
+    seg = make_segment(500)
+    samples = np.frombuffer(seg.raw_data, "<i2")
+    floats = (samples / 32768.0).astype("<f4")
+    as_int32 = samples.astype("<i4") << 16
+
+    # nothing may be handed to ffmpeg
+    monkeypatch.setattr(AudioSegment, "converter", "no-such-ffmpeg")
+
+    cases = [
+        ("a.wav", wav_file(1, 16, 2, 8000, seg.raw_data, b"junk\x02\x00\x00\x00ab" * 12), seg.raw_data),
+        ("f32.wav", wav_file(3, 32, 2, 8000, floats.tobytes()), as_int32.tobytes()),
+        ("f64.wav", wav_file(3, 64, 2, 8000, floats.astype("<f8").tobytes()), as_int32.tobytes()),
+        ("a.w64", w64_file(wav_file(1, 16, 2, 8000, seg.raw_data)), seg.raw_data),
+        ("a.aiff", aiff_file(None, 16, 2, 8000, samples.astype(">i2").tobytes()), seg.raw_data),
+        ("sowt.aifc", aiff_file(b"sowt", 16, 2, 8000, seg.raw_data), seg.raw_data),
+        ("fl32.aifc", aiff_file(b"fl32", 32, 2, 8000, floats.astype(">f4").tobytes()), as_int32.tobytes()),
+    ]
+    for name, contents, expected in cases:
+        path = str(tmp_path / name)
+        with open(path, "wb") as f:
+            f.write(contents)
+
+        loaded = AudioSegment.from_file(path)
+        assert (loaded.frame_rate, loaded.channels) == (8000, 2), name
+        assert loaded.raw_data == expected, name
+        assert AudioSegment.from_file(path, start_second=0.1, duration=0.2) == loaded[100:300], name
+        assert b"".join(b.raw_data for b in AudioSegment.iter_file(path, block_ms=70)) == expected, name
+        assert AudioSegment.from_file(path, mmap=True) == loaded, name
+
+
+def test_float_samples_saturate():
+    floats = np.array([0.0, 0.25, -1.0, 1.0, 3.0, -3.0], dtype="<f4")
+    seg = AudioSegment(wav_file(3, 32, 1, 8000, floats.tobytes()))
+    assert seg.get_array_of_samples().tolist() == [0, 1 << 29, -(1 << 31), (1 << 31) - 1,
+                                                   (1 << 31) - 1, -(1 << 31)]
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+def test_wav_export_matches_wave_module(tmp_path, sample_width):
+    seg = make_segment(1001, sample_width=sample_width, channels=1)
+    expected = io.BytesIO()
+    with wave.open(expected, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(sample_width)
+        w.setframerate(8000)
+        w.writeframes(seg.raw_data if sample_width != 1
+                      else bytes((b + 128) & 0xFF for b in seg.raw_data))
+
+    assert seg.export(io.BytesIO(), format="wav").getvalue() == expected.getvalue()
+    path = str(tmp_path / "out.wav")
+    seg.export(path, format="wav").close()
+    with open(path, "rb") as f:
+        assert f.read() == expected.getvalue()
+
+
+def test_write_wav_rf64(tmp_path):
+    seg = make_segment(1000)
+    path = str(tmp_path / "big.wav")
+    with open(path, "wb") as f:
+        write_wav(f, seg.raw_data, 2, 8000, 2, rf64=True)
+
+    with open(path, "rb") as f:
+        assert f.read(4) == b"RF64"
+        f.seek(0)
+        assert read_wav_header(f).data_size == len(seg.raw_data)
+    assert AudioSegment.from_file(path) == seg
+    assert AudioSegment.from_file(path, mmap=True) == seg
+
+
+def test_write_buffers_keeps_the_file_position(tmp_path):
+    with open(str(tmp_path / "out"), "w+b") as f:
+        f.write(b"x")
+        write_buffers(f, [b"ab", bytearray(b""), memoryview(b"cdef")[1:]])
+        f.write(b"!")
+        f.seek(0)
+        assert f.read() == b"xabdef!"
+
+
+def test_24_bit_is_widened_with_the_sign_in_the_low_byte():
+    packed = b"\x01\x02\x03" + b"\x01\x02\x83" + b"\xff\xff\xff"
+    seg = AudioSegment(packed, sample_width=3, frame_rate=8000, channels=1)
+    assert seg.sample_width == 4
+    assert seg.raw_data == b"\x00\x01\x02\x03" + b"\xff\x01\x02\x83" + b"\xff\xff\xff\xff"
+
+
+def test_keep_24bit(tmp_path):
+    samples = np.arange(-4000, 4000, dtype=np.int32) * 1000
+    packed = samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    seg = AudioSegment(packed, sample_width=3, frame_rate=8000, channels=2, keep_24bit=True)
+
+    assert (seg.sample_width, seg.frame_width) == (3, 6)
+    assert seg.get_array_of_samples().tolist() == samples.tolist()
+    assert seg.max == 4000000
+
+    for result in [seg[100:200], seg.apply_gain(-6), seg + seg, seg.overlay(seg[:100]),
+                   seg.fade_in(100), seg.set_channels(1), seg.split_to_mono()[1],
+                   AudioSegment.from_mono_audiosegments(*seg.split_to_mono()),
+                   seg.overlay(AudioSegment.silent(100, 8000))]:
+        assert result.sample_width == 3
+    assert AudioSegment.from_mono_audiosegments(*seg.split_to_mono()) == seg
+    assert seg.invert_phase().get_array_of_samples()[-1] == -samples[-1]
+
+    path = str(tmp_path / "packed.wav")
+    seg.export(path, format="wav")
+    assert AudioSegment.from_file(path, keep_24bit=True) == seg
+    assert AudioSegment.from_file(path, start_second=0.1, keep_24bit=True) == seg[100:]
+    assert AudioSegment.from_file(path, mmap=True, keep_24bit=True) == seg
+    assert b"".join(b.raw_data for b in AudioSegment.iter_file(path, keep_24bit=True)) == packed
+    assert AudioSegment.from_file(path) == AudioSegment(packed, sample_width=3, frame_rate=8000, channels=2)
+
+
+def test_float32_sample_format_keeps_headroom(tmp_path):
+    seg = make_segment(500, frame_rate=8000, channels=2, sample_width=2, seed=3)
+    floats = seg.set_sample_format("float32")
+
+    assert (floats.sample_format, floats.sample_width, floats.pcm_sample_width) == ("float32", 4, 2)
+    assert floats.max_possible_amplitude == 1.0
+    assert floats.max == pytest.approx(seg.max / 32768.0)
+    assert floats.set_sample_format("int") == seg
+
+    # +20 dB clips integers but not floats
+    louder = floats.apply_gain(20)
+    assert louder.max > 1
+    assert louder.apply_gain(-20).set_sample_format("int") == seg
+    assert seg.apply_gain(20).apply_gain(-20) != seg
+
+    # the operations stay in float32, the export converts once
+    for result in [louder.overlay(louder, position=100), louder.fade_in(100), louder + louder,
+                   louder.append(louder, crossfade=50), louder.set_frame_rate(11025),
+                   louder.set_channels(1), louder.set_channels(1).set_channels(2),
+                   louder.low_pass_filter(1000), louder.high_pass_filter(300), louder.pan(0.5),
+                   louder.overlay(seg)]:
+        assert result.sample_format == "float32"
+        assert result.max > 1
+
+    path = str(tmp_path / "float.wav")
+    louder.apply_gain(-20).export(path, format="wav")
+    assert AudioSegment.from_file(path) == seg
+
+
+def test_float32_operations_match_integer_ones():
+    seg = make_segment(300, frame_rate=8000, channels=2, sample_width=2, seed=4).apply_gain(-6)
+    floats = seg.set_sample_format("float32")
+
+    for op in [lambda s: s.apply_gain(-3), lambda s: s.overlay(s[:100], position=50),
+               lambda s: s.fade_out(200), lambda s: s.set_frame_rate(16000),
+               lambda s: s.set_channels(1), lambda s: s.invert_phase()]:
+        expected = np.array(op(seg).get_array_of_samples())
+        actual = np.array(op(floats).set_sample_format("int").get_array_of_samples())
+        assert np.abs(actual - expected).max() <= 1
+
+
+def test_from_file_float32_keeps_float_samples():
+    samples = np.array([0.5, 2.0, -3.0, 0.25], dtype="<f4")
+    data = wav_file(3, 32, 1, 8000, samples.tobytes())
+
+    seg = AudioSegment.from_file(io.BytesIO(data), format="wav", sample_format="float32")
+    assert seg.get_array_of_samples().tolist() == samples.tolist()
+    assert AudioSegment.from_file(io.BytesIO(data), format="wav").max == 2 ** 31
+
+    with pytest.raises(ValueError):
+        AudioSegment(b"\0" * 4, sample_width=2, frame_rate=8000, channels=1, sample_format="float32")
+
+
+def test_remix():
+    seg = make_segment(200, frame_rate=8000, channels=2, sample_width=2, seed=5)
+    left, right = seg.split_to_mono()
+
+    assert seg.remix([[0.5, 0.5]]) == seg.set_channels(1)
+    assert seg.remix([[1, 0], [0, -1]]) == seg.invert_phase((0, 1))
+    assert seg.remix([[0, 1], [1, 0]]) == AudioSegment.from_mono_audiosegments(right, left)
+    assert seg.remix([[1, 0], [0, 1], [1, 0]]).channels == 3
+    assert left.remix([[1]] * 4) == AudioSegment.from_mono_audiosegments(*[left] * 4)
+
+    # audioop's saturation
+    loud = seg.remix([[4, 4]]).get_array_of_samples()
+    assert max(loud) == 32767 and min(loud) == -32768
+
+    with pytest.raises(ValueError):
+        seg.remix([[1, 0, 0]])
+    with pytest.raises(ValueError):
+        seg.remix([])
+
+
+def test_set_channels_multichannel():
+    frames = np.random.default_rng(6).integers(-20000, 20000, (800, 6))
+    seg = AudioSegment(frames.astype("<i2").tobytes(), sample_width=2, frame_rate=8000, channels=6)
+
+    mono = np.array(seg.set_channels(1).get_array_of_samples())
+    assert np.abs(mono - frames.mean(axis=1)).max() <= 1
+
+    # 5.1 to stereo, without the LFE
+    stereo = np.array(seg.set_channels(2).get_array_of_samples()).reshape(-1, 2)
+    side = 1 / np.sqrt(2)
+    expected = (frames[:, [0, 1]] + side * frames[:, [2, 2]] + side * frames[:, [4, 5]]) / (1 + 2 * side)
+    assert np.abs(stereo - expected).max() <= 1
+
+    with pytest.raises(ValueError):
+        seg.set_channels(4)
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 3, 4])
+def test_split_and_merge_channels(sample_width):
+    data = np.random.default_rng(7).integers(0, 256, 3 * sample_width * 1000, dtype=np.uint8).tobytes()
+    seg = AudioSegment(data, sample_width=sample_width, frame_rate=8000, channels=3, keep_24bit=True)
+    samples = np.array(seg.get_array_of_samples()).reshape(-1, 3)
+
+    mono = seg.split_to_mono()
+    for i, channel in enumerate(mono):
+        assert (channel.channels, channel.sample_width) == (1, sample_width)
+        assert channel.get_array_of_samples().tolist() == samples[:, i].tolist()
+    assert AudioSegment.from_mono_audiosegments(*mono) == seg
+
+    arrays = seg.get_channel_arrays()
+    assert [a.tolist() for a in arrays] == [samples[:, i].tolist() for i in range(3)]
+    with pytest.raises(ValueError):
+        arrays[0][0] = 0
+
+    inverted = seg.map_channels(lambda channel: channel.invert_phase(), channels=[1])
+    assert inverted.split_to_mono()[0] == mono[0]
+    assert inverted.split_to_mono()[1] == mono[1].invert_phase()
+
+
+def test_from_mono_audiosegments_pads_shorter_channels():
+    left = make_segment(100, frame_rate=8000, channels=1, seed=8)
+    right = make_segment(50, frame_rate=8000, channels=1, seed=9)
+    stereo = AudioSegment.from_mono_audiosegments(left, right)
+
+    assert len(stereo) == 100
+    samples = np.array(stereo.get_array_of_samples()).reshape(-1, 2)
+    assert samples[400:, 1].tolist() == [0] * 400
+    assert stereo.split_to_mono()[1][:50] == right
+
+
+def test_mid_side():
+    seg = make_segment(100, frame_rate=8000, channels=2, seed=10).apply_gain(-12)
+    left, right = (np.array(c.get_array_of_samples()) for c in seg.split_to_mono())
+
+    mid, side = stereo_to_ms(seg).split_to_mono()
+    assert mid.get_array_of_samples().tolist() == (left + right).tolist()
+    assert side.get_array_of_samples().tolist() == (left - right).tolist()
+
+    back = np.array(ms_to_stereo(stereo_to_ms(seg)).get_array_of_samples())
+    expected = np.stack([left, right], axis=1).reshape(-1) * 2 * db_to_float(-3)
+    assert np.abs(back - expected).max() <= 1
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+def test_stats(sample_width):
+    seg = make_segment(300, frame_rate=8000, channels=2, sample_width=sample_width, seed=11)
+    samples = np.array(seg.get_array_of_samples(), dtype=np.float64).reshape(-1, 2)
+    stats = seg.stats()
+
+    assert stats is seg.stats()
+    assert (stats.peak, stats.rms) == (audioop.max(seg.raw_data, sample_width), audioop.rms(seg.raw_data, sample_width))
+    assert (seg.max, seg.rms) == (stats.peak, stats.rms)
+
+    full_scale = seg.max_possible_amplitude
+    for i, channel in enumerate(stats.channels):
+        column = samples[:, i]
+        assert channel.peak == np.abs(column).max()
+        assert channel.rms == pytest.approx(np.sqrt(np.mean(column ** 2)))
+        assert channel.dc_offset == np.floor(column.mean()) / full_scale == seg.get_dc_offset(i + 1)
+        assert channel.clipped == np.count_nonzero((column == -full_scale) | (column == full_scale - 1))
+        assert channel.crest_factor == pytest.approx(channel.peak / channel.rms)
+    assert stats.clipped == sum(c.clipped for c in stats.channels)
+
+
+def test_stats_of_float_and_silent_segments():
+    seg = make_segment(100, frame_rate=8000, channels=1, seed=12).set_sample_format("float32").apply_gain(6)
+    samples = seg._samples().astype(np.float64)
+    stats = seg.stats()
+    assert stats.peak == np.abs(samples).max() > 1
+    assert stats.clipped == np.count_nonzero(np.abs(samples) >= 1)
+    assert stats.rms == pytest.approx(np.sqrt(np.mean(samples ** 2)))
+
+    silence = AudioSegment.silent(100).stats()
+    assert (silence.peak, silence.rms, silence.crest_factor) == (0, 0, 0.0)
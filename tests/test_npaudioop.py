@@ -0,0 +1,179 @@
+"""Parity tests for the numpy audioop backend against the stdlib C module"""
+
+import warnings
+
+import numpy as np
+import pytest
+
+from pydub_plus.core import npaudioop
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    audioop = pytest.importorskip("audioop")
+
+
+WIDTHS = [1, 2, 3, 4]
+
+
+def random_fragment(width, n=2000, seed=0):
+    """Random samples, including the extremes of the sample range"""
+    rng = np.random.default_rng(seed + width)
+    raw = rng.integers(0, 256, size=n * width, dtype=np.uint8)
+    # make sure the most negative / positive values are present
+    raw[:width] = 0
+    raw[width - 1] = 0x80
+    raw[width:2 * width] = 0xFF
+    raw[2 * width - 1] = 0x7F
+    return raw.tobytes()
+
+
+def quiet_fragment(width, n=2000, seed=0):
+    """A smooth signal with plateaus, for the peak-to-peak functions"""
+    rng = np.random.default_rng(seed)
+    samples = np.repeat(rng.integers(-100, 100, size=n // 4), 4)
+    return audioop.lin2lin(samples.astype("<i2").tobytes(), 2, width)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("fn", ["max", "minmax", "avg", "rms", "cross", "reverse", "byteswap"])
+def test_single_fragment_functions(fn, width):
+    fragment = random_fragment(width)
+    assert getattr(npaudioop, fn)(fragment, width) == getattr(audioop, fn)(fragment, width)
+    assert getattr(npaudioop, fn)(b"", width) == getattr(audioop, fn)(b"", width)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("fn", ["avgpp", "maxpp"])
+def test_peak_to_peak(fn, width):
+    fragment = quiet_fragment(width)
+    assert getattr(npaudioop, fn)(fragment, width) == getattr(audioop, fn)(fragment, width)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("factor", [0.0, 0.5, -1.0, 1.7, 2.0 ** 0.5, 1e6])
+def test_mul(width, factor):
+    fragment = random_fragment(width)
+    assert npaudioop.mul(fragment, width, factor) == audioop.mul(fragment, width, factor)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+def test_add_saturates(width):
+    a = random_fragment(width, seed=1)
+    b = random_fragment(width, seed=2)
+    assert npaudioop.add(a, b, width) == audioop.add(a, b, width)
+    assert npaudioop.add(a, a, width) == audioop.add(a, a, width)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("factors", [(0.5, 0.5), (1, 0), (0.3, -1.2)])
+def test_tomono_tostereo(width, factors):
+    fragment = random_fragment(width)
+    assert npaudioop.tomono(fragment, width, *factors) == audioop.tomono(fragment, width, *factors)
+    assert npaudioop.tostereo(fragment, width, *factors) == audioop.tostereo(fragment, width, *factors)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("bias", [-128, 128, 12345, -0x80000000, 0x7fffffff])
+def test_bias_wraps(width, bias):
+    fragment = random_fragment(width)
+    assert npaudioop.bias(fragment, width, bias) == audioop.bias(fragment, width, bias)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("width2", WIDTHS)
+def test_lin2lin(width, width2):
+    fragment = random_fragment(width)
+    assert npaudioop.lin2lin(fragment, width, width2) == audioop.lin2lin(fragment, width, width2)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("channels", [1, 2, 3])
+@pytest.mark.parametrize("rates", [(44100, 48000), (48000, 44100), (8000, 22050), (11025, 11025)])
+def test_ratecv(width, channels, rates):
+    fragment = random_fragment(width, n=999 * channels)
+    expected = audioop.ratecv(fragment, width, channels, rates[0], rates[1], None)
+    assert npaudioop.ratecv(fragment, width, channels, rates[0], rates[1], None) == expected
+
+
+@pytest.mark.parametrize("width", [2, 4])
+def test_ratecv_carries_state_between_blocks(width):
+    fragment = random_fragment(width, n=3000)
+    frame_width = width * 2
+    expected, expected_state = b"", None
+    actual, actual_state = b"", None
+    for start in range(0, len(fragment), 331 * frame_width):
+        block = fragment[start:start + 331 * frame_width]
+        out, expected_state = audioop.ratecv(block, width, 2, 22050, 16000, expected_state)
+        expected += out
+        out, actual_state = npaudioop.ratecv(block, width, 2, 22050, 16000, actual_state)
+        actual += out
+
+    assert actual == expected
+    assert actual_state == expected_state
+
+
+def test_ratecv_weights():
+    fragment = random_fragment(2, n=500)
+    expected = audioop.ratecv(fragment, 2, 1, 8000, 11025, None, 3, 1)
+    assert npaudioop.ratecv(fragment, 2, 1, 8000, 11025, None, 3, 1) == expected
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("law", ["ulaw", "alaw"])
+def test_companding(width, law):
+    fragment = random_fragment(width) + quiet_fragment(width)
+    encode, decode = "lin2" + law, law + "2lin"
+    assert getattr(npaudioop, encode)(fragment, width) == getattr(audioop, encode)(fragment, width)
+
+    codes = bytes(range(256))
+    assert getattr(npaudioop, decode)(codes, width) == getattr(audioop, decode)(codes, width)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("state", [None, (1000, 30), (-32768, 88)])
+def test_adpcm(width, state):
+    # odd length, the last code is dropped
+    fragment = quiet_fragment(width, n=1001) + random_fragment(width, n=999)
+    assert npaudioop.lin2adpcm(fragment, width, state) == audioop.lin2adpcm(fragment, width, state)
+
+    codes = bytes(range(256))
+    assert npaudioop.adpcm2lin(codes, width, state) == audioop.adpcm2lin(codes, width, state)
+
+
+def test_adpcm_rejects_bad_state():
+    with pytest.raises(ValueError):
+        npaudioop.lin2adpcm(b"\0\0", 2, (0x8000, 0))
+    with pytest.raises(ValueError):
+        npaudioop.adpcm2lin(b"\0", 2, (0, 89))
+    with pytest.raises(TypeError):
+        npaudioop.adpcm2lin(b"\0", 2, [0, 0])
+
+
+def test_find_functions():
+    reference = random_fragment(2, n=50, seed=3)
+    fragment = random_fragment(2, n=400, seed=4)[:200] + reference + random_fragment(2, n=100)
+
+    assert npaudioop.findfit(fragment, reference) == audioop.findfit(fragment, reference)
+    assert npaudioop.findmax(fragment, 50) == audioop.findmax(fragment, 50)
+    assert npaudioop.findfactor(reference, reference) == audioop.findfactor(reference, reference)
+
+
+def test_getsample():
+    fragment = random_fragment(2, n=10)
+    for i in range(10):
+        assert npaudioop.getsample(fragment, 2, i) == audioop.getsample(fragment, 2, i)
+    with pytest.raises(npaudioop.error):
+        npaudioop.getsample(fragment, 2, 10)
+
+
+def test_accepts_buffers():
+    fragment = random_fragment(2)
+    assert npaudioop.rms(memoryview(fragment)[10:], 2) == audioop.rms(fragment[10:], 2)
+    assert npaudioop.mul(bytearray(fragment), 2, 0.5) == audioop.mul(fragment, 2, 0.5)
+
+
+def test_rejects_partial_frames():
+    with pytest.raises(npaudioop.error):
+        npaudioop.rms(b"\0\0\0", 2)
+    with pytest.raises(npaudioop.error):
+        npaudioop.mul(b"\0\0", 5, 1.0)
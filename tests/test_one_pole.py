@@ -0,0 +1,83 @@
+"""Tests for the one-pole low and high pass filters"""
+
+import math
+
+import numpy as np
+import pytest
+
+from pydub_plus.core import AudioSegment
+from pydub_plus.core.one_pole import OnePoleFilter
+
+
+def sequential(kind, cutoff, frame_rate, frames):
+    """
+    The filter as a plain loop over the frames, one channel at a time
+    """
+    RC = 1.0 / (cutoff * 2 * math.pi)
+    dt = 1.0 / frame_rate
+    alpha = dt / (RC + dt) if kind == "low" else RC / (RC + dt)
+    out = frames.astype(np.float64)
+    for j in range(frames.shape[1]):
+        last = float(frames[0, j])
+        for i in range(1, len(frames)):
+            if kind == "low":
+                last = last + alpha * (float(frames[i, j]) - last)
+            else:
+                last = alpha * (last + float(frames[i, j]) - float(frames[i - 1, j]))
+            out[i, j] = last
+    return out
+
+
+@pytest.mark.parametrize("kind", ["low", "high"])
+@pytest.mark.parametrize("cutoff", [100, 2000, 7000])
+def test_blocks_match_the_sequential_loop(kind, cutoff):
+    rng = np.random.default_rng(cutoff)
+    frames = np.round(rng.standard_normal((6000, 2)) * 8000)
+    expected = sequential(kind, cutoff, 16000, frames)
+
+    # small blocks, so that the values of most blocks are computed in parallel
+    lpf = OnePoleFilter(kind, cutoff, 16000, channels=2, block_size=16)
+    np.testing.assert_array_equal(lpf.process(frames), expected)
+
+    lpf.reset()
+    out, i = [], 0
+    while i < len(frames):
+        size = int(rng.integers(1, 1500))
+        out.append(lpf.process(frames[i:i + size]))
+        i += size
+    np.testing.assert_array_equal(np.concatenate(out), expected)
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+@pytest.mark.parametrize("sample_format", ["int", "float32"])
+def test_filter_segments(sample_width, sample_format):
+    rng = np.random.default_rng(sample_width)
+    full_scale = 2 ** (8 * sample_width - 1)
+    samples = np.clip(rng.standard_normal(2 * 3000) * full_scale / 2, -full_scale, full_scale - 1)
+    dtype = {1: "i1", 2: "<i2", 4: "<i4"}[sample_width]
+    seg = AudioSegment(samples.astype(dtype).tobytes(), sample_width=sample_width,
+                       frame_rate=8000, channels=2).set_sample_format(sample_format)
+
+    for kind, effect in (("low", seg.low_pass_filter), ("high", seg.high_pass_filter)):
+        values = sequential(kind, 1500, 8000, seg._samples().reshape(-1, 2)).reshape(-1)
+        if sample_format == "int":
+            if kind == "high":
+                values = np.clip(values, -full_scale, full_scale - 1)
+            expected = np.trunc(values).astype(dtype)
+        else:
+            expected = values.astype(np.float32)
+        assert effect(1500).raw_data == expected.tobytes()
+
+        # filtered in blocks, with the state carried over
+        lpf = OnePoleFilter(kind, 1500, 8000, channels=2, block_size=16)
+        blocks = [lpf.filter(seg[i:i + 70]) for i in range(0, len(seg), 70)]
+        assert b"".join(block.raw_data for block in blocks) == expected.tobytes()
+
+
+def test_filter_checks_its_arguments():
+    with pytest.raises(ValueError):
+        OnePoleFilter("band", 1000, 8000)
+    lpf = OnePoleFilter("low", 1000, 8000, channels=2)
+    with pytest.raises(ValueError):
+        lpf.filter(AudioSegment.silent(100, frame_rate=8000))
+    assert len(lpf.process(np.zeros((0, 2)))) == 0
@@ -0,0 +1,103 @@
+"""Tests for the polyphase resampler"""
+
+import numpy as np
+import pytest
+
+from pydub_plus.core import AudioSegment, audio_segment
+from pydub_plus.core.resample import (
+    QUALITY_PRESETS,
+    Resampler,
+    SegmentResampler,
+    design_filter,
+    output_length,
+    resample,
+)
+from pydub_plus.core.utils import audioop
+
+RATES = [(44100, 48000), (48000, 44100), (8000, 16000), (16000, 8000), (8000, 11025)]
+
+
+def sine(frequency, rate, seconds=1.0, amplitude=0.5):
+    t = np.arange(int(rate * seconds)) / rate
+    return amplitude * np.sin(2 * np.pi * frequency * t)
+
+
+@pytest.mark.parametrize("rates", RATES)
+def test_streaming_matches_whole(rates):
+    rng = np.random.default_rng(0)
+    frames = rng.standard_normal((3000, 2))
+    whole = resample(frames, *rates)
+    assert whole.shape == (output_length(3000, *rates), 2)
+
+    resampler = Resampler(rates[0], rates[1], channels=2)
+    out, i = [], 0
+    while i < len(frames):
+        size = int(rng.integers(1, 500))
+        out.append(resampler.process(frames[i:i + size]))
+        i += size
+    out.append(resampler.flush())
+    np.testing.assert_array_equal(np.concatenate(out), whole)
+
+
+@pytest.mark.parametrize("rates", RATES)
+@pytest.mark.parametrize("quality", sorted(QUALITY_PRESETS))
+def test_resampled_sine_is_accurate(rates, quality):
+    in_rate, out_rate = rates
+    out = resample(sine(1000, in_rate)[:, None], in_rate, out_rate, quality)[:, 0]
+    expected = sine(1000, out_rate, len(out) / out_rate)
+
+    # away from the edges, which are padded with silence
+    middle = slice(len(out) // 4, 3 * len(out) // 4)
+    error = np.abs(out[middle] - expected[middle]).max()
+    assert 20 * np.log10(error) < {"low": -50, "medium": -70, "high": -90, "very_high": -100}[quality]
+
+
+def test_filter_designs_are_cached():
+    assert design_filter(160, 147, "high") is design_filter(160, 147, "high")
+    with pytest.raises(ValueError):
+        design_filter(2, 1, "best")
+
+
+def test_set_frame_rate():
+    samples = (sine(440, 8000) * 32767).astype("<i2")
+    seg = AudioSegment(samples.tobytes(), sample_width=2, frame_rate=8000, channels=1)
+
+    resampled = seg.set_frame_rate(22050)
+    assert (resampled.frame_rate, len(resampled)) == (22050, len(seg))
+    expected = sine(440, 22050) * 32767
+    error = np.abs(np.array(resampled.get_array_of_samples()) - expected)[2000:-2000].max()
+    assert error < 2
+
+    linear = seg.set_frame_rate(22050, quality="linear")
+    assert linear.raw_data == audioop.ratecv(seg.raw_data, 2, 1, 8000, 22050, None)[0]
+
+    floats = seg.set_sample_format("float32").set_frame_rate(22050)
+    assert floats.sample_format == "float32"
+    assert np.abs(np.array(floats.set_sample_format("int").get_array_of_samples()) -
+                  np.array(resampled.get_array_of_samples())).max() <= 1
+
+
+@pytest.mark.parametrize("frame_count", [0, 1, 999, 1000, 1001, 4321])
+def test_set_frame_rate_in_blocks(monkeypatch, frame_count):
+    rng = np.random.default_rng(frame_count)
+    samples = rng.integers(-10000, 10000, 2 * frame_count)
+    seg = AudioSegment(samples.astype("<i2").tobytes(), sample_width=2, frame_rate=44100, channels=2)
+    expected = seg._encode(resample(seg._samples().reshape(-1, 2), 44100, 48000))
+
+    monkeypatch.setattr(audio_segment, "RESAMPLE_BLOCK_FRAMES", 1000)
+    assert seg.set_frame_rate(48000).raw_data == expected
+
+
+def test_segment_resampler_has_no_seams():
+    rng = np.random.default_rng(1)
+    samples = rng.integers(-10000, 10000, 2 * 4410)
+    seg = AudioSegment(samples.astype("<i2").tobytes(), sample_width=2, frame_rate=44100, channels=2)
+
+    resampler = SegmentResampler(48000)
+    blocks = [resampler.process(seg[i:i + 7]) for i in range(0, len(seg), 7)]
+    blocks.append(resampler.flush())
+    assert b"".join(block.raw_data for block in blocks) == seg.set_frame_rate(48000).raw_data
+
+    with pytest.raises(ValueError):
+        resampler.process(seg.set_channels(1))
+    assert SegmentResampler(44100).process(seg) is seg
@@ -0,0 +1,211 @@
+"""Tests for silence detection"""
+
+import io
+
+import numpy as np
+import pytest
+
+from pydub_plus.core import AudioSegment, silence
+from pydub_plus.core.energy_index import EnergyIndex
+from pydub_plus.core.silence import (
+    detect_leading_silence,
+    detect_nonsilent,
+    detect_silence,
+    detect_trailing_silence,
+    iter_split_on_silence,
+    split_on_silence,
+    trim_silence,
+)
+
+
+def bursts(levels, frame_rate=8000, channels=2, sample_width=2, burst_ms=100, seed=0):
+    """
+    Noise at each of levels (fractions of full scale) for burst_ms in turn
+    """
+    rng = np.random.default_rng(seed)
+    full_scale = 2 ** (8 * sample_width - 1) - 1
+    frames = frame_rate * burst_ms // 1000
+    envelope = np.repeat(levels, frames * channels)
+    samples = np.clip(rng.standard_normal(len(envelope)) * envelope, -1, 1) * full_scale
+    dtype = {1: "i1", 2: "<i2", 4: "<i4"}[sample_width]
+    return AudioSegment(samples.astype(dtype).tobytes(), sample_width=sample_width,
+                        frame_rate=frame_rate, channels=channels)
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+@pytest.mark.parametrize("frame_rate", [8000, 11025])
+@pytest.mark.parametrize("sample_format", ["int", "float32"])
+def test_energy_index_rms_matches_slices(sample_width, frame_rate, sample_format):
+    seg = bursts([0.5, 0, 0.001, 0.3, 0], frame_rate, sample_width=sample_width, burst_ms=37)
+    seg = seg.set_sample_format(sample_format)
+
+    starts = np.arange(0, len(seg) - 50 + 1, 3)
+    expected = [seg[i:i + 50].rms for i in starts]
+    if sample_format == "int":
+        assert seg.energy_index().window_rms(starts, 50).tolist() == expected
+    else:
+        np.testing.assert_allclose(seg.energy_index().window_rms(starts, 50), expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize("sample_format", ["int", "float32"])
+def test_energy_index_from_blocks(sample_format):
+    seg = bursts([0.5, 0, 0.001, 0.3], 11025, burst_ms=37).set_sample_format(sample_format)
+    index = EnergyIndex.from_blocks(blocks_of(seg))
+    assert len(index) == len(seg)
+    for size, level in index.levels.items():
+        np.testing.assert_array_equal(level, seg.energy_index().levels[size])
+    assert seg.energy_index() is seg.energy_index()
+
+    with pytest.raises(ValueError):
+        EnergyIndex.from_blocks([seg, seg.set_channels(1)])
+
+
+def test_energy_index_coarse_levels():
+    seg = bursts([0.5, 0, 0.001, 0.3, 0, 0.2, 0], 44100, burst_ms=300)
+    starts = np.arange(0, len(seg) - 200 + 1, 100)
+    expected = [seg[i:i + 200].rms for i in starts]
+    assert seg.energy_index().window_rms(starts, 200).tolist() == expected
+
+
+def test_energy_index_sidecar(tmp_path):
+    seg = bursts([0.5, 0, 0, 0, 0.5, 0.5, 0, 0.5, 0, 0, 0])
+    path = str(tmp_path / "show.wav")
+    seg.export(path, format="wav")
+
+    index = EnergyIndex.for_file(path)
+    assert (tmp_path / "show.wav.energy.npz").exists()
+    assert detect_silence(index, 200, -40) == detect_silence(seg, 200, -40)
+
+    loaded = EnergyIndex.for_file(path)
+    assert loaded.source == index.source
+    np.testing.assert_array_equal(loaded.levels[1], index.levels[1])
+
+    other = AudioSegment.from_file(path)
+    assert loaded.attach(other).energy_index() is loaded
+    with pytest.raises(ValueError):
+        loaded.attach(other[:500])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 10, 33])
+def test_energy_index_trim_queries(chunk_size):
+    seg = bursts([0, 0.001, 0, 0.5, 0, 0.2, 0, 0.0005, 0], frame_rate=11025, burst_ms=101)
+    index = seg.energy_index()
+    for threshold in (-70, -50, -20, 10):
+        assert index.leading_silence(threshold, chunk_size) == \
+            detect_leading_silence(seg, threshold, chunk_size)
+
+        # chunks counted back from the end
+        end = len(seg)
+        while end > 0 and seg[max(0, end - chunk_size):end].dBFS < threshold:
+            end -= chunk_size
+        assert index.trailing_silence(threshold, chunk_size) == max(end, 0)
+
+
+def test_energy_index_gated_dbfs():
+    loud = bursts([0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1], channels=1)
+    with_silence = loud + AudioSegment.silent(2000, frame_rate=8000).set_sample_width(2)
+    # only the blocks that overlap the end of the noise bring it down
+    assert with_silence.energy_index().gated_dBFS() == pytest.approx(loud.dBFS, abs=1)
+    assert with_silence.dBFS < loud.dBFS - 3
+    assert loud.energy_index().gated_dBFS() == pytest.approx(loud.dBFS, abs=0.01)
+    assert AudioSegment.silent(2000).energy_index().gated_dBFS() == -float("inf")
+
+
+def test_detect_silence():
+    seg = bursts([0.5, 0, 0, 0, 0.5, 0.5, 0, 0.5, 0, 0, 0])
+    assert detect_silence(seg, 200, -40) == [[100, 400], [800, 1100]]
+    assert detect_silence(seg, 200, -40, seek_step=30) == [[120, 380], [810, 1100]]
+    assert detect_silence(seg, 2000, -40) == []
+    assert detect_nonsilent(seg, 200, -40) == [[0, 100], [400, 800]]
+    assert detect_silence(AudioSegment.silent(500), 100, -40) == [[0, 500]]
+    assert detect_nonsilent(AudioSegment.silent(500), 100, -40) == []
+
+
+def test_split_on_silence():
+    seg = bursts([0.5, 0, 0, 0, 0.5, 0.5, 0, 0.5, 0, 0, 0])
+    chunks = split_on_silence(seg, 200, -40, keep_silence=50)
+    assert [chunk.raw_data for chunk in chunks] == [seg[0:150].raw_data, seg[350:850].raw_data]
+
+    whole = split_on_silence(seg, 200, -40, keep_silence=True)
+    assert [len(chunk) for chunk in whole] == [250, 850]
+
+
+def blocks_of(seg, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = 0
+    while frame < seg.frame_count():
+        size = int(rng.integers(1, seg.frame_rate // 4))
+        yield seg.get_sample_slice(frame, frame + size)
+        frame += size
+
+
+@pytest.mark.parametrize("keep_silence", [0, 30, 150, True])
+@pytest.mark.parametrize("seek_step", [1, 7])
+def test_iter_split_on_silence_matches_split_on_silence(keep_silence, seek_step):
+    seg = bursts([0, 0.5, 0, 0, 0.2, 0, 0.5, 0.5, 0, 0, 0, 0.3, 0.001], frame_rate=11025,
+                 burst_ms=70, seed=1)
+    expected = split_on_silence(seg, 120, -40, keep_silence, seek_step)
+    assert len(expected) > 1
+
+    chunks = iter_split_on_silence(blocks_of(seg), 120, -40, keep_silence, seek_step)
+    assert [chunk.raw_data for chunk in chunks] == [chunk.raw_data for chunk in expected]
+
+
+def test_iter_split_on_silence_reads_files():
+    seg = bursts([0.5, 0, 0, 0, 0.5, 0.5, 0, 0.5, 0, 0, 0])
+    wav = io.BytesIO()
+    seg.export(wav, format="wav")
+    wav.seek(0)
+
+    chunks = iter_split_on_silence(wav, 200, -40, keep_silence=50, format="wav", block_ms=30)
+    assert [chunk.raw_data for chunk in chunks] == [seg[0:150].raw_data, seg[350:850].raw_data]
+
+
+def sliced_leading_silence(seg, threshold, chunk_size):
+    trim_ms = 0
+    while seg[trim_ms:trim_ms + chunk_size].dBFS < threshold and trim_ms < len(seg):
+        trim_ms += chunk_size
+    return min(trim_ms, len(seg))
+
+
+def sliced_trailing_silence(seg, threshold, chunk_size):
+    end = len(seg)
+    while end > 0 and seg[max(0, end - chunk_size):end].dBFS < threshold:
+        end -= chunk_size
+    return max(end, 0)
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+@pytest.mark.parametrize("chunk_size", [1, 10, 33])
+def test_trim_silence(sample_width, chunk_size):
+    seg = bursts([0, 0.001, 0, 0.5, 0, 0.2, 0, 0.0005, 0], frame_rate=11025,
+                 sample_width=sample_width, burst_ms=101)
+    for threshold in (-70, -50, -20, 10):
+        start = sliced_leading_silence(seg, threshold, chunk_size)
+        end = max(start, sliced_trailing_silence(seg, threshold, chunk_size))
+        assert detect_leading_silence(seg, threshold, chunk_size) == start
+        assert detect_trailing_silence(seg, threshold, chunk_size) == \
+            sliced_trailing_silence(seg, threshold, chunk_size)
+
+        assert trim_silence(seg, threshold, chunk_size).raw_data == seg[start:end].raw_data
+        assert trim_silence(seg, threshold, chunk_size, side="leading").raw_data == \
+            seg[start:].raw_data
+        assert trim_silence(seg, threshold, chunk_size, side="trailing").raw_data == \
+            seg[:sliced_trailing_silence(seg, threshold, chunk_size)].raw_data
+
+    with pytest.raises(ValueError):
+        trim_silence(seg, side="middle")
+
+
+def test_trim_silence_reads_only_the_ends(monkeypatch):
+    seg = bursts([0] + [0.5] * 40 + [0])
+    read = []
+    measure = silence.range_energies
+
+    def range_energies(data, *args, **kwargs):
+        read.append(len(data))
+        return measure(data, *args, **kwargs)
+
+    monkeypatch.setattr("pydub_plus.core.silence.range_energies", range_energies)
+    assert trim_silence(seg, chunk_size=10).raw_data == seg[100:4100].raw_data
+    assert sum(read) < len(seg.raw_data) // 2
@@ -0,0 +1,84 @@
+"""Tests for pydub_plus.core.utils"""
+
+import io
+import os
+
+from pydub_plus.core import utils
+
+
+def test_probe_cache_keys_follow_the_file(tmp_path):
+    path = tmp_path / "a.wav"
+    path.write_bytes(b"\0" * 100)
+    cache = utils.ProbeCache()
+
+    key = cache.key("mediainfo_json", str(path))
+    assert key == cache.key("mediainfo_json", path)
+    assert key != cache.key("mediainfo", str(path))
+
+    path.write_bytes(b"\0" * 101)
+    assert cache.key("mediainfo_json", str(path)) != key
+    assert cache.key("mediainfo_json", str(tmp_path / "missing.wav")) is None
+
+
+def test_probe_cache_keys_streams_by_content():
+    cache = utils.ProbeCache()
+    stream = io.BytesIO(b"abc" * 1000)
+    stream.seek(10)
+
+    key = cache.key("mediainfo_json", stream)
+    assert stream.tell() == 10
+    assert key == cache.key("mediainfo_json", io.BytesIO(b"abc" * 1000))
+    assert key != cache.key("mediainfo_json", io.BytesIO(b"abd" * 1000))
+
+
+def test_probe_cache_lru_and_counters():
+    cache = utils.ProbeCache(maxsize=2)
+    cache.set("a", {"x": 1})
+    cache.set("b", {"x": 2})
+    assert cache.get("a") == {"x": 1}
+    cache.set("c", {"x": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("c") == {"x": 3}
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # callers can't modify the cached value
+    cache.get("a")["x"] = 5
+    assert cache.get("a") == {"x": 1}
+
+
+def test_probe_cache_persists_to_sqlite(tmp_path):
+    path = str(tmp_path / "probe.sqlite")
+    utils.ProbeCache(path=path).set("a", {"streams": []})
+
+    cache = utils.ProbeCache(path=path)
+    assert cache.get("a") == {"streams": []}
+    cache.clear()
+    assert utils.ProbeCache(path=path).get("a") is None
+
+
+def test_mediainfo_json_uses_the_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "a.wav")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 100)
+
+    calls = []
+
+    def probe(filepath, read_ahead_limit=-1):
+        calls.append(filepath)
+        return {"streams": [], "format": {"filename": filepath}}
+
+    monkeypatch.setattr(utils, "_probe_json", probe)
+    monkeypatch.setattr(utils, "probe_cache", utils.ProbeCache())
+
+    assert utils.mediainfo_json(path) == utils.mediainfo_json(path)
+    assert len(calls) == 1
+    assert (utils.probe_cache.hits, utils.probe_cache.misses) == (1, 1)
+
+    os.utime(path, ns=(0, 0))
+    utils.mediainfo_json(path)
+    assert len(calls) == 2
+
+    monkeypatch.setattr(utils, "probe_cache", None)
+    utils.mediainfo_json(path)
+    assert len(calls) == 3